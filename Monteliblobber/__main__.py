@@ -0,0 +1,5 @@
+import sys
+
+from Monteliblobber import cli
+
+sys.exit(cli.main())
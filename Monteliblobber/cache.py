@@ -0,0 +1,104 @@
+""" Bounded in memory caches.
+"""
+
+import collections
+import threading
+
+
+class LRUCache(object):
+    """ A thread safe least recently used cache with hit and miss counters. It holds at most `max_size` entries and,
+    when `max_weight` is set, entries weighing at most `max_weight` in total, as measured by `weigh`. An entry
+    heavier than `max_weight` on its own is not stored.
+    """
+
+    def __init__(self, max_size, max_weight=None, weigh=len):
+        self.max_size = max_size
+        self.max_weight = max_weight
+        self.weigh = weigh
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._weights = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        """ Returns the cached value for `key` and marks it as recently used.
+
+        :param key: Hashable cache key
+        :param default: Value returned on a miss.
+        :return: Cached value or `default`
+        """
+
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """ Stores a value, evicting the least recently used entries when the cache is full.
+
+        :param key: Hashable cache key
+        :param value: Value to store
+        """
+
+        weight = 0
+        if self.max_weight is not None:
+            weight = self.weigh(value)
+            if weight > self.max_weight:
+                self.discard(key)
+                return
+        with self._lock:
+            self.weight += weight - self._weights.get(key, 0)
+            self._data[key] = value
+            self._weights[key] = weight
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size or self.max_weight is not None and self.weight > self.max_weight:
+                evicted, _ = self._data.popitem(last=False)
+                self.weight -= self._weights.pop(evicted)
+
+    def discard(self, key):
+        """ Removes the entry for `key`, if there is one.
+
+        :param key: Hashable cache key
+        """
+
+        with self._lock:
+            if key in self._data:
+                del self._data[key]
+                self.weight -= self._weights.pop(key)
+
+    def clear(self):
+        """ Removes all entries. The hit and miss counters are kept.
+        """
+
+        with self._lock:
+            self._data.clear()
+            self._weights.clear()
+            self.weight = 0
+
+    def stats(self):
+        """ Returns the cache counters.
+
+        :return: Dictionary
+        """
+
+        total = self.hits + self.misses
+        stats = {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+        if self.max_weight is not None:
+            stats.update({'weight': self.weight, 'max_weight': self.max_weight})
+        return stats
@@ -0,0 +1,241 @@
+""" Command line interface for running extractions without the web application, and for serving it.
+
+    monteliblobber extract [--format ndjson|csv] [--workers N] [PATH ...]
+    monteliblobber serve [--host HOST] [--port PORT] [--workers N]
+
+Paths may be files or directories, which are walked recursively; `-` or no path reads stdin. Files are read like
+uploads, as the printable strings they contain. Every artifact is written as one NDJSON line or CSV row tagged with
+the path it came from.
+
+`serve` runs the web application on pre-forked worker processes, see `server`. Flask is only imported by `serve`.
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import csv
+import io
+import itertools
+import json
+import os
+import sys
+
+try:
+    from Monteliblobber import extractor, strings
+except ImportError:
+    import extractor
+    import strings
+
+STDIN = '-'
+CSV_FIELDS = ('source', 'value', 'data_type', 'tags', 'count', 'first_seen')
+
+_worker_extractor = None
+
+
+def iter_paths(paths):
+    """ Expands directories into the files they contain, in a stable order.
+
+    :param paths: Iterable of file or directory path Strings, or `-` for stdin.
+    :return: Generator of Strings
+    """
+
+    for path in paths:
+        if path != STDIN and os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def _init_worker(config):
+    global _worker_extractor
+    _worker_extractor = extractor.Extractor(config)
+    _worker_extractor.preload()
+
+
+def _extract_file(path, min_length, utf16):
+    try:
+        return path, _worker_extractor.extract_file(path, min_length, utf16), None
+    except (OSError, ValueError) as e:
+        return path, None, str(e)
+
+
+def iter_results(config, paths, workers=1, min_length=strings.MIN_LENGTH, utf16=False):
+    """ Extracts the artifacts of every path. With more than one worker and more than one path the files are spread
+    over a pool of processes, each with its own `extractor.Extractor`; results are still returned in path order.
+
+    :param config: Settings dictionary.
+    :param paths: Iterable of file path Strings, or `-` for stdin.
+    :param workers: Number of worker processes.
+    :param min_length: Minimum length of the strings extracted from files.
+    :param utf16: Also extract UTF-16LE strings from files.
+    :return: Generator of (path, List of artifacts or None, error String or None) tuples
+    """
+
+    # A single file or stdin is not worth starting a pool for.
+    paths = iter(paths)
+    first = list(itertools.islice(paths, 2))
+    paths = itertools.chain(first, paths)
+    if workers <= 1 or len(first) < 2:
+        _init_worker(config)
+        for path in paths:
+            if path == STDIN:
+                stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', errors='replace')
+                yield path, _worker_extractor.extract_stream(stream), None
+            else:
+                yield _extract_file(path, min_length, utf16)
+        return
+
+    # Files are already spread over the workers, so each worker scans its file on its own.
+    config = dict(config, EXTRACT_WORKERS=1)
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(config,)) as executor:
+        in_flight = collections.deque()
+        for path in paths:
+            if path == STDIN:
+                while in_flight:
+                    yield in_flight.popleft().result()
+                for result in iter_results(config, [path]):
+                    yield result
+                continue
+            in_flight.append(executor.submit(_extract_file, path, min_length, utf16))
+            while len(in_flight) > workers * 4:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+class NdjsonWriter(object):
+    """ Writes one JSON object per artifact. """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, source, artifacts):
+        for artifact in artifacts:
+            self.stream.write(json.dumps(dict(artifact, source=source)) + '\n')
+
+
+class CsvWriter(object):
+    """ Writes one CSV row per artifact, with the tags joined into one column. """
+
+    def __init__(self, stream):
+        self.writer = csv.writer(stream)
+        self.writer.writerow(CSV_FIELDS)
+
+    def write(self, source, artifacts):
+        for artifact in artifacts:
+            tags = extractor.convert_list_to_string([tag for tag in artifact.get('tags', []) if tag])
+            self.writer.writerow((
+                source, artifact['value'], artifact['data_type'], tags, artifact.get('count', ''),
+                artifact.get('first_seen', '')
+            ))
+
+
+WRITERS = {'ndjson': NdjsonWriter, 'csv': CsvWriter}
+
+
+def extract_command(args):
+    config = extractor.load_config(args.config)
+    missing = [
+        path for path in (config['BLACKLIST_DB'], config['MAXMIND_CITY_DB_PATH'], config['ROOT_DOMAINS_PATH'])
+        if not os.path.isfile(path)
+    ]
+    if missing:
+        sys.stderr.write('Lookup files are missing, run the updaters from the web application: {}\n'.format(
+            ', '.join(missing)
+        ))
+        return 2
+
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+    failed = False
+    try:
+        writer = WRITERS[args.format](output)
+        results = iter_results(config, iter_paths(args.paths or [STDIN]), args.workers, args.min_length, args.utf16)
+        for path, artifacts, error in results:
+            if error is not None:
+                sys.stderr.write('{}: {}\n'.format(path, error))
+                failed = True
+            else:
+                writer.write('<stdin>' if path == STDIN else path, artifacts)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failed else 0
+
+
+def serve_command(args):
+    try:
+        from Monteliblobber import monteliblobber, server
+    except ImportError:
+        import monteliblobber
+        import server
+
+    application = monteliblobber.create_app(args.config)
+    config = application.config
+    server.run(
+        application,
+        args.host or config['HOST'],
+        config['PORT'] if args.port is None else args.port,
+        args.workers or config['SERVER_WORKERS'],
+        config['SERVER_GRACEFUL_TIMEOUT']
+    )
+    return 0
+
+
+def positive_int(value):
+    """ Parses a command line Integer of at least 1.
+
+    :param value: String
+    :return: Integer
+    """
+
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError('must be at least 1: {}'.format(value))
+    return number
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='monteliblobber',
+        description='A reasonable way to extract and contextualize network artifacts from blobs.'
+    )
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    extract = commands.add_parser('extract', help='Extract artifacts from files, directories or stdin.')
+    extract.add_argument('paths', nargs='*', metavar='PATH', help='Files or directories to scan, or - for stdin.')
+    extract.add_argument('-f', '--format', choices=sorted(WRITERS), default='ndjson', help='Output format.')
+    extract.add_argument('-o', '--output', help='Write to a file instead of stdout.')
+    extract.add_argument('-w', '--workers', type=positive_int, default=os.cpu_count() or 1,
+                         help='Number of files processed concurrently.')
+    extract.add_argument('-n', '--min-length', type=positive_int, default=strings.MIN_LENGTH,
+                         help='Minimum length of the strings extracted from files.')
+    extract.add_argument('--utf16', action='store_true', help='Also extract UTF-16LE strings from files.')
+    extract.add_argument('-c', '--config', help='Config file to use instead of the local monteliblobber.cfg.')
+    extract.set_defaults(func=extract_command)
+
+    serve = commands.add_parser('serve', help='Run the web application on pre-forked worker processes.')
+    serve.add_argument('--host', help='Address to listen on. Defaults to HOST.')
+    serve.add_argument('-p', '--port', type=int, help='Port to listen on, 0 for any free port. Defaults to PORT.')
+    serve.add_argument('-w', '--workers', type=int, help='Number of worker processes. Defaults to SERVER_WORKERS.')
+    serve.add_argument('-c', '--config', help='Config file to use instead of the local monteliblobber.cfg.')
+    serve.set_defaults(func=serve_command)
+    return parser
+
+
+def main(argv=None):
+    """ Runs the command line interface.
+
+    :param argv: List of argument Strings. Defaults to `sys.argv`.
+    :return: Exit status Integer
+    """
+
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+""" Root domain, public suffix and domain white list data.
+"""
+
+import re
+
+SUBSTRING = 'substring'
+SUFFIX = 'suffix'
+
+
+def load_root_domains(filename):
+    """ Reads IANA's list of root domains.
+
+    :param filename: Path to the root domains file.
+    :return: Frozenset of lower case root domain Strings
+    """
+
+    with open(filename, 'r') as f:
+        return frozenset(line.strip().lower() for line in f if line.strip() and not line.startswith('#'))
+
+
+class PublicSuffixList(object):
+    """ A suffix trie of the Public Suffix List rules, keyed by reversed domain labels. Nodes are dictionaries
+    of label to child node; a node for the end of a rule holds `True` under the key `$`, and an exception rule
+    holds `True` under `!`.
+    """
+
+    def __init__(self, rules):
+        self.root = {}
+        for rule in rules:
+            exception = rule.startswith('!')
+            node = self.root
+            for label in reversed(rule.lstrip('!').split('.')):
+                node = node.setdefault(label, {})
+            node['!' if exception else '$'] = True
+
+    def suffix_length(self, labels):
+        """ Returns the number of labels in the public suffix of a domain. Follows the list's algorithm: the
+        longest matching rule wins, exception rules win over everything, and an unlisted TLD is its own suffix.
+
+        :param labels: List of domain labels, left to right.
+        :return: Integer
+        """
+
+        best = 1
+        exception = None
+        stack = [(self.root, 0)]
+        count = len(labels)
+        while stack:
+            node, depth = stack.pop()
+            if depth == count:
+                continue
+            label = labels[count - depth - 1]
+            for key in (label, '*'):
+                child = node.get(key)
+                if child is None:
+                    continue
+                if key != '*' and child.get('!'):
+                    exception = depth if exception is None else max(exception, depth)
+                if child.get('$'):
+                    best = max(best, depth + 1)
+                stack.append((child, depth + 1))
+        if exception is not None:
+            return exception
+        return best
+
+    def registrable_domain(self, hostname):
+        """ Returns the registrable domain of a host name, the public suffix plus one label, or `None` when the
+        host name is itself a public suffix.
+
+        :param hostname: String
+        :return: String or None
+        """
+
+        labels = hostname.lower().strip('.').split('.')
+        length = self.suffix_length(labels)
+        if len(labels) <= length:
+            return None
+        return '.'.join(labels[-length - 1:])
+
+
+def load_public_suffix_list(filename):
+    """ Reads a Public Suffix List file.
+
+    :param filename: Path to the `public_suffix_list.dat` file.
+    :return: `PublicSuffixList`
+    """
+
+    with open(filename, 'r', encoding='utf-8') as f:
+        rules = []
+        for line in f:
+            rule = line.split()[0] if line.strip() else ''
+            if rule and not rule.startswith('//'):
+                rules.append(rule.lower())
+    return PublicSuffixList(rules)
+
+
+def _trie_pattern(node):
+    # A terminal node ends the pattern: any text containing a longer entry also contains this one.
+    if '$' in node:
+        return ''
+    alternatives = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items())]
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return '(?:' + '|'.join(alternatives) + ')'
+
+
+def _hostname(candidate):
+    """ Returns the host part of an email address, URL or host name match.
+    """
+
+    if '://' in candidate:
+        candidate = candidate.split('://', 1)[1]
+    for separator in '/?#':
+        candidate = candidate.split(separator, 1)[0]
+    candidate = candidate.rsplit('@', 1)[-1]
+    return candidate.split(':', 1)[0].strip('.').lower()
+
+
+class DomainWhitelist(object):
+    """ A white list of domains compiled once for matching many candidates.
+
+    In `substring` mode a candidate matches when any white listed domain appears anywhere in it, the original
+    behaviour. The domains are compiled into one trie shaped regular expression, so each candidate is searched once
+    instead of once per domain. In `suffix` mode the host part of the candidate must equal a white listed domain or
+    be a subdomain of one, so `notgoogle.com.evil.ru` no longer matches `google.com`. Host labels are looked up in a
+    reversed-label trie.
+    """
+
+    def __init__(self, domains, match=SUBSTRING):
+        if match not in (SUBSTRING, SUFFIX):
+            raise ValueError('Unknown white list match mode: {}'.format(match))
+        self.domains = tuple(domains)
+        self.match = match
+        self.regex = None
+        self.root = {}
+        if match == SUBSTRING:
+            chars = {}
+            for domain in self.domains:
+                node = chars
+                for char in domain:
+                    node = node.setdefault(char, {})
+                node['$'] = True
+            if self.domains:
+                self.regex = re.compile(_trie_pattern(chars))
+        else:
+            for domain in self.domains:
+                node = self.root
+                for label in reversed(domain.strip('.').lower().split('.')):
+                    node = node.setdefault(label, {})
+                node['$'] = True
+
+    def __len__(self):
+        return len(self.domains)
+
+    def matches(self, candidate):
+        """ Returns True if the candidate is white listed.
+
+        :param candidate: An email address, URL or host name String.
+        :return: Bool
+        """
+
+        if self.match == SUBSTRING:
+            return self.regex is not None and self.regex.search(candidate) is not None
+        node = self.root
+        for label in reversed(_hostname(candidate).split('.')):
+            node = node.get(label)
+            if node is None:
+                return False
+            if '$' in node:
+                return True
+        return False
+
+
+def compile_whitelist(whitelist, match=SUBSTRING):
+    """ Compiles a list of white listed domains. An already compiled white list is returned as is.
+
+    :param whitelist: A list of strings containing white listed domains, or a `DomainWhitelist`.
+    :param match: `substring` or `suffix`.
+    :return: `DomainWhitelist`
+    """
+
+    if isinstance(whitelist, DomainWhitelist):
+        return whitelist
+    return DomainWhitelist(whitelist, match)
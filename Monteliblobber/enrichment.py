@@ -0,0 +1,254 @@
+""" Persistent cache of the tags derived for network addresses.
+
+The GeoIP, blacklist and named network tags of an address only change when one of those datasets changes, so they
+are kept in a SQLite database and survive restarts. Every entry is stored under the version of the datasets it was
+derived from; when a dataset is replaced the version changes and the entries of older versions are dropped. The
+database is bounded to `max_size` entries by evicting the least recently used ones, and the most recently used
+entries of the current version can be preloaded into memory at startup.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    from Monteliblobber import cache
+except ImportError:
+    import cache
+
+DEFAULT_MAX_SIZE = 1000000
+DEFAULT_MEMORY_SIZE = 65536
+
+# SQLite limits the number of host parameters in one statement.
+_QUERY_CHUNK = 500
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def dataset_version(*parts):
+    """ Returns a short version String identifying the datasets tags were derived from.
+
+    :param parts: Values identifying each dataset, such as file stamps or digests, with stable `repr`s.
+    :return: String
+    """
+
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:16]
+
+
+class EnrichmentCache(object):
+    """ Address tags cached in memory and in a SQLite database. Lookups are answered from an in memory LRU cache
+    first, then from the database. The database is opened on first use and shared by every thread; errors such as
+    a locked or unwritable database are counted and treated as misses, so the cache never fails an extraction.
+    """
+
+    def __init__(self, filename, max_size=DEFAULT_MAX_SIZE, memory_size=DEFAULT_MEMORY_SIZE):
+        self.filename = filename
+        self.max_size = max_size
+        self.memory = cache.LRUCache(memory_size)
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.errors = 0
+        self._count = 0
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            connection = sqlite3.connect(self.filename, timeout=30, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS enrichment ('
+                'version TEXT NOT NULL, address TEXT NOT NULL, tags TEXT NOT NULL, used REAL NOT NULL, '
+                'UNIQUE (version, address))'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS enrichment_used ON enrichment (used)')
+            self._count = connection.execute('SELECT COUNT(*) FROM enrichment').fetchone()[0]
+            self._connection = connection
+        return self._connection
+
+    def close(self):
+        """ Closes the database connection; it is opened again on next use. A connection can't be used by a child
+        process, so the cache is closed before forking.
+        """
+
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def set_version(self, version):
+        """ Sets the version of the datasets that new entries are derived from. When it differs from the previous
+        version the memory cache is emptied and the database entries of other versions are deleted.
+
+        :param version: String returned by `dataset_version`.
+        """
+
+        if version == self.version:
+            return
+        with self._lock:
+            if version == self.version:
+                return
+            self.memory.clear()
+            self.version = version
+            try:
+                connection = self._connect()
+                with connection:
+                    connection.execute('DELETE FROM enrichment WHERE version != ?', (version,))
+                self._count = connection.execute('SELECT COUNT(*) FROM enrichment').fetchone()[0]
+            except sqlite3.Error:
+                self.errors += 1
+
+    def get_many(self, addresses):
+        """ Returns the cached tags of the addresses that are in the cache.
+
+        :param addresses: List of address Strings.
+        :return: Dictionary of address String to List of tags.
+        """
+
+        found = {}
+        missing = []
+        for address in addresses:
+            tags = self.memory.get(address)
+            if tags is None:
+                missing.append(address)
+            else:
+                found[address] = tags
+        if not missing:
+            return found
+
+        with self._lock:
+            try:
+                connection = self._connect()
+                now = time.time()
+                for pos in range(0, len(missing), _QUERY_CHUNK):
+                    chunk = missing[pos:pos + _QUERY_CHUNK]
+                    marks = ','.join('?' * len(chunk))
+                    rows = connection.execute(
+                        'SELECT address, tags FROM enrichment WHERE version = ? AND address IN ({})'.format(marks),
+                        [self.version] + chunk
+                    ).fetchall()
+                    if rows:
+                        with connection:
+                            connection.execute(
+                                'UPDATE enrichment SET used = ? WHERE version = ? AND address IN ({})'.format(
+                                    ','.join('?' * len(rows))
+                                ),
+                                [now, self.version] + [address for address, _ in rows]
+                            )
+                    for address, tags in rows:
+                        tags = json.loads(tags)
+                        found[address] = tags
+                        self.memory.put(address, tags)
+            except sqlite3.Error:
+                self.errors += 1
+            self.hits += len(found) - (len(addresses) - len(missing))
+            self.misses += len(addresses) - len(found)
+        return found
+
+    def put_many(self, entries):
+        """ Stores the tags of addresses under the current version, evicting the least recently used entries when
+        the database holds more than `max_size`.
+
+        :param entries: Dictionary of address String to List of tags.
+        """
+
+        for address, tags in entries.items():
+            self.memory.put(address, tags)
+        with self._lock:
+            try:
+                connection = self._connect()
+                now = time.time()
+                with connection:
+                    connection.executemany(
+                        'INSERT OR REPLACE INTO enrichment (version, address, tags, used) VALUES (?, ?, ?, ?)',
+                        [(self.version, address, json.dumps(tags), now) for address, tags in entries.items()]
+                    )
+                self._count += len(entries)
+                if self._count > self.max_size:
+                    self._evict(connection)
+            except sqlite3.Error:
+                self.errors += 1
+
+    def _evict(self, connection):
+        self._count = connection.execute('SELECT COUNT(*) FROM enrichment').fetchone()[0]
+        # Evict down to 90% of the limit, so a full cache isn't trimmed on every insert.
+        excess = self._count - self.max_size * 9 // 10
+        if excess > 0 and self._count > self.max_size:
+            with connection:
+                connection.execute(
+                    'DELETE FROM enrichment WHERE rowid IN (SELECT rowid FROM enrichment ORDER BY used LIMIT ?)',
+                    (excess,)
+                )
+            self._count -= excess
+            self.evicted += excess
+
+    def preload(self, version, limit=None):
+        """ Loads the most recently used entries of a version into memory, so a restarted process starts warm.
+
+        :param version: String returned by `dataset_version`.
+        :param limit: Maximum number of entries to load. Defaults to the size of the memory cache.
+        :return: Number of entries loaded.
+        """
+
+        if not os.path.isfile(self.filename):
+            return 0
+        self.set_version(version)
+        if limit is None:
+            limit = self.memory.max_size
+        with self._lock:
+            try:
+                rows = self._connect().execute(
+                    'SELECT address, tags FROM enrichment WHERE version = ? ORDER BY used DESC LIMIT ?',
+                    (version, limit)
+                ).fetchall()
+            except sqlite3.Error:
+                self.errors += 1
+                return 0
+        # Oldest first, so the most recently used entries are also the most recent in the memory cache.
+        for address, tags in reversed(rows):
+            self.memory.put(address, json.loads(tags))
+        return len(rows)
+
+    def stats(self):
+        """ Returns the cache counters. `hits` and `misses` count database lookups; memory lookups are counted
+        under `memory`.
+
+        :return: Dictionary
+        """
+
+        lookups = self.memory.hits + self.hits + self.misses
+        return {
+            'size': self._count,
+            'max_size': self.max_size,
+            'version': self.version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evicted': self.evicted,
+            'errors': self.errors,
+            'hit_rate': (self.memory.hits + self.hits) / lookups if lookups else 0.0,
+            'memory': self.memory.stats()
+        }
+
+
+def get_cache(filename, max_size=DEFAULT_MAX_SIZE, memory_size=DEFAULT_MEMORY_SIZE):
+    """ Returns the process-wide `EnrichmentCache` for a database file, creating it on first use.
+
+    :param filename: Path to the SQLite database.
+    :param max_size: Maximum number of entries in the database, used when the cache is first created.
+    :param memory_size: Maximum number of entries kept in memory, used when the cache is first created.
+    :return: `EnrichmentCache`
+    """
+
+    key = os.path.abspath(filename)
+    enrichment_cache = _registry.get(key)
+    if enrichment_cache is None:
+        with _registry_lock:
+            enrichment_cache = _registry.setdefault(key, EnrichmentCache(filename, max_size, memory_size))
+    return enrichment_cache
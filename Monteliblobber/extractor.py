@@ -0,0 +1,915 @@
+""" Extraction and analysis of network artifacts, independent of the web application.
+
+`Extractor` holds everything a run needs: the compiled white lists and network indexes and the resident blacklist,
+root domain and GeoIP databases. It is built from a settings mapping with the same keys as `settings.Config`, so the
+web application, the command line and other programs share one implementation. Nothing here imports Flask.
+"""
+
+import collections
+import ipaddress
+import json
+import os
+import time
+
+try:
+    from Monteliblobber import (
+        domains, enrichment, geolocation, metrics, netindex, resident, resultcache, scanner, settings, strings
+    )
+except ImportError:
+    import domains
+    import enrichment
+    import geolocation
+    import metrics
+    import netindex
+    import resident
+    import resultcache
+    import scanner
+    import settings
+    import strings
+
+READ_SIZE = 1024 * 1024
+
+
+def load_config(filename=None):
+    """ Returns the settings as a dictionary: the defaults from `settings.Config`, overridden by a config file
+    written in the same Python syntax as `monteliblobber.cfg`.
+
+    :param filename: Path to a config file. Defaults to the local config file, when it exists.
+    :return: Dictionary
+    """
+
+    config = {key: getattr(settings.Config, key) for key in dir(settings.Config) if key.isupper()}
+    if filename is None and os.path.isfile(config['LOCAL_CONF_FILE']):
+        filename = config['LOCAL_CONF_FILE']
+    if filename is not None:
+        namespace = {'__file__': filename}
+        with open(filename, 'rb') as f:
+            exec(compile(f.read(), filename, 'exec'), namespace)
+        config.update({key: value for key, value in namespace.items() if key.isupper()})
+    return config
+
+
+class Extractor(object):
+    """ Extracts and analyzes artifacts with state compiled once from the settings.
+
+    The blacklist, root domain and public suffix files are kept resident and picked up again when an updater
+    replaces them; the GeoIP reader is shared with every other user of the same database file. Every extraction
+    is timed stage by stage into a `metrics.Timings`, which can be passed in to read it back, and added to the
+    `metrics` registry. Artifacts are returned in the order they were first found, with the number of times they
+    were found, `count`, and the character offset of their first match, `first_seen`. For files the offset counts
+    characters of the extracted strings, not bytes of the original file.
+
+    With `USE_RESULT_CACHE`, the artifacts of texts and files are cached by the digest of their content, so an
+    identical submission is answered without scanning it again until the lookup files or settings change.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.workers = config.get('EXTRACT_WORKERS', 1)
+        self.parallel_min_size = config.get('PARALLEL_MIN_SIZE', 16 * 1024 * 1024)
+        self.geoip_file = config['MAXMIND_CITY_DB_PATH']
+        self.blacklist_file = config['BLACKLIST_DB']
+        self.root_domains_file = config['ROOT_DOMAINS_PATH']
+        self.public_suffix_file = config['PUBLIC_SUFFIX_LIST_PATH'] if config.get('USE_PUBLIC_SUFFIX_LIST') else None
+        self.named_networks = netindex.compile_networks(config['NAMED_NETWORKS'])
+        self.network_whitelist = netindex.compile_networks({'whitelist': config['WHITELISTS']['network_addresses']})
+        self.domain_whitelist = domains.compile_whitelist(
+            config['WHITELISTS']['domains'],
+            config.get('WHITELIST_MATCH', domains.SUBSTRING)
+        )
+        self.geoip = geolocation.get_database(self.geoip_file, config.get('GEOIP_CACHE_SIZE', 65536))
+        self.blacklist = resident.get_resource(self.blacklist_file, netindex.load_blacklist)
+        self.root_domains = resident.get_resource(self.root_domains_file, domains.load_root_domains)
+        self.public_suffixes = resident.get_resource(config['PUBLIC_SUFFIX_LIST_PATH'], domains.load_public_suffix_list)
+        self.metrics = metrics.Registry()
+        self.enrichment = None
+        if config.get('USE_ENRICHMENT_CACHE'):
+            self.enrichment = enrichment.get_cache(
+                config['ENRICHMENT_CACHE_PATH'],
+                config.get('ENRICHMENT_CACHE_SIZE', enrichment.DEFAULT_MAX_SIZE),
+                config.get('ENRICHMENT_CACHE_PRELOAD', enrichment.DEFAULT_MEMORY_SIZE)
+            )
+        self.results = None
+        if config.get('USE_RESULT_CACHE'):
+            self.results = resultcache.ResultCache(
+                config.get('RESULT_CACHE_SIZE', resultcache.DEFAULT_MAX_SIZE),
+                config.get('RESULT_CACHE_MEMORY', resultcache.DEFAULT_MEMORY_SIZE),
+                config['RESULT_CACHE_PATH'] if config.get('RESULT_CACHE_SPILL') else None,
+                config.get('RESULT_CACHE_DISK_SIZE', resultcache.DEFAULT_DISK_SIZE)
+            )
+
+    def preload(self):
+        """ Loads the lookup files that exist, so the first extraction doesn't pay the load cost, and warms the
+        enrichment cache with its most recently used entries.
+        """
+
+        self.blacklist.preload()
+        self.root_domains.preload()
+        if self.public_suffix_file:
+            self.public_suffixes.preload()
+        if self.enrichment is not None and os.path.isfile(self.geoip_file) and os.path.isfile(self.blacklist_file):
+            self.enrichment.preload(
+                enrichment_version(self.geoip.resource, self.blacklist, self.named_networks)
+            )
+
+    def result_version(self):
+        """ Returns the version of the lookup files and settings the artifacts of an extraction are derived from.
+        It changes whenever a lookup file is replaced or the named networks or white lists are changed.
+
+        :return: String
+        """
+
+        return enrichment.dataset_version(
+            _stamp(self.geoip.resource), _stamp(self.blacklist), _stamp(self.root_domains),
+            _stamp(self.public_suffixes) if self.public_suffix_file else None, self.named_networks.digest(),
+            self.network_whitelist.digest(), self.domain_whitelist.match, self.domain_whitelist.domains
+        )
+
+    def cached_result(self, key, timings, cached=True):
+        """ Looks up the artifacts of an input in the result cache.
+
+        :param key: String returned by `resultcache.content_key` or `resultcache.file_key`, or None to skip the
+         cache.
+        :param timings: `metrics.Timings` receiving the cache hit or miss.
+        :param cached: False to only return the version, for a result that replaces the cached one.
+        :return: Tuple of the version the artifacts must be derived from and the cached artifacts or None.
+        """
+
+        if key is None:
+            return None, None
+        with timings.stage('result_cache'):
+            version = self.result_version()
+            if not cached:
+                self.results.set_version(version)
+                return version, None
+            artifacts = self.results.get(key, version)
+        if artifacts is None:
+            timings.cache_misses['result'] += 1
+        else:
+            timings.cache_hits['result'] += 1
+        return version, artifacts
+
+    def gauges(self):
+        """ Returns the number of entries held by the lookup and result caches, for the `metrics` registry.
+
+        :return: List of (name, labels dictionary, value) tuples
+        """
+
+        gauges = [('monteliblobber_cache_entries', {'cache': 'geoip'}, len(self.geoip.cache))]
+        if self.enrichment is not None:
+            stats = self.enrichment.stats()
+            gauges.append(('monteliblobber_cache_entries', {'cache': 'enrichment'}, stats['size']))
+            gauges.append(('monteliblobber_cache_entries', {'cache': 'enrichment_memory'}, stats['memory']['size']))
+        if self.results is not None:
+            gauges.append(('monteliblobber_cache_entries', {'cache': 'result'}, len(self.results.memory)))
+        return gauges
+
+    def new_scanner(self, size):
+        """ Returns a scanner suited to the input size. Inputs of at least `PARALLEL_MIN_SIZE` bytes are scanned by
+        a pool of `EXTRACT_WORKERS` processes when more than one worker is configured.
+
+        :param size: Size of the input in characters or bytes.
+        :return: `scanner.Scanner`
+        """
+
+        if self.workers > 1 and size >= self.parallel_min_size:
+            return scanner.ParallelScanner(scanner.get_executor(self.workers), self.workers)
+        return scanner.Scanner()
+
+    def extract(self, text_blob, timings=None, cached=True):
+        """ Extracts and analyzes artifacts from text.
+
+        :param text_blob: String
+        :param timings: Optional `metrics.Timings` receiving the stage timings.
+        :param cached: False to extract the artifacts again even when they are cached. The new result replaces the
+         cached one.
+        :return: A list of dictionaries containing artifacts.
+        """
+
+        timings = timings if timings is not None else metrics.Timings()
+        timings.input_bytes += len(text_blob)
+        key = self._text_key(text_blob, timings)
+        version, artifacts = self.cached_result(key, timings, cached)
+        if artifacts is not None:
+            self.metrics.record(timings, 'text')
+            return artifacts
+        with timings.stage('scan'):
+            blob_scanner = self.new_scanner(len(text_blob))
+            blob_scanner.feed(text_blob)
+            matches = blob_scanner.close()
+        self.count_matches(blob_scanner, timings)
+        artifacts = self.analyze(matches, timings)
+        add_occurrences(artifacts, blob_scanner)
+        if key is not None:
+            self.results.put(key, version, artifacts)
+        self.metrics.record(timings, 'text')
+        return artifacts
+
+    def _text_key(self, text_blob, timings):
+        if self.results is None:
+            return None
+        with timings.stage('result_cache'):
+            return resultcache.content_key('text', text_blob.encode('utf-8', 'surrogatepass'))
+
+    def extract_stream(self, stream, timings=None):
+        """ Extracts and analyzes artifacts from a text stream, read in pieces.
+
+        :param stream: Text file-like object
+        :param timings: Optional `metrics.Timings` receiving the stage timings.
+        :return: A list of dictionaries containing artifacts.
+        """
+
+        timings = timings if timings is not None else metrics.Timings()
+        stream_scanner = scanner.Scanner()
+        with timings.stage('scan'):
+            for piece in iter(lambda: stream.read(READ_SIZE), ''):
+                stream_scanner.feed(piece)
+            matches = stream_scanner.close()
+        timings.input_bytes += stream_scanner.characters
+        self.count_matches(stream_scanner, timings)
+        artifacts = self.analyze(matches, timings)
+        add_occurrences(artifacts, stream_scanner)
+        self.metrics.record(timings, 'stream')
+        return artifacts
+
+    def extract_file(self, filename, min_length=strings.MIN_LENGTH, utf16=False, progress=None, timings=None):
+        """ Extracts and analyzes artifacts from the printable strings in a file. The file is memory-mapped and
+        scanned as the strings are found, so memory use doesn't grow with the file size. The `first_seen` offsets of
+        the artifacts are positions in the extracted strings, not byte offsets in the file.
+
+        :param filename: Path to the file.
+        :param min_length: Minimum length of the extracted strings.
+        :param utf16: Also extract UTF-16LE strings.
+        :param progress: Optional callable receiving the bytes scanned and unique indicators found so far.
+        :param timings: Optional `metrics.Timings` receiving the stage timings.
+        :return: A list of dictionaries containing artifacts.
+        """
+
+        timings = timings if timings is not None else metrics.Timings()
+        key = None
+        if self.results is not None:
+            with timings.stage('result_cache'):
+                key = resultcache.file_key('file', filename, min_length, int(bool(utf16)))
+        version, artifacts = self.cached_result(key, timings)
+        if artifacts is not None:
+            # The strings are extracted in one pass per encoding, so progress counts the file once for each.
+            scanned = os.path.getsize(filename) * (2 if utf16 else 1)
+            if progress is not None:
+                progress(scanned, len(artifacts))
+            timings.input_bytes += scanned
+            self.metrics.record(timings, 'file')
+            return artifacts
+
+        file_scanner = self.new_scanner(os.path.getsize(filename))
+        scanned = [0]
+
+        def report(bytes_scanned):
+            scanned[0] = bytes_scanned
+            if progress is not None:
+                progress(bytes_scanned, file_scanner.found())
+
+        # String extraction and scanning are interleaved, so the time spent in each is summed piece by piece.
+        strings_seconds = 0.0
+        scan_seconds = 0.0
+        pieces = strings.iter_file_strings(filename, min_length, utf16, progress=report)
+        while True:
+            start = time.perf_counter()
+            piece = next(pieces, None)
+            fed = time.perf_counter()
+            strings_seconds += fed - start
+            if piece is None:
+                break
+            file_scanner.feed(piece)
+            scan_seconds += time.perf_counter() - fed
+        with timings.stage('scan'):
+            matches = file_scanner.close()
+        timings.add_stage('strings', strings_seconds)
+        timings.add_stage('scan', scan_seconds)
+        report(scanned[0])
+        timings.input_bytes += scanned[0]
+        self.count_matches(file_scanner, timings)
+        artifacts = self.analyze(matches, timings)
+        add_occurrences(artifacts, file_scanner)
+        if key is not None:
+            self.results.put(key, version, artifacts)
+        self.metrics.record(timings, 'file')
+        return artifacts
+
+    @staticmethod
+    def count_matches(closed_scanner, timings):
+        """ Records the match counts of a closed scanner.
+
+        :param closed_scanner: `scanner.Scanner`
+        :param timings: `metrics.Timings`
+        """
+
+        for data_type, seen in closed_scanner.first_seen.items():
+            timings.matches[data_type] += closed_scanner.count(data_type)
+            timings.unique[data_type] += len(seen)
+
+    def analyze(self, matches, timings=None):
+        """ Filters and analyzes the matches found by the scanner.
+
+        :param matches: Dictionary of data type to a List of matched Strings.
+        :param timings: Optional `metrics.Timings` receiving the stage timings.
+        :return: A list of dictionaries containing artifacts.
+        """
+
+        timings = timings if timings is not None else metrics.Timings()
+        stages = (
+            (scanner.IPV4_ADDRESS, filter_network_addresses, (
+                self.geoip_file, self.blacklist_file, self.named_networks, self.network_whitelist, self.enrichment,
+                timings
+            )),
+            (scanner.IPV6_ADDRESS, filter_ipv6_addresses, (
+                self.geoip_file, self.blacklist_file, self.named_networks, self.network_whitelist, self.enrichment,
+                timings
+            )),
+            (scanner.EMAIL, filter_email_addresses, (self.domain_whitelist,)),
+            (scanner.URL, filter_urls, (self.domain_whitelist,)),
+            (scanner.DNS_NAME, filter_hostnames, (
+                self.root_domains_file, self.domain_whitelist, self.public_suffix_file
+            )),
+        )
+        artifacts = []
+        for data_type, filter_matches, args in stages:
+            with timings.stage('analyze_' + data_type):
+                found = filter_matches(matches.get(data_type), *args)
+            timings.artifacts[data_type] += len(found)
+            artifacts.extend(found)
+        return artifacts
+
+    def extract_batch(self, documents, batch_size=100):
+        """ Extracts and analyzes artifacts from many documents. Documents are processed in batches: each document
+        is scanned on its own, the matches of the whole batch are filtered and enriched together so every unique
+        indicator is looked up once, and the artifacts are then split back out per document.
+
+        :param documents: Iterable of (document id, String) tuples
+        :param batch_size: Number of documents analyzed together.
+        :return: Generator of dictionaries with `id` and either `data`, a list of artifacts, or `error`.
+        """
+
+        batch = []
+        for document in documents:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                for result in self._analyze_batch(batch):
+                    yield result
+                batch = []
+        for result in self._analyze_batch(batch):
+            yield result
+
+    def _analyze_batch(self, batch):
+        if not batch:
+            return []
+        timings = metrics.Timings()
+        scanned = []
+        cached = {}
+        combined = {data_type: set() for data_type in scanner.DATA_TYPES}
+        for doc_id, text_blob in batch:
+            if text_blob is None:
+                scanned.append((doc_id, None, None, None, None))
+                continue
+            timings.input_bytes += len(text_blob)
+            key = self._text_key(text_blob, timings)
+            version, data = self.cached_result(key, timings)
+            if data is not None:
+                cached[len(scanned)] = data
+                scanned.append((doc_id, None, None, None, None))
+                continue
+            with timings.stage('scan'):
+                blob_scanner = self.new_scanner(len(text_blob))
+                blob_scanner.feed(text_blob)
+                matches = blob_scanner.close()
+            self.count_matches(blob_scanner, timings)
+            for data_type, found in matches.items():
+                combined[data_type].update(found)
+            scanned.append((doc_id, blob_scanner, matches, key, version))
+
+        artifacts = {}
+        if any(combined.values()):
+            combined = {data_type: list(found) for data_type, found in combined.items()}
+            for artifact in self.analyze(combined, timings):
+                artifacts[(artifact['data_type'], artifact['value'])] = artifact
+        self.metrics.record(timings, 'batch')
+
+        results = []
+        for position, (doc_id, doc_scanner, matches, key, version) in enumerate(scanned):
+            if position in cached:
+                results.append({'id': doc_id, 'data': cached[position]})
+                continue
+            if matches is None:
+                results.append({'id': doc_id, 'error': 'Expected a String or an object with a String `blob`.'})
+                continue
+            data = []
+            for data_type in scanner.DATA_TYPES:
+                found = matches[data_type]
+                if data_type == scanner.IPV6_ADDRESS:
+                    found = [i for i in dict.fromkeys(map(netindex.normalize_ipv6, found)) if i is not None]
+                for value in found:
+                    artifact = artifacts.get((data_type, value))
+                    if artifact is not None:
+                        data.append(dict(artifact))
+            add_occurrences(data, doc_scanner)
+            if key is not None:
+                self.results.put(key, version, data)
+            results.append({'id': doc_id, 'data': data})
+        return results
+
+
+def iter_api_documents(items):
+    """ Converts the items of an API request to documents. Items that aren't a String or an object with a `blob`
+    String are passed on with a `None` blob.
+
+    :param items: Iterable of Strings or dictionaries.
+    :return: Generator of (document id, String or None) tuples
+    """
+
+    for pos, item in enumerate(items):
+        if isinstance(item, dict):
+            blob = item.get('blob')
+            yield item.get('id', pos), blob if isinstance(blob, str) else None
+        else:
+            yield pos, item if isinstance(item, str) else None
+
+
+def iter_ndjson_documents(stream):
+    """ Reads API documents from an NDJSON stream one line at a time. Lines that aren't valid JSON are passed on
+    with a `None` blob.
+
+    :param stream: Binary file-like object
+    :return: Generator of (document id, String or None) tuples
+    """
+
+    def items():
+        for line in stream:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+
+    return iter_api_documents(items())
+
+
+def extract_strings(stream):
+    """ Returns a string containing strings extracted from a file. Used to process binary input.
+
+    :param stream: A file stream
+    :return: String
+    """
+
+    return ''.join(strings.iter_strings(stream))
+
+
+def get_network_addresses(text_blob, geoip_file, blacklist_file, named_networks, whitelisted_addresses):
+    """ Extracts network addresses from text.
+
+    :param text_blob: String
+    :param geoip_file: Path to the geoip database file.
+    :param blacklist_file: Path to the blacklist DB file.
+    :param named_networks: Dictionary object containing name, `ipaddress.ip_network` pairs.
+    :param whitelisted_addresses: List of `ipaddress.IPNetwork` objects used to filter matches from the results.
+    :return: A list of dictionaries containing network addresses.
+    """
+
+    return filter_network_addresses(
+        scanner.scan(text_blob, [scanner.IPV4_ADDRESS])[scanner.IPV4_ADDRESS],
+        geoip_file,
+        blacklist_file,
+        named_networks,
+        whitelisted_addresses
+    )
+
+
+def filter_network_addresses(ip_matches, geoip_file, blacklist_file, named_networks, whitelisted_addresses,
+                             enrichment_cache=None, timings=None):
+    """ De-duplicates, filters and analyzes extracted network addresses.
+
+    :param ip_matches: List of matched IP address Strings
+    :param geoip_file: Path to the geoip database file.
+    :param blacklist_file: Path to the blacklist DB file.
+    :param named_networks: Dictionary object containing name, `ipaddress.ip_network` pairs, or a
+     `netindex.NetworkIndex` compiled from them.
+    :param whitelisted_addresses: List of `ipaddress.IPNetwork` objects used to filter matches from the results, or
+     a `netindex.NetworkIndex` compiled from them.
+    :param enrichment_cache: Optional `enrichment.EnrichmentCache` holding the tags of addresses seen before.
+    :param timings: Optional `metrics.Timings` receiving the lookup timings.
+    :return: A list of dictionaries containing network addresses.
+    """
+
+    network_addresses = []
+    if ip_matches:
+        if not isinstance(whitelisted_addresses, netindex.NetworkIndex):
+            whitelisted_addresses = netindex.compile_networks({'whitelist': whitelisted_addresses})
+        for i in dedup_list(ip_matches):
+            # Filter white listed addresses.
+            if not whitelist_lookup(i, whitelisted_addresses):
+                network_addresses.append({'value': i, 'data_type': 'ipv4_address'})
+        network_addresses = analyze_network_address(
+            network_addresses,
+            geoip_file,
+            blacklist_file,
+            named_networks,
+            enrichment_cache,
+            timings
+        )
+    return network_addresses
+
+
+def get_ipv6_addresses(text_blob, geoip_file, blacklist_file, named_networks, whitelisted_addresses):
+    """ Extracts IPv6 network addresses from text.
+
+    :param text_blob: String
+    :param geoip_file: Path to the geoip database file.
+    :param blacklist_file: Path to the blacklist DB file.
+    :param named_networks: Dictionary object containing name, `ipaddress.ip_network` pairs.
+    :param whitelisted_addresses: List of `ipaddress.IPNetwork` objects used to filter matches from the results.
+    :return: A list of dictionaries containing network addresses.
+    """
+
+    return filter_ipv6_addresses(
+        scanner.scan(text_blob, [scanner.IPV6_ADDRESS])[scanner.IPV6_ADDRESS],
+        geoip_file,
+        blacklist_file,
+        named_networks,
+        whitelisted_addresses
+    )
+
+
+def filter_ipv6_addresses(ip_matches, geoip_file, blacklist_file, named_networks, whitelisted_addresses,
+                          enrichment_cache=None, timings=None):
+    """ Validates, normalizes, de-duplicates, filters and analyzes extracted IPv6 network addresses. Matches that
+    aren't valid addresses, such as times or MAC addresses, are dropped.
+
+    :param ip_matches: List of matched IPv6 address candidate Strings
+    :param geoip_file: Path to the geoip database file.
+    :param blacklist_file: Path to the blacklist DB file.
+    :param named_networks: Dictionary object containing name, `ipaddress.ip_network` pairs, or a
+     `netindex.NetworkIndex` compiled from them.
+    :param whitelisted_addresses: List of `ipaddress.IPNetwork` objects used to filter matches from the results, or
+     a `netindex.NetworkIndex` compiled from them.
+    :param enrichment_cache: Optional `enrichment.EnrichmentCache` holding the tags of addresses seen before.
+    :param timings: Optional `metrics.Timings` receiving the lookup timings.
+    :return: A list of dictionaries containing network addresses.
+    """
+
+    network_addresses = []
+    if ip_matches:
+        if not isinstance(whitelisted_addresses, netindex.NetworkIndex):
+            whitelisted_addresses = netindex.compile_networks({'whitelist': whitelisted_addresses})
+        normalized = dict.fromkeys(map(netindex.normalize_ipv6, dedup_list(ip_matches)))
+        normalized.pop(None, None)
+        for i in normalized:
+            if not whitelist_lookup(i, whitelisted_addresses):
+                network_addresses.append({'value': i, 'data_type': 'ipv6_address'})
+        network_addresses = analyze_network_address(
+            network_addresses,
+            geoip_file,
+            blacklist_file,
+            named_networks,
+            enrichment_cache,
+            timings
+        )
+    return network_addresses
+
+
+def get_email_addresses(text_blob, whitelist):
+    """ Returns a list of dict objects containing de-duplicated email addresses filtered through a white list.
+
+    :param text_blob: String
+    :param whitelist: A list of strings containing white listed domains.
+    :return: A list if dictionaries containing email addresses.
+    """
+
+    return filter_email_addresses(scanner.scan(text_blob, [scanner.EMAIL])[scanner.EMAIL], whitelist)
+
+
+def filter_email_addresses(email_matches, whitelist):
+    """ De-duplicates extracted email addresses and filters them through a white list.
+
+    :param email_matches: List of matched email address Strings
+    :param whitelist: A list of strings containing white listed domains, or a `domains.DomainWhitelist`.
+    :return: A list if dictionaries containing email addresses.
+    """
+
+    email_addresses = []
+    if email_matches:
+        whitelist = domains.compile_whitelist(whitelist)
+        for i in dedup_list(email_matches):
+            if not check_domain_whitelist(i, whitelist):
+                email_addresses.append({'value': i, 'data_type': 'email', 'tags': []})
+    return email_addresses
+
+
+def get_urls(text_blob, whitelist):
+    """ Returns a list of dict objects containing de-duplicated urls filtered through a white list.
+
+    :param text_blob: String
+    :param whitelist: A list of strings containing white listed domains.
+    :return: A list of dictionaries containing URLs.
+    """
+
+    return filter_urls(scanner.scan(text_blob, [scanner.URL])[scanner.URL], whitelist)
+
+
+def filter_urls(url_matches, whitelist):
+    """ De-duplicates extracted urls and filters them through a white list.
+
+    :param url_matches: List of matched URL Strings
+    :param whitelist: A list of strings containing white listed domains, or a `domains.DomainWhitelist`.
+    :return: A list of dictionaries containing URLs.
+    """
+
+    urls = []
+    if url_matches:
+        whitelist = domains.compile_whitelist(whitelist)
+        for i in dedup_list(url_matches):
+            if not check_domain_whitelist(i, whitelist):
+                urls.append({'value': i, 'data_type': 'url', 'tags': []})
+    return urls
+
+
+def get_hostnames(text_blob, root_domains, whitelist):
+    """ Extracts host names from text.
+
+    :param text_blob: String
+    :param root_domains: Path to the root domains file.
+    :param whitelist: A list of strings containing white listed domains.
+    :return: A list of dictionaries containing host names.
+    """
+
+    return filter_hostnames(scanner.scan(text_blob, [scanner.DNS_NAME])[scanner.DNS_NAME], root_domains, whitelist)
+
+
+def filter_hostnames(hostname_matches, root_domains, whitelist, public_suffixes=None):
+    """ De-duplicates extracted host names, validates their root domain and filters them through a white list.
+
+    :param hostname_matches: List of matched host name Strings
+    :param root_domains: Path to the root domains file.
+    :param whitelist: A list of strings containing white listed domains, or a `domains.DomainWhitelist`.
+    :param public_suffixes: Optional path to a Public Suffix List file. When given, each host name is reported
+     with its registrable domain.
+    :return: A list of dictionaries containing host names.
+    """
+
+    hostnames = []
+    if hostname_matches:
+        whitelist = domains.compile_whitelist(whitelist)
+        suffix_list = None
+        if public_suffixes and os.path.isfile(public_suffixes):
+            suffix_list = resident.get_resource(public_suffixes, domains.load_public_suffix_list).get()
+        deduped = dedup_list(hostname_matches)
+        valid = validate_root_domain(deduped, root_domains)
+        for i in valid:
+            if not check_domain_whitelist(i, whitelist):
+                hostname = {'value': i, 'data_type': 'dns_name', 'tags': []}
+                if suffix_list is not None:
+                    hostname['registrable_domain'] = suffix_list.registrable_domain(i)
+                hostnames.append(hostname)
+    return hostnames
+
+
+def check_domain_whitelist(string, whitelist):
+    """ Returns True if a white listed domain appears in the string, otherwise returns False.
+
+    :param string: A string possibly containing a domain name.
+    :param whitelist: A list of strings containing white listed domains, or a `domains.DomainWhitelist`.
+    :return: Bool
+    """
+
+    if isinstance(whitelist, domains.DomainWhitelist):
+        return whitelist.matches(string)
+    for i in whitelist:
+        if i in string:
+            return True
+    return False
+
+
+def _stamp(resource):
+    # Lookup files that don't exist yet have no version.
+    try:
+        return resource.stamp()
+    except OSError:
+        return None
+
+
+def enrichment_version(geoip_resource, blacklist_resource, named_networks):
+    """ Returns the version of the datasets the tags of an address are derived from. It changes whenever the GeoIP
+    database or the blacklist file is replaced, or the named networks are changed.
+
+    :param geoip_resource: `resident.FileResource` of the GeoIP database.
+    :param blacklist_resource: `resident.FileResource` of the blacklist DB.
+    :param named_networks: `netindex.NetworkIndex` of the named networks.
+    :return: String
+    """
+
+    return enrichment.dataset_version(geoip_resource.stamp(), blacklist_resource.stamp(), named_networks.digest())
+
+
+def analyze_network_address(ips, geoip_file, blacklist_file, named_networks, enrichment_cache=None, timings=None):
+    """ Performs geoip, blacklist, and named network lookups on network addresses. The country name is added to a
+     list object and then added to the original dictionary under the `tags` key.
+
+    The expected data structure is a list of dictionary objects with `type` and `value` keys defined.
+
+    Input Example:
+
+    ```
+    [
+      {
+        "type": "ip_address",
+        "value": "8.8.8.8"
+      },
+    ]
+    ```
+
+    :param ips: A list of dictionary objects
+    :param geoip_file: Path to the geoip database file.
+    :param blacklist_file: Path to the blacklist DB file.
+    :param named_networks: Dictionary object containing name, `ipaddress.ip_network` pairs, or a
+     `netindex.NetworkIndex` compiled from them. Every matching name is added to the tags.
+    :param enrichment_cache: Optional `enrichment.EnrichmentCache`. Addresses found in it are not looked up again
+     and the tags of the others are added to it.
+    :param timings: Optional `metrics.Timings` receiving the lookup counts and latencies and the cache hits.
+    :return:
+    """
+
+    named_networks = netindex.compile_networks(named_networks)
+
+    # Fetch the shared GeoIP reader, reopening it if the database file was replaced.
+    geoip_db = geolocation.get_database(geoip_file)
+    geoip_db.refresh()
+
+    # Fetch the resident blacklist DB. It is only rebuilt when the file changes.
+    blacklist_resource = resident.get_resource(blacklist_file, netindex.load_blacklist)
+    blacklist_memory_db = blacklist_resource.get()
+
+    cached = {}
+    computed = {}
+    if enrichment_cache is not None:
+        start = time.perf_counter()
+        enrichment_cache.set_version(enrichment_version(geoip_db.resource, blacklist_resource, named_networks))
+        cached = enrichment_cache.get_many([i['value'] for i in ips])
+        if timings is not None:
+            timings.add_lookups('enrichment_cache', len(ips), time.perf_counter() - start)
+            timings.cache_hits['enrichment'] += len(cached)
+            timings.cache_misses['enrichment'] += len(ips) - len(cached)
+
+    geoip_seconds = 0.0
+    network_seconds = 0.0
+    network_count = 0
+    geoip_hits = geoip_db.cache.hits
+    geoip_misses = geoip_db.cache.misses
+    perf_counter = time.perf_counter
+
+    # Begin analyzing extracted IP addresses. IPv4-mapped IPv6 addresses are analyzed as the IPv4 address they map.
+    for i in ips:
+        if i['value'] in cached:
+            i.update({'tags': list(cached[i['value']])})
+            continue
+        version, ip = netindex.parse_address(i['value'])
+        start = perf_counter()
+        if version == 4 and ':' in i['value']:
+            found, geo_tags = geoip_db.lookup(netindex.format_address(version, ip))
+        else:
+            found, geo_tags = geoip_db.lookup(i['value'])
+        looked_up = perf_counter()
+        geoip_seconds += looked_up - start
+        tags = list(geo_tags)
+        if found:
+            tags.extend(named_networks.lookup(ip, version))
+            tags.extend(blacklist_lookup(ip, blacklist_memory_db, version))
+            network_seconds += perf_counter() - looked_up
+            network_count += 1
+        i.update({'tags': tags})
+        computed[i['value']] = list(tags)
+    if enrichment_cache is not None and computed:
+        start = perf_counter()
+        enrichment_cache.put_many(computed)
+        if timings is not None:
+            timings.add_lookups('enrichment_cache_store', len(computed), perf_counter() - start)
+    if timings is not None:
+        timings.add_lookups('geoip', len(computed), geoip_seconds)
+        timings.add_lookups('networks', network_count, network_seconds)
+        timings.cache_hits['geoip'] += geoip_db.cache.hits - geoip_hits
+        timings.cache_misses['geoip'] += geoip_db.cache.misses - geoip_misses
+    return ips
+
+
+def named_network_lookup(ip_address, named_networks):
+    """ Returns the name of the network or `None` if no matching IP was found in the `named_networks`.
+
+    :param ip_address: `ipaddress` IPv4 or IPv6 Address object
+    :param named_networks: Dictionary object containing name, `ipaddress.ip_network` pairs, or a
+     `netindex.NetworkIndex` compiled from them. Compile the networks once when looking up many addresses.
+    :return: String or None
+    """
+
+    if isinstance(named_networks, netindex.NetworkIndex):
+        version, address = netindex.parse_address(str(ip_address))
+        names = named_networks.lookup(address, version)
+        return names[0] if names else None
+    for network_name, network_objects in named_networks.items():
+        for n in network_objects:
+            if ip_address in n:
+                return network_name
+
+    return None
+
+
+def whitelist_lookup(ip_address, whitelisted_addresses):
+    """ Returns True if `ip_address` is found in the `ipaddress.ip_networks` contained in `whitelisted_addresses`.
+    Otherwise returns False.
+
+    :param ip_address: String IPv4 or IPv6 Address
+    :param whitelisted_addresses: List of `ipaddress.IPv4Network`, or a `netindex.NetworkIndex` compiled from them.
+    :return: Bool
+    """
+    if isinstance(whitelisted_addresses, netindex.NetworkIndex):
+        version, address = netindex.parse_address(ip_address)
+        return bool(whitelisted_addresses.lookup(address, version))
+    ip = ipaddress.ip_address(ip_address)
+    for net in whitelisted_addresses:
+        if ip in net:
+            return True
+    return False
+
+
+def blacklist_lookup(ip_address, blacklist_mem_db, version=4):
+    """ Queries the in memory DB of blacklisted addresses for an IP address. Returns the names of every
+     blacklist containing the address.
+
+    :param blacklist_mem_db: `netindex.NetworkIndex` compiled from the blacklist db.
+    :param ip_address: `ipaddress.IPv4Address` object or Integer address
+    :param version: Address family, 4 or 6.
+    :return: Tuple of Strings, empty if no matching IP was found.
+    """
+
+    return blacklist_mem_db.lookup(int(ip_address), version)
+
+
+def dedup_list(items):
+    """ Performs a de-duplication routine on a list of strings. The first occurrence of each string is kept, in
+    order, and the list itself is left unchanged.
+
+    :param items: List of Strings
+    :return: De-duplicated List of Strings
+    """
+
+    return list(dict.fromkeys(items))
+
+
+def add_occurrences(artifacts, closed_scanner):
+    """ Adds the number of times each artifact was matched, `count`, and the character offset of its first match,
+    `first_seen`, from the tallies of the scanner that found it. IPv6 artifacts are normalized, so the tallies of
+    every form of the same address are combined.
+
+    :param artifacts: List of artifact dictionaries found by the scanner. They are updated in place.
+    :param closed_scanner: `scanner.Scanner`
+    :return: The List of artifacts.
+    """
+
+    occurrences = dict(closed_scanner.occurrences)
+    first_seen = dict(closed_scanner.first_seen)
+    if any(artifact['data_type'] == scanner.IPV6_ADDRESS for artifact in artifacts):
+        counts = collections.Counter()
+        offsets = {}
+        for value, offset in first_seen[scanner.IPV6_ADDRESS].items():
+            address = netindex.normalize_ipv6(value)
+            if address is not None:
+                counts[address] += occurrences[scanner.IPV6_ADDRESS][value]
+                offsets[address] = min(offset, offsets.get(address, offset))
+        occurrences[scanner.IPV6_ADDRESS] = counts
+        first_seen[scanner.IPV6_ADDRESS] = offsets
+    for artifact in artifacts:
+        artifact['count'] = occurrences[artifact['data_type']][artifact['value']]
+        artifact['first_seen'] = first_seen[artifact['data_type']][artifact['value']]
+    return artifacts
+
+
+def validate_root_domain(items, root_domains):
+    """ Filters a list of potential FQDN's by cross checking the domain with IANA's list of valid root domains.
+
+    :param items: List of FQDN strings
+    :param root_domains: Path to the root domains file.
+    :return: A filtered List of FQDN strings
+    """
+
+    roots = resident.get_resource(root_domains, domains.load_root_domains).get()
+    return [hostname for hostname in items if hostname.rsplit('.', 1)[-1] in roots]
+
+
+def convert_list_to_string(in_list):
+    """ Concatenates a list of strings into a single string.
+
+    :param in_list: List of Strings
+    :return: String
+    """
+
+    out_string = ''
+    for item in in_list:
+        out_string += item + ', '
+    return out_string[:-2]
+
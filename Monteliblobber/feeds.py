@@ -0,0 +1,413 @@
+""" Blacklist feed downloads.
+
+Every feed is cached in the feed directory: `blacklist_feed_<name>.json` holds the URL and the `ETag` and
+`Last-Modified` validators of the last download, and `blacklist_feed_<name>.ranges` and `.ranges6` hold the parsed
+IPv4 and IPv6 entries as packed integer ranges. Feeds are requested concurrently with conditional headers, so an
+unchanged feed costs a `304` and its cached ranges are reused instead of being downloaded and parsed again.
+A downloaded feed is only cached once every feed was fetched and the index built from them was written, so a
+failed update leaves nothing behind that the next update would take for already indexed. `requests` is only
+imported when feeds are downloaded.
+
+Feeds are parsed straight into integer ranges: the IPv4 entries are found with one regular expression pass and
+converted in bulk, entries in the excluded networks are dropped or clipped, and overlapping or adjacent ranges are
+collapsed. The counts of each step are kept with the cached feed.
+"""
+
+import array
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import os
+import re
+import socket
+import sys
+
+try:
+    from Monteliblobber import netindex
+except ImportError:
+    import netindex
+
+TIMEOUT = 60
+
+_FEED_LINE = re.compile(r'^(?:\d|[0-9A-Fa-f]*:)\S*', re.MULTILINE)
+# Number of addresses in an IPv4 network, by prefix length.
+_NETWORK_SIZES = {str(prefix): 1 << (32 - prefix) for prefix in range(33)}
+
+
+def new_session(workers):
+    """ Returns a `requests.Session` whose connection pool can serve `workers` concurrent downloads.
+
+    :param workers: Number of concurrent downloads.
+    :return: `requests.Session`
+    """
+
+    import requests
+    import requests.adapters
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _ipv4_ints(addresses):
+    # Converts dotted quads in bulk. Raises `OSError` if any of them isn't valid.
+    if ''.join(addresses).count('.') != 3 * len(addresses):
+        raise OSError('Not a dotted quad.')
+    packed = array.array('I')
+    packed.frombytes(b''.join(map(socket.inet_aton, addresses)))
+    if sys.byteorder == 'little':
+        packed.byteswap()
+    return packed
+
+
+def _is_ipv4(address):
+    try:
+        socket.inet_aton(address)
+    except OSError:
+        return False
+    return address.count('.') == 3
+
+
+def _ipv4_keys(entries):
+    """ Converts IPv4 entries to sort keys holding the range start in the high and the range end in the low 32
+    bits, so the ranges sort as plain integers. Invalid entries are skipped.
+
+    :param entries: List of IPv4 address or network Strings.
+    :return: List of Integers
+    """
+
+    hosts = [entry for entry in entries if '/' not in entry]
+    try:
+        addresses = _ipv4_ints(hosts)
+    except OSError:
+        addresses = _ipv4_ints([host for host in hosts if _is_ipv4(host)])
+    keys = [address * 0x100000001 for address in addresses]
+
+    # Networks are split into addresses and prefix lengths in one pass. Feeds with invalid networks are checked
+    # one network at a time instead.
+    networks = [entry for entry in entries if '/' in entry]
+    parts = '/'.join(networks).split('/') if networks else []
+    sizes = list(map(_NETWORK_SIZES.get, parts[1::2]))
+    try:
+        if len(parts) != 2 * len(networks) or None in sizes:
+            raise OSError('Invalid network.')
+        addresses = _ipv4_ints(parts[0::2])
+    except OSError:
+        networks = [entry.partition('/') for entry in networks]
+        networks = [(a, _NETWORK_SIZES[p]) for a, _, p in networks if p in _NETWORK_SIZES and _is_ipv4(a)]
+        addresses = _ipv4_ints([address for address, _ in networks])
+        sizes = [size for _, size in networks]
+    keys.extend([(address & -size) * 0x100000001 + size - 1 for address, size in zip(addresses, sizes)])
+    return keys
+
+
+def subtract_ranges(ranges, excluded):
+    """ Removes the excluded parts of ranges.
+
+    :param ranges: List of disjoint (version, start, end) Integer tuples of one family, sorted.
+    :param excluded: List of disjoint (start, end) Integer tuples, sorted.
+    :return: List of disjoint (version, start, end) Integer tuples, sorted.
+    """
+
+    kept = []
+    excluded = iter(excluded)
+    no_more = (float('inf'), float('inf'))
+    ex_start, ex_end = next(excluded, no_more)
+    for version, start, end in ranges:
+        while ex_end < start:
+            ex_start, ex_end = next(excluded, no_more)
+        while ex_start <= end:
+            if start < ex_start:
+                kept.append((version, start, ex_start - 1))
+            if ex_end >= end:
+                start = end + 1
+                break
+            start = ex_end + 1
+            ex_start, ex_end = next(excluded, no_more)
+        if start <= end:
+            kept.append((version, start, end))
+    return kept
+
+
+def collapse_ranges(version, ranges, excluded=()):
+    """ Merges the ranges that overlap or are adjacent, dropping the ranges that lie within an excluded range and
+    clipping the ranges that overlap one.
+
+    :param version: Address family of the ranges, 4 or 6.
+    :param ranges: Iterable of (start, end) Integer tuples, sorted.
+    :param excluded: List of disjoint (start, end) Integer tuples, sorted.
+    :return: Tuple of (List of disjoint (version, start, end) tuples, sorted, number of ranges dropped, number of
+     ranges merged into another)
+    """
+
+    collapsed = []
+    dropped = 0
+    merged = 0
+    clip = False
+    excluded_ranges = iter(excluded)
+    no_more = (float('inf'), float('inf'))
+    ex_start, ex_end = next(excluded_ranges, no_more)
+    last_end = -2
+    for start, end in ranges:
+        while ex_end < start:
+            ex_start, ex_end = next(excluded_ranges, no_more)
+        if ex_start <= end:
+            if ex_start <= start and end <= ex_end:
+                dropped += 1
+                continue
+            clip = True
+        if start <= last_end + 1:
+            merged += 1
+            if end > last_end:
+                collapsed[-1] = (version, collapsed[-1][1], end)
+                last_end = end
+        else:
+            collapsed.append((version, start, end))
+            last_end = end
+    # Few ranges overlap an excluded range without lying within it, so they are clipped in a second pass.
+    if clip:
+        collapsed = subtract_ranges(collapsed, excluded)
+    return collapsed, dropped, merged
+
+
+def parse_feed(text, excluded_networks=(), ip_filter=None):
+    """ Parses the addresses and networks in a FireHol `.ipset` or `.netset` file into collapsed ranges.
+
+    :param text: String contents of the feed.
+    :param excluded_networks: List of network Strings, or a `netindex.NetworkIndex` compiled from them. Entries in
+     these networks are dropped and networks overlapping them are clipped.
+    :param ip_filter: Optional regular expression String. Matching entries are dropped.
+    :return: Tuple of (List of (version, start, end) Integer tuples, Dictionary of counts: `entries` found,
+     `invalid` entries, `excluded` entries, entries `merged` into another range and `ranges` kept)
+    """
+
+    if not isinstance(excluded_networks, netindex.NetworkIndex):
+        excluded_networks = netindex.compile_networks({'excluded': excluded_networks})
+    entries = _FEED_LINE.findall(text)
+    kept = entries
+    if ip_filter:
+        match = re.compile(ip_filter).match
+        kept = [entry for entry in entries if not match(entry)]
+    filtered = len(entries) - len(kept)
+
+    ipv6 = [entry for entry in kept if ':' in entry]
+    keys = _ipv4_keys([entry for entry in kept if ':' not in entry] if ipv6 else kept)
+    keys.sort()
+    ranges6 = []
+    for entry in ipv6:
+        try:
+            ranges6.append(netindex.ip_range(entry)[1:])
+        except (OSError, ValueError):
+            pass
+    ranges6.sort()
+    invalid = len(kept) - len(keys) - len(ranges6)
+
+    ranges, dropped, merged = collapse_ranges(
+        4, map(divmod, keys, itertools.repeat(1 << 32)), list(zip(excluded_networks.starts, excluded_networks.ends))
+    )
+    if ranges6:
+        excluded6 = excluded_networks.ipv6
+        ranges6, dropped6, merged6 = collapse_ranges(
+            6, ranges6, list(zip(excluded6.starts, excluded6.ends)) if excluded6 is not None else ()
+        )
+        ranges.extend(ranges6)
+        dropped += dropped6
+        merged += merged6
+    return ranges, {
+        'entries': len(entries),
+        'invalid': invalid,
+        'excluded': filtered + dropped,
+        'merged': merged,
+        'ranges': len(ranges),
+    }
+
+
+def _paths(cache_dir, name):
+    base = os.path.join(cache_dir, 'blacklist_feed_' + re.sub(r'[^\w.-]', '_', name))
+    return base + '.json', base + '.ranges'
+
+
+def load_ranges(filename):
+    """ Reads the cached ranges of a feed. IPv6 ranges are read from the `6` suffixed file next to it, when present.
+
+    :param filename: Path to the ranges file.
+    :return: List of (version, start, end) Integer tuples
+    """
+
+    packed = array.array('I')
+    with open(filename, 'rb') as f:
+        packed.frombytes(f.read())
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    ranges = [(4, start, end) for start, end in zip(packed[0::2], packed[1::2])]
+    if os.path.isfile(filename + '6'):
+        with open(filename + '6', 'rb') as f:
+            data = f.read()
+        bounds = [int.from_bytes(data[i:i + 16], 'big') for i in range(0, len(data), 16)]
+        ranges.extend((6, start, end) for start, end in zip(bounds[0::2], bounds[1::2]))
+    return ranges
+
+
+def save_ranges(ranges, filename):
+    """ Writes the ranges of a feed to the cache. IPv4 ranges are packed as u32 pairs and IPv6 ranges as 16 byte
+    big-endian pairs in the `6` suffixed file.
+
+    :param ranges: List of (version, start, end) Integer tuples
+    :param filename: Path to the ranges file.
+    """
+
+    packed = array.array('I', [bound for version, start, end in ranges if version == 4 for bound in (start, end)])
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    packed6 = b''.join(
+        start.to_bytes(16, 'big') + end.to_bytes(16, 'big') for version, start, end in ranges if version == 6
+    )
+    for path, data in ((filename, packed.tobytes()), (filename + '6', packed6)):
+        temp_filename = path + '.tmp'
+        with open(temp_filename, 'wb') as f:
+            f.write(data)
+        os.replace(temp_filename, path)
+
+
+def filter_version(excluded_networks, ip_filter=None):
+    """ Returns a String identifying the filters feeds are parsed with, so cached feeds are parsed again when the
+    filters change.
+
+    :param excluded_networks: `netindex.NetworkIndex` of the excluded networks.
+    :param ip_filter: Optional regular expression String.
+    :return: String
+    """
+
+    return hashlib.sha1('{}\n{}'.format(excluded_networks.digest(), ip_filter or '').encode('utf-8')).hexdigest()[:16]
+
+
+def fetch_feed(session, name, url, cache_dir, excluded_networks, ip_filter=None):
+    """ Downloads one feed unless the server reports it unchanged since the cached copy, and the cached copy was
+    parsed with the same filters. A downloaded feed isn't cached here; pass its metadata to `save_feed`.
+
+    :param session: `requests.Session`
+    :param name: Name of the blacklist.
+    :param url: The blacklist file URL.
+    :param cache_dir: Directory holding the feed cache.
+    :param excluded_networks: `netindex.NetworkIndex` of the networks dropped from the feed.
+    :param ip_filter: Optional regular expression String. Matching entries are dropped.
+    :return: Tuple of (List of (version, start, end) tuples, metadata Dictionary to cache if the feed changed or
+     None, Dictionary of the counts of the last parse, see `parse_feed`)
+    """
+
+    meta_filename, ranges_filename = _paths(cache_dir, name)
+    filters = filter_version(excluded_networks, ip_filter)
+    meta = {}
+    if os.path.isfile(meta_filename) and os.path.isfile(ranges_filename):
+        with open(meta_filename) as f:
+            meta = json.load(f)
+        if meta.get('url') != url or meta.get('filters') != filters:
+            meta = {}
+
+    headers = {}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+
+    r = session.get(url, headers=headers, timeout=TIMEOUT)
+    if r.status_code == 304 and meta:
+        return load_ranges(ranges_filename), None, meta.get('stats', {})
+    r.raise_for_status()
+
+    ranges, stats = parse_feed(r.text, excluded_networks, ip_filter)
+    return ranges, {
+        'url': url,
+        'etag': r.headers.get('ETag'),
+        'last_modified': r.headers.get('Last-Modified'),
+        'filters': filters,
+        'stats': stats
+    }, stats
+
+
+def save_feed(cache_dir, name, ranges, meta):
+    """ Caches a downloaded feed: its ranges, then the metadata holding its validators, so validators are never
+    saved without the ranges they belong to.
+
+    :param cache_dir: Directory holding the feed cache.
+    :param name: Name of the blacklist.
+    :param ranges: List of (version, start, end) tuples
+    :param meta: Metadata Dictionary returned by `fetch_feed`.
+    """
+
+    meta_filename, ranges_filename = _paths(cache_dir, name)
+    save_ranges(ranges, ranges_filename)
+    temp_filename = meta_filename + '.tmp'
+    with open(temp_filename, 'w') as f:
+        json.dump(meta, f)
+    os.replace(temp_filename, meta_filename)
+
+
+def update_feeds(blacklist_config, cache_dir, excluded_networks=(), workers=4, ip_filter=None, commit=None):
+    """ Fetches every configured feed concurrently. The feeds that changed are cached once all of them were
+    fetched and `commit` returned, so when a download or `commit` fails they are downloaded again next time.
+
+    :param blacklist_config: A dict object containing Name/Url key value pairs.
+    :param cache_dir: Directory holding the feed cache.
+    :param excluded_networks: List of network Strings, or a `netindex.NetworkIndex` compiled from them. Entries in
+     these networks are dropped.
+    :param workers: Number of concurrent downloads.
+    :param ip_filter: Optional regular expression String. Matching entries are dropped.
+    :param commit: Optional callable receiving the ranges by name and the names of the feeds that changed, such as
+     a function writing the index built from them.
+    :return: Tuple of (Dictionary of name to ranges in config order, List of names of the feeds that changed,
+     Dictionary of name to the counts of the last parse of the feed)
+    """
+
+    if not os.path.isdir(cache_dir):
+        os.mkdir(cache_dir)
+    if not isinstance(excluded_networks, netindex.NetworkIndex):
+        excluded_networks = netindex.compile_networks({'excluded': excluded_networks})
+    workers = max(1, min(workers, len(blacklist_config)))
+    with new_session(workers) as session, concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            name: executor.submit(fetch_feed, session, name, url, cache_dir, excluded_networks, ip_filter)
+            for name, url in blacklist_config.items()
+        }
+        feeds = {}
+        pending = {}
+        stats = {}
+        for name, future in futures.items():
+            feeds[name], meta, stats[name] = future.result()
+            if meta is not None:
+                pending[name] = meta
+    changed = list(pending)
+    if commit is not None:
+        commit(feeds, changed)
+    for name, meta in pending.items():
+        save_feed(cache_dir, name, feeds[name], meta)
+    return feeds, changed, stats
+
+
+def total_stats(stats):
+    """ Adds up the parse counts of several feeds.
+
+    :param stats: Dictionary of feed name to the counts returned by `parse_feed`.
+    :return: Dictionary of counts.
+    """
+
+    totals = {'entries': 0, 'invalid': 0, 'excluded': 0, 'merged': 0, 'ranges': 0}
+    for feed_stats in stats.values():
+        for key in totals:
+            totals[key] += feed_stats.get(key, 0)
+    return totals
+
+
+def compile_feeds(feeds):
+    """ Compiles feed ranges into a `netindex.NetworkIndex`.
+
+    :param feeds: Dictionary of blacklist name to a List of (version, start, end) tuples.
+    :return: `netindex.NetworkIndex`
+    """
+
+    return netindex.NetworkIndex.from_family_ranges(
+        (version, start, end, name) for name, ranges in feeds.items() for version, start, end in ranges
+    )
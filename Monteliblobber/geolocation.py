@@ -0,0 +1,133 @@
+""" Shared GeoIP reader with a cache of derived address tags.
+
+`geoip2` is imported when the first database is opened, so importing this module doesn't pay for it.
+"""
+
+import ipaddress
+import os
+import threading
+
+try:
+    from Monteliblobber import cache, resident
+except ImportError:
+    import cache
+    import resident
+
+DEFAULT_CACHE_SIZE = 65536
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def open_reader(filename):
+    """ Opens a GeoIP database with the memory-mapped C extension, falling back to the pure Python mmap reader
+    when the extension isn't installed.
+
+    :param filename: Path to the geoip database file.
+    :return: `geoip2.database.Reader`
+    """
+
+    import geoip2.database
+    import maxminddb
+
+    try:
+        return geoip2.database.Reader(filename, mode=maxminddb.MODE_MMAP_EXT)
+    except ValueError:
+        return geoip2.database.Reader(filename, mode=maxminddb.MODE_MMAP)
+
+
+def special_purpose_tag(ip):
+    """ Returns a tag describing addresses that are not in the GeoIP database.
+
+    :param ip: `ipaddress.IPv4Address` or `ipaddress.IPv6Address` object
+    :return: String or None
+    """
+
+    if ip.is_link_local:
+        return 'Link Local'
+    elif ip.is_loopback:
+        return 'Loopback'
+    elif ip.is_multicast:
+        return 'Multicast'
+    elif ip.is_private:
+        return 'Private'
+    elif ip.is_reserved:
+        return 'Reserved'
+    elif ip.is_unspecified:
+        return 'Unspecified'
+    return None
+
+
+class GeoIPDatabase(object):
+    """ Keeps one GeoIP reader open for the life of the process and caches the tags derived for each address.
+    The reader is reopened, and the cache emptied, when the database file is replaced.
+    """
+
+    def __init__(self, filename, cache_size=DEFAULT_CACHE_SIZE):
+        self.resource = resident.FileResource(filename, open_reader)
+        self.cache = cache.LRUCache(cache_size)
+        self._reader = None
+        self._not_found = None
+
+    def refresh(self):
+        """ Picks up a replaced database file. Called once per batch of lookups rather than per address.
+
+        :return: `geoip2.database.Reader`
+        """
+
+        reader = self.resource.get()
+        if reader is not self._reader:
+            import geoip2.errors
+            self.cache.clear()
+            self._not_found = geoip2.errors.AddressNotFoundError
+            self._reader = reader
+        return reader
+
+    def reload(self):
+        """ Reopens the database file after the updater replaced it.
+        """
+
+        self.resource.reload()
+        self.refresh()
+
+    def lookup(self, address):
+        """ Returns the GeoIP tags for an address. Addresses missing from the database are tagged with their
+        special purpose range instead.
+
+        :param address: String IPv4 or IPv6 Address
+        :return: Tuple of (found Bool, Tuple of tags)
+        """
+
+        entry = self.cache.get(address)
+        if entry is None:
+            if self._reader is None:
+                self.refresh()
+            entry = self._lookup(address)
+            self.cache.put(address, entry)
+        return entry
+
+    def _lookup(self, address):
+        try:
+            result = self._reader.city(address)
+        except self._not_found:
+            return False, (special_purpose_tag(ipaddress.ip_address(address)),)
+        tags = [result.registered_country.name]
+        if result.traits.is_anonymous_proxy:
+            tags.append('Anon Proxy')
+        return True, tuple(tags)
+
+
+def get_database(filename, cache_size=DEFAULT_CACHE_SIZE):
+    """ Returns the process-wide `GeoIPDatabase` for a database file, creating it on first use.
+
+    :param filename: Path to the geoip database file.
+    :param cache_size: Maximum number of cached addresses, used when the database is first created.
+    :return: `GeoIPDatabase`
+    """
+
+    key = os.path.abspath(filename)
+    database = _registry.get(key)
+    if database is None:
+        with _registry_lock:
+            database = _registry.setdefault(key, GeoIPDatabase(filename, cache_size))
+    return database
@@ -0,0 +1,274 @@
+""" Background jobs for long running extractions.
+
+A `JobQueue` keeps its jobs in memory. Given a spool directory it also writes the status and results of every job
+there, so several worker processes sharing the directory can each answer for the jobs run by the others.
+"""
+
+import concurrent.futures
+import json
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+import uuid
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+
+# Minimum number of seconds between two writes of the progress of a spooled job.
+PROGRESS_INTERVAL = 0.5
+
+_JOB_ID = re.compile(r'[0-9a-f]{32}')
+
+
+class Job(object):
+    """ The state of one background extraction. Progress fields are updated by the worker while it runs.
+    """
+
+    def __init__(self, name=None, bytes_total=0):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.status = QUEUED
+        self.created = time.time()
+        self.finished = None
+        self.bytes_total = bytes_total
+        self.bytes_scanned = 0
+        self.indicators_found = 0
+        self.results = None
+        self.error = None
+        self.listener = None
+
+    @classmethod
+    def from_dict(cls, status):
+        """ Builds a job from the status returned by `to_dict`, without its results.
+
+        :param status: Dictionary
+        :return: `Job`
+        """
+
+        job = cls()
+        for key, value in status.items():
+            setattr(job, key, value)
+        return job
+
+    def progress(self, bytes_scanned, indicators_found):
+        """ Records worker progress.
+
+        :param bytes_scanned: Number of input bytes processed so far.
+        :param indicators_found: Number of unique indicators found so far.
+        """
+
+        self.bytes_scanned = bytes_scanned
+        self.indicators_found = indicators_found
+        if self.listener is not None:
+            self.listener(self)
+
+    def to_dict(self):
+        """ Returns the job status without the results.
+
+        :return: Dictionary
+        """
+
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'created': self.created,
+            'finished': self.finished,
+            'bytes_total': self.bytes_total,
+            'bytes_scanned': self.bytes_scanned,
+            'indicators_found': self.indicators_found,
+            'error': self.error
+        }
+
+
+class JobQueue(object):
+    """ Runs jobs on a pool of worker threads and keeps finished jobs until they expire.
+
+    With a `spool_dir` the status of each job is written to `<id>.json` as it changes, and the results of a finished
+    job to `<id>.results`, before the status. Jobs that aren't in memory are read from the spool, and read again
+    when their files are replaced.
+    """
+
+    def __init__(self, workers=2, ttl=3600, spool_dir=None):
+        self.ttl = ttl
+        self.spool_dir = spool_dir
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self._jobs = {}
+        self._spooled = {}
+        self._saved = {}
+        self._spool_purged = 0
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, name=None, bytes_total=0, cleanup=None):
+        """ Queues `func(job, *args)`. The return value of `func` becomes the job results.
+
+        :param func: Callable that runs the job. It receives the `Job` as its first argument.
+        :param name: Display name of the job.
+        :param bytes_total: Size of the input, used for progress reporting.
+        :param cleanup: Optional callable run after the job finishes or fails.
+        :return: `Job`
+        """
+
+        self.purge()
+        job = Job(name, bytes_total)
+        with self._lock:
+            self._jobs[job.id] = job
+        if self.spool_dir is not None:
+            job.listener = self._save_progress
+            self.save(job)
+        self._executor.submit(self._run, job, func, args, cleanup)
+        return job
+
+    def add(self, results, name=None):
+        """ Records results produced outside of the queue, such as those of a text submission, as a finished job
+        so they can be paged and exported like the results of any other job.
+
+        :param results: The job results.
+        :param name: Display name of the job.
+        :return: `Job`
+        """
+
+        self.purge()
+        job = Job(name)
+        job.results = results
+        job.status = FINISHED
+        job.finished = time.time()
+        with self._lock:
+            self._jobs[job.id] = job
+        self.save(job)
+        return job
+
+    def get(self, job_id):
+        """ Returns a job by id, or `None` if it is unknown or expired.
+
+        :param job_id: String
+        :return: `Job` or None
+        """
+
+        self.purge()
+        job = self._jobs.get(job_id)
+        # A finished job can be changed by another process, so its spooled copy is the current one.
+        if self.spool_dir is not None and (job is None or job.finished is not None) and _JOB_ID.fullmatch(job_id):
+            job = self._load(job_id) or job
+        return job
+
+    def save(self, job):
+        """ Writes a job to the spool directory, so the other processes sharing it see its status and results. Call
+        it after changing the results of a finished job. Does nothing without a spool directory.
+
+        :param job: `Job`
+        """
+
+        if self.spool_dir is None:
+            return
+        if job.status == FINISHED:
+            self._write(job.id + '.results', pickle.dumps(job.results, pickle.HIGHEST_PROTOCOL))
+        self._write(job.id + '.json', json.dumps(job.to_dict()).encode('utf-8'))
+        if job.finished is not None:
+            with self._lock:
+                self._spooled[job.id] = ((self._stamp(job.id + '.json'), self._stamp(job.id + '.results')), job)
+
+    def shutdown(self, wait=True):
+        """ Stops accepting jobs.
+
+        :param wait: Wait for the queued and running jobs to finish.
+        """
+
+        self._executor.shutdown(wait)
+
+    def purge(self):
+        """ Drops finished jobs older than the TTL along with their results.
+        """
+
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [i for i, job in self._jobs.items() if job.finished is not None and job.finished < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+            expired = [i for i, (_, job) in self._spooled.items() if job.finished is not None and job.finished < cutoff]
+            for job_id in expired:
+                del self._spooled[job_id]
+        if self.spool_dir is not None and time.time() - self._spool_purged > min(self.ttl, 60):
+            self._spool_purged = time.time()
+            self._purge_spool(cutoff)
+
+    def _purge_spool(self, cutoff):
+        # Every process sharing the spool purges it; files another process already removed are skipped.
+        for entry in os.scandir(self.spool_dir):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _write(self, name, data):
+        # Written to a temporary file and renamed, so readers never see a partial file.
+        fd, temp_name = tempfile.mkstemp(dir=self.spool_dir, prefix='.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_name, os.path.join(self.spool_dir, name))
+        except BaseException:
+            os.remove(temp_name)
+            raise
+
+    def _stamp(self, name):
+        try:
+            st = os.stat(os.path.join(self.spool_dir, name))
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_ino
+
+    def _load(self, job_id):
+        stamp = (self._stamp(job_id + '.json'), self._stamp(job_id + '.results'))
+        if stamp[0] is None:
+            return None
+        spooled_stamp, spooled = self._spooled.get(job_id, (None, None))
+        if stamp == spooled_stamp:
+            return spooled
+        try:
+            with open(os.path.join(self.spool_dir, job_id + '.json'), 'rb') as f:
+                job = Job.from_dict(json.loads(f.read().decode('utf-8')))
+            if job.status == FINISHED:
+                with open(os.path.join(self.spool_dir, job_id + '.results'), 'rb') as f:
+                    job.results = pickle.load(f)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            # Purged or replaced while it was read.
+            return spooled
+        with self._lock:
+            self._spooled[job_id] = (stamp, job)
+        return job
+
+    def _save_progress(self, job):
+        now = time.monotonic()
+        if now - self._saved.get(job.id, 0) >= PROGRESS_INTERVAL:
+            self._saved[job.id] = now
+            self.save(job)
+
+    def _run(self, job, func, args, cleanup):
+        job.status = RUNNING
+        try:
+            self.save(job)
+            job.results = func(job, *args)
+            job.status = FINISHED
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+            job.listener = None
+            self._saved.pop(job.id, None)
+            try:
+                self.save(job)
+            except (OSError, pickle.PicklingError) as e:
+                job.results = None
+                job.error = 'The results could not be saved: {}'.format(e)
+                job.status = FAILED
+            finally:
+                if cleanup is not None:
+                    cleanup()
@@ -0,0 +1,353 @@
+""" Timing and counting of the extraction hot path.
+
+A `Timings` object collects the stage durations and counters of one extraction: input size, matches per data type
+before and after de-duplication, artifacts kept, lookup latencies and cache hits. It can be returned with a single
+response. A `Registry` accumulates the timings of every extraction of a process, plus HTTP request timings, and
+renders them in the Prometheus text exposition format.
+
+Processes serving the same application share their metrics through a directory: each one writes a snapshot of its
+registry and cache gauges to it with `write_snapshot`, and `render_shared` renders the sum of the counters and
+histograms of every snapshot, so a scrape answered by any process reports the totals of all of them.
+"""
+
+import bisect
+import collections
+import contextlib
+import cProfile
+import glob
+import json
+import os
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds of the duration histogram buckets, in seconds.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+# Metric name to (type, help text).
+METRICS = {
+    'monteliblobber_extractions_total': ('counter', 'Extractions run, by input source.'),
+    'monteliblobber_input_bytes_total': ('counter', 'Characters or bytes of input extracted from.'),
+    'monteliblobber_stage_seconds': ('histogram', 'Duration of each extraction stage.'),
+    'monteliblobber_matches_total': ('counter', 'Pattern matches found, duplicates included, by data type.'),
+    'monteliblobber_unique_matches_total': ('counter', 'Unique pattern matches found, by data type.'),
+    'monteliblobber_artifacts_total': ('counter', 'Artifacts returned after filtering, by data type.'),
+    'monteliblobber_lookups_total': ('counter', 'Address lookups, by lookup.'),
+    'monteliblobber_lookup_seconds_total': ('counter', 'Time spent in address lookups, by lookup.'),
+    'monteliblobber_cache_hits_total': ('counter', 'Lookup and result cache hits, by cache.'),
+    'monteliblobber_cache_misses_total': ('counter', 'Lookup and result cache misses, by cache.'),
+    'monteliblobber_cache_entries': ('gauge', 'Entries held by a lookup or result cache, by cache.'),
+    'monteliblobber_http_request_seconds': ('histogram', 'Duration of HTTP requests, by endpoint.'),
+    'monteliblobber_http_responses_total': ('counter', 'HTTP responses, by endpoint and status code.'),
+}
+
+
+class Timings(object):
+    """ Stage durations and counters of one extraction. Not thread safe; each extraction has its own.
+    """
+
+    def __init__(self):
+        self.stages = collections.OrderedDict()
+        self.input_bytes = 0
+        self.matches = collections.Counter()
+        self.unique = collections.Counter()
+        self.artifacts = collections.Counter()
+        self.lookups = collections.Counter()
+        self.lookup_seconds = collections.Counter()
+        self.cache_hits = collections.Counter()
+        self.cache_misses = collections.Counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """ Times the body of a `with` block as a stage. Repeated stages add up.
+
+        :param name: Stage name String.
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    def add_stage(self, name, seconds):
+        """ Adds time to a stage.
+
+        :param name: Stage name String.
+        :param seconds: Float
+        """
+
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_lookups(self, name, count, seconds):
+        """ Records a number of lookups and the time they took.
+
+        :param name: Lookup name String, such as `geoip`.
+        :param count: Number of lookups.
+        :param seconds: Float
+        """
+
+        self.lookups[name] += count
+        self.lookup_seconds[name] += seconds
+
+    def to_dict(self):
+        """ Returns the timings for a response. Durations are in milliseconds; `dedup_ratio` is the number of
+        matches per unique match.
+
+        :return: Dictionary
+        """
+
+        return {
+            'total_ms': round(sum(self.stages.values()) * 1000, 3),
+            'stages_ms': {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()},
+            'input_bytes': self.input_bytes,
+            'matches': dict(self.matches),
+            'unique_matches': dict(self.unique),
+            'dedup_ratio': {
+                data_type: round(count / self.unique[data_type], 3)
+                for data_type, count in self.matches.items() if self.unique[data_type]
+            },
+            'artifacts': dict(self.artifacts),
+            'lookups': {
+                name: {'count': count, 'ms': round(self.lookup_seconds[name] * 1000, 3)}
+                for name, count in self.lookups.items()
+            },
+            'cache_hits': dict(self.cache_hits),
+            'cache_misses': dict(self.cache_misses),
+        }
+
+
+class Histogram(object):
+    """ Cumulative bucket counts, sum and count of observed values.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    pairs = ('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in labels)
+    return '{' + ','.join(pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class Registry(object):
+    """ Process-wide counters and histograms, keyed by metric name and a sorted tuple of label pairs.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counters = collections.defaultdict(int)
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """ Adds to a counter.
+
+        :param name: Metric name String.
+        :param value: Amount to add.
+        :param labels: Label values.
+        """
+
+        with self._lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name, value, **labels):
+        """ Records a value in a histogram.
+
+        :param name: Metric name String.
+        :param value: Float
+        :param labels: Label values.
+        """
+
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def record(self, timings, source):
+        """ Adds the timings of one extraction.
+
+        :param timings: `Timings`
+        :param source: Name of the input source, such as `text` or `file`.
+        """
+
+        self.inc('monteliblobber_extractions_total', source=source)
+        self.inc('monteliblobber_input_bytes_total', timings.input_bytes, source=source)
+        for stage, seconds in timings.stages.items():
+            self.observe('monteliblobber_stage_seconds', seconds, stage=stage)
+        for name, counter in (
+                ('monteliblobber_matches_total', timings.matches),
+                ('monteliblobber_unique_matches_total', timings.unique),
+                ('monteliblobber_artifacts_total', timings.artifacts)
+        ):
+            for data_type, count in counter.items():
+                self.inc(name, count, data_type=data_type)
+        for lookup, count in timings.lookups.items():
+            self.inc('monteliblobber_lookups_total', count, lookup=lookup)
+            self.inc('monteliblobber_lookup_seconds_total', timings.lookup_seconds[lookup], lookup=lookup)
+        for cache_name, count in timings.cache_hits.items():
+            self.inc('monteliblobber_cache_hits_total', count, cache=cache_name)
+        for cache_name, count in timings.cache_misses.items():
+            self.inc('monteliblobber_cache_misses_total', count, cache=cache_name)
+
+    def snapshot(self):
+        """ Returns the counters and histograms in a JSON serializable form, for `merge`.
+
+        :return: Dictionary
+        """
+
+        with self._lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, labels, histogram.counts, histogram.sum, histogram.count]
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+            }
+
+    def merge(self, snapshot):
+        """ Adds the counters and histograms of a snapshot taken with the same buckets.
+
+        :param snapshot: Dictionary returned by `snapshot`.
+        """
+
+        with self._lock:
+            for name, labels, value in snapshot['counters']:
+                self.counters[(name, tuple(map(tuple, labels)))] += value
+            for name, labels, counts, total, count in snapshot['histograms']:
+                key = (name, tuple(map(tuple, labels)))
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram(self.buckets)
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.sum += total
+                histogram.count += count
+
+    def render(self, gauges=()):
+        """ Renders every metric in the Prometheus text exposition format.
+
+        :param gauges: Iterable of (name, labels dictionary, value) tuples sampled at render time.
+        :return: String
+        """
+
+        samples = collections.defaultdict(list)
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                samples[name].append(name + _labels(labels) + ' ' + _number(value))
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    samples[name].append(
+                        name + '_bucket' + _labels(labels + (('le', le),)) + ' ' + str(cumulative)
+                    )
+                samples[name].append(name + '_sum' + _labels(labels) + ' ' + repr(histogram.sum))
+                samples[name].append(name + '_count' + _labels(labels) + ' ' + str(histogram.count))
+        for name, labels, value in gauges:
+            samples[name].append(name + _labels(tuple(sorted(labels.items()))) + ' ' + _number(value))
+
+        lines = []
+        for name in sorted(samples):
+            metric_type, help_text = METRICS.get(name, ('untyped', name))
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} {}'.format(name, metric_type))
+            lines.extend(samples[name])
+        return '\n'.join(lines) + '\n'
+
+
+def _snapshot_filename(directory, pid):
+    return os.path.join(directory, 'metrics_{}.json'.format(pid))
+
+
+def write_snapshot(registry, directory, gauges=()):
+    """ Writes the snapshot of the registry and gauges of this process to a shared metrics directory, replacing the
+    previous one.
+
+    :param registry: `Registry`
+    :param directory: Path to the shared directory.
+    :param gauges: Iterable of (name, labels dictionary, value) tuples sampled now.
+    """
+
+    snapshot = registry.snapshot()
+    snapshot['gauges'] = [list(gauge) for gauge in gauges]
+    filename = _snapshot_filename(directory, os.getpid())
+    # A scrape and the periodic snapshot may write at once, so each thread writes its own temporary file.
+    temp_filename = '{}.{}.tmp'.format(filename, threading.get_ident())
+    with open(temp_filename, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(temp_filename, filename)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def render_shared(directory, buckets=DEFAULT_BUCKETS):
+    """ Renders the sum of the snapshots in a shared metrics directory. The counters and histograms of processes
+    that exited are kept, so the totals never go backwards when a worker is replaced. Gauges describe one process,
+    such as the entries of its caches, so they are rendered with a `pid` label for each process still running.
+
+    :param directory: Path to the shared directory.
+    :param buckets: Buckets the snapshots were taken with.
+    :return: String
+    """
+
+    registry = Registry(buckets)
+    gauges = []
+    for filename in sorted(glob.glob(_snapshot_filename(directory, '*'))):
+        try:
+            with open(filename) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        registry.merge(snapshot)
+        pid = int(os.path.basename(filename)[len('metrics_'):-len('.json')])
+        if _alive(pid):
+            gauges.extend((name, dict(labels, pid=pid), value) for name, labels, value in snapshot['gauges'])
+    return registry.render(gauges)
+
+
+class Profile(object):
+    """ A cProfile capture of one request, written to a `pstats` file when it stops.
+    """
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self, filename):
+        """ Stops profiling and writes the statistics.
+
+        :param filename: Path of the `.prof` file, readable with `pstats` or snakeviz.
+        """
+
+        self.profiler.disable()
+        self.profiler.dump_stats(filename)
@@ -1,20 +1,62 @@
 """ Monteliblobber: A reasonable way to extract and contextualize network artifacts from blobs.
+
+The web application is built by `create_app`. Importing this module builds nothing: the module level `app` is
+created on first access, and the lookup files are loaded on the first extraction. `requests` is only imported by
+the updaters and `geoip2` when the GeoIP database is first opened.
 """
 
-from flask import Flask, render_template, request, jsonify, json, abort
+from flask import (
+    Blueprint, Flask, Response, abort, current_app, g, has_app_context, json, jsonify, make_response,
+    render_template, request, stream_with_context
+)
 from werkzeug.utils import secure_filename
+import concurrent.futures
 import ipaddress
-import re
-import geoip2.database
-import requests
 import gzip
 import os
 import sys
-import string
-import webbrowser
+import tempfile
+import threading
+import time
+
+# The extraction functions live in `extractor` and are re-exported here for code that imports them from this module.
+try:
+    from Monteliblobber import extractor, feeds, jobs, metrics, netindex, results, strings
+    from Monteliblobber.extractor import (  # noqa: F401
+        analyze_network_address, blacklist_lookup, check_domain_whitelist, convert_list_to_string, dedup_list,
+        extract_strings, filter_email_addresses, filter_hostnames, filter_ipv6_addresses, filter_network_addresses,
+        filter_urls, get_email_addresses, get_hostnames, get_ipv6_addresses, get_network_addresses, get_urls,
+        iter_api_documents, iter_ndjson_documents, named_network_lookup, validate_root_domain, whitelist_lookup
+    )
+except ImportError:
+    import extractor
+    import feeds
+    import jobs
+    import metrics
+    import netindex
+    import results
+    import strings
+    from extractor import (  # noqa: F401
+        analyze_network_address, blacklist_lookup, check_domain_whitelist, convert_list_to_string, dedup_list,
+        extract_strings, filter_email_addresses, filter_hostnames, filter_ipv6_addresses, filter_network_addresses,
+        filter_urls, get_email_addresses, get_hostnames, get_ipv6_addresses, get_network_addresses, get_urls,
+        iter_api_documents, iter_ndjson_documents, named_network_lookup, validate_root_domain, whitelist_lookup
+    )
+
+views = Blueprint('monteliblobber', __name__)
+
+_app = None
+_app_lock = threading.Lock()
+
 
+def create_app(config_file=None):
+    """ Builds the web application. Only the settings are read and the white lists and network indexes compiled;
+    the blacklist, root domain and GeoIP files are opened on first use.
+
+    :param config_file: Path to a config file. Defaults to the local config file, when it exists.
+    :return: `flask.Flask`
+    """
 
-def setup_application():
     if getattr(sys, 'frozen', False):
         template_folder = os.path.join(sys._MEIPASS, 'templates')
         static_folder = os.path.join(sys._MEIPASS, 'static')
@@ -34,8 +76,10 @@ def setup_application():
         os.mkdir(application.config['LOCAL_CONF_DIR'])
 
     # Import local config if it exists.
-    if os.path.isfile(application.config['LOCAL_CONF_FILE']):
-        application.config.from_pyfile(application.config['LOCAL_CONF_FILE'])
+    if config_file is None and os.path.isfile(application.config['LOCAL_CONF_FILE']):
+        config_file = application.config['LOCAL_CONF_FILE']
+    if config_file is not None:
+        application.config.from_pyfile(config_file)
 
     # Converts the `NAMED_NETWORK` String IP and network values to `ipaddress` objects when the app initializes.
     for name, networks in application.config['NAMED_NETWORKS'].items():
@@ -50,28 +94,125 @@ def setup_application():
         converted.append(ipaddress.ip_network(address))
     application.config['WHITELISTS']['network_addresses'] = converted
 
+    # Import a blacklist JSON file written by older versions into the binary index format.
+    if not os.path.isfile(application.config['BLACKLIST_DB']) and \
+            os.path.isfile(application.config['BLACKLIST_JSON_DB']):
+        netindex.import_json_blacklist(application.config['BLACKLIST_JSON_DB'], application.config['BLACKLIST_DB'])
+
+    # Background workers for file submissions.
+    application.config['JOB_QUEUE'] = jobs.JobQueue(application.config['JOB_WORKERS'], application.config['JOB_TTL'])
+
+    # Compile the white lists and network indexes once. The lookup files stay resident for the life of the process
+    # once they are first used.
+    blob_extractor = extractor.Extractor(application.config)
+    application.config['EXTRACTOR'] = blob_extractor
+    application.config['METRICS'] = blob_extractor.metrics
+    application.config['NAMED_NETWORKS_INDEX'] = blob_extractor.named_networks
+    application.config['NETWORK_WHITELIST_INDEX'] = blob_extractor.network_whitelist
+    application.config['DOMAIN_WHITELIST'] = blob_extractor.domain_whitelist
+    application.config['BLACKLIST_MEM_DB'] = blob_extractor.blacklist
+    application.config['ROOT_DOMAINS_MEM_DB'] = blob_extractor.root_domains
+    application.config['PUBLIC_SUFFIX_MEM_DB'] = blob_extractor.public_suffixes
+    application.config['GEOIP_MEM_DB'] = blob_extractor.geoip
+
+    application.register_blueprint(views)
     return application
 
 
-app = setup_application()
+def get_app():
+    """ Returns the application behind the module level `app`, creating it on first use.
+
+    :return: `flask.Flask`
+    """
+
+    global _app
+    if _app is None:
+        with _app_lock:
+            if _app is None:
+                _app = create_app()
+    return _app
+
+
+def __getattr__(name):
+    if name == 'app':
+        return get_app()
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def _truthy(value):
+    return value in (True, 'true', 'on', '1')
+
+
+@views.before_app_request
+def start_request_timer():
+    """ Starts timing the request, and profiling it when `PROFILE_REQUESTS` is enabled and the request asks for it
+    with a true `profile` argument.
+    """
+
+    g.request_start = time.perf_counter()
+    if current_app.config['PROFILE_REQUESTS'] and _truthy(request.args.get('profile')):
+        g.profile = metrics.Profile()
+        g.profile.start()
+
+
+@views.after_app_request
+def record_request(response):
+    """ Records the request duration and response status. A profiled request writes its statistics to a `.prof`
+    file in `PROFILE_DIR`, named in the `X-Profile` response header. Streamed response bodies are produced after
+    this point and are not included.
+
+    :param response: Response Object
+    :return: Response Object
+    """
+
+    config = current_app.config
+    endpoint = request.endpoint or 'unknown'
+    profile = g.pop('profile', None)
+    if profile is not None:
+        filename = os.path.join(
+            config['PROFILE_DIR'],
+            'profile_{}_{}.prof'.format(endpoint.rsplit('.', 1)[-1], time.strftime('%Y%m%d%H%M%S'))
+        )
+        profile.stop(filename)
+        response.headers['X-Profile'] = filename
+    start = g.pop('request_start', None)
+    if start is not None:
+        registry = config['METRICS']
+        registry.observe('monteliblobber_http_request_seconds', time.perf_counter() - start, endpoint=endpoint)
+        registry.inc('monteliblobber_http_responses_total', endpoint=endpoint, status=response.status_code)
+    return response
 
 
-@app.route('/', methods=['POST', 'GET'])
+def _config():
+    # The helpers below are also called outside of requests, where they use the module level application.
+    return current_app.config if has_app_context() else get_app().config
+
+
+@views.route('/', methods=['POST', 'GET'])
 def index():
-    """ The primary route for the root path.
+    """ The primary route for the root path. A POST extracts the artifacts of the `blob` field and streams them back.
+    With a true `store` field the artifacts are kept as a finished job instead, for the results table to page
+    through, and the job is returned. With a true `timings` field the response also holds the stage timings and
+    counters of the extraction under `timings`; that extraction is run again even when its result is cached.
 
     :return: HTTP Template or JSON Response Objects
     """
 
     if request.method == 'POST':
-        results = extract_indicators(request.form['blob'])
-        return jsonify({'data': results})
+        timings = metrics.Timings()
+        report_timings = _truthy(request.form.get('timings'))
+        artifacts = extract_indicators(request.form['blob'], timings, cached=not report_timings)
+        extra = {'timings': timings.to_dict()} if report_timings else {}
+        if _truthy(request.form.get('store')):
+            job = current_app.config['JOB_QUEUE'].add(results.ResultSet(artifacts), name='blob')
+            return jsonify(dict(job.to_dict(), **extra))
+        return Response(results.iter_json_document(artifacts, extra), mimetype='application/json')
     else:
         ctx = {}
         if not preflight_check(
-                app.config['BLACKLIST_DB'],
-                app.config['MAXMIND_CITY_DB_PATH'],
-                app.config['ROOT_DOMAINS_PATH']
+                current_app.config['BLACKLIST_DB'],
+                current_app.config['MAXMIND_CITY_DB_PATH'],
+                current_app.config['ROOT_DOMAINS_PATH']
         ):
             ctx.update(
                 {'errors': [
@@ -83,14 +224,26 @@ def index():
         return render_template('index.html', **{'context': ctx})
 
 
-@app.route('/quit', methods=['POST'])
+@views.route('/quit', methods=['POST'])
 def quit_application():
-    """ Allows for the application to be terminated from the web ui.
+    """ Allows for the application to be terminated from the web ui. The server started by `main` or the `serve`
+    command sets the `SHUTDOWN` callable, which stops it once the requests in flight, this one included, are
+    finished. An application run by another server can't be stopped from here.
 
     :return: HTTP Template Response
     """
-    func = request.environ.get('werkzeug.server.shutdown')
-    func()
+
+    shutdown = current_app.config.get('SHUTDOWN')
+    if shutdown is None:
+        return render_template(
+            'message.html',
+            **{
+                'type': 'warning',
+                'category': 'Error',
+                'message': 'The application is run by another server and can not be stopped from here.'
+            }
+        ), 501
+    shutdown()
     return render_template(
         'message.html',
         **{
@@ -101,26 +254,44 @@ def quit_application():
     )
 
 
-@app.route('/file', methods=['POST', 'GET'])
+@views.route('/file', methods=['POST', 'GET'])
 def submit_file():
-    """ Allows for submission of file objects for sifting.
+    """ Allows for submission of file objects for sifting. The file is processed by a background job and the
+    response page polls the job for its results.
 
-    :return: HTTP Template or JSON Response Objects
+    :return: HTTP Template Response
     """
 
     if request.method == 'POST':
         if 'file' in request.files:
-            filename = os.path.join(app.config['LOCAL_CONF_DIR'], '.temp_upload.dat')
+            fd, filename = tempfile.mkstemp(prefix='.upload_', suffix='.dat', dir=current_app.config['LOCAL_CONF_DIR'])
+            os.close(fd)
             file = request.files['file']
             user_filename = secure_filename(file.filename)
             file.save(filename)
             del file
-            with open(filename, errors='ignore') as f:
-                data = extract_strings(f)
-                app.config['RESULTS'] = extract_indicators(data)
-            os.remove(filename)
-
-            return render_template('file_submission.html', **{'filename': user_filename})
+            try:
+                min_length = int(request.form.get('min_length', current_app.config['STRINGS_MIN_LENGTH']))
+            except ValueError:
+                min_length = current_app.config['STRINGS_MIN_LENGTH']
+            # The form sends a hidden `utf16=0` before the checkbox, as an unchecked checkbox sends nothing. The
+            # setting is only the default of requests without the field.
+            utf16 = request.form.getlist('utf16')
+            utf16 = _truthy(utf16[-1]) if utf16 else current_app.config['STRINGS_UTF16']
+
+            job = current_app.config['JOB_QUEUE'].submit(
+                run_file_job,
+                filename,
+                max(min_length, 1),
+                utf16,
+                current_app._get_current_object(),
+                name=user_filename,
+                bytes_total=os.path.getsize(filename) * (2 if utf16 else 1),
+                cleanup=lambda: os.remove(filename)
+            )
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify(job.to_dict()), 202
+            return render_template('file_submission.html', **{'filename': user_filename, 'job_id': job.id})
         else:
             ctx = {'errors': [
                 'No file was submitted. Please try again! '
@@ -130,26 +301,167 @@ def submit_file():
         abort(404)
 
 
-@app.route('/results', methods=['GET'])
-def get_results():
-    """ Returns the results from a file based submission.
+@views.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """ Returns the status and progress of a background job.
 
+    :param job_id: String
     :return: JSON Response Object
     """
 
-    results = app.config['RESULTS'].copy()
-    del app.config['RESULTS']  # Remove stored results
-    return jsonify({'data': results})
+    job = current_app.config['JOB_QUEUE'].get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.to_dict())
+
+
+def finished_job(job_id):
+    """ Returns a finished background job, or aborts with 404 when it is unknown and 409 when it is still running.
+
+    :param job_id: String
+    :return: `jobs.Job`
+    """
+
+    job = current_app.config['JOB_QUEUE'].get(job_id)
+    if job is None:
+        abort(404)
+    if job.status != jobs.FINISHED:
+        abort(make_response(jsonify(job.to_dict()), 409))
+    return job
+
+
+@views.route('/jobs/<job_id>/results', methods=['GET'])
+def get_job_results(job_id):
+    """ Returns the results of a finished background job, streamed one artifact at a time.
+
+    :param job_id: String
+    :return: JSON Response Object
+    """
 
+    job = finished_job(job_id)
+    return Response(results.iter_json_document(job.results), mimetype='application/json')
 
-@app.route('/update_roots', methods=['POST'])
+
+@views.route('/jobs/<job_id>/export', methods=['GET'])
+def export_job_results(job_id):
+    """ Streams the results of a finished job as a download. The `format` argument is `ndjson`, `csv` or `stix`,
+    STIX 2.1 style indicator objects, one per line.
+
+    :param job_id: String
+    :return: Streamed Response Object
+    """
+
+    job = finished_job(job_id)
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in results.EXPORT_FORMATS:
+        abort(400)
+    mimetype, extension, serializer = results.EXPORT_FORMATS[export_format]
+    filename = secure_filename('{}.{}'.format(job.name or 'monteliblobber', extension))
+    return Response(
+        serializer(job.results),
+        mimetype=mimetype,
+        headers={'Content-Disposition': 'attachment; filename="{}"'.format(filename)}
+    )
+
+
+@views.route('/jobs/<job_id>/table', methods=['GET'])
+def get_job_table(job_id):
+    """ Answers the server side processing requests of the results table: one page of the results, sorted and
+    filtered, in the format DataTables expects.
+
+    :param job_id: String
+    :return: JSON Response Object
+    """
+
+    job = finished_job(job_id)
+    args = request.args
+    try:
+        draw = int(args.get('draw', 0))
+        start = int(args.get('start', 0))
+        length = int(args.get('length', 25))
+        order_column = args.get('order[0][column]')
+        column = args.get('columns[{}][data]'.format(int(order_column))) if order_column is not None else None
+    except ValueError:
+        abort(400)
+    records_filtered, page = job.results.page(
+        start,
+        length,
+        args.get('search[value]', ''),
+        column,
+        args.get('order[0][dir]') == 'desc'
+    )
+    return jsonify({
+        'draw': draw,
+        'recordsTotal': len(job.results),
+        'recordsFiltered': records_filtered,
+        'data': page
+    })
+
+
+@views.route('/jobs/<job_id>/remove', methods=['POST'])
+def remove_job_results(job_id):
+    """ Removes artifacts from the results of a finished job, so they are left out of later pages and exports. The
+    body is a JSON array of objects with String `data_type` and `value` keys; any other body is rejected with 400.
+
+    :param job_id: String
+    :return: JSON Response Object
+    """
+
+    job = finished_job(job_id)
+    items = request.get_json(silent=True)
+    if not isinstance(items, list) or not all(
+            isinstance(item, dict) and isinstance(item.get('data_type'), str) and isinstance(item.get('value'), str)
+            for item in items
+    ):
+        return jsonify({'error': 'Expected a JSON array of artifacts with String `data_type` and `value`.'}), 400
+    removed = job.results.remove((item.get('data_type'), item.get('value')) for item in items)
+    if removed:
+        current_app.config['JOB_QUEUE'].save(job)
+    return jsonify({'removed': removed, 'remaining': len(job.results)})
+
+
+@views.route('/api/v1/extract', methods=['POST'])
+def api_extract():
+    """ Extracts and analyzes artifacts from many documents in one request.
+
+    The body is either a JSON array or NDJSON (`Content-Type: application/x-ndjson`), one document per item. A
+    document is a String, or an object with a `blob` String and an optional `id`. The response is NDJSON with one
+    `{"id": ..., "data": [...]}` line per document, in input order, streamed as each batch of documents finishes.
+    Documents without a text blob get an `error` instead of `data`.
+
+    :return: NDJSON Response Object
+    """
+
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        documents = iter_ndjson_documents(request.stream)
+    else:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            return jsonify({'error': 'Expected a JSON array or NDJSON of documents.'}), 400
+        documents = iter_api_documents(items)
+
+    def generate():
+        for result in extract_batch(documents, current_app.config['API_BATCH_SIZE']):
+            yield json.dumps(result) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@views.route('/update_roots', methods=['POST'])
 def update_root_domains():
     """ Updates the root domain list.
 
     :return: JSON Response Object
     """
 
-    get_root_domains(app.config['ROOT_DOMAINS_URL'], app.config['ROOT_DOMAINS_PATH'])
+    config = current_app.config
+    get_root_domains(config['ROOT_DOMAINS_URL'], config['ROOT_DOMAINS_PATH'])
+    config['ROOT_DOMAINS_MEM_DB'].reload()
+    if config['USE_PUBLIC_SUFFIX_LIST']:
+        get_public_suffix_list(config['PUBLIC_SUFFIX_LIST_URL'], config['PUBLIC_SUFFIX_LIST_PATH'])
+        config['PUBLIC_SUFFIX_MEM_DB'].reload()
+    purge_results()
+    reload_workers()
 
     return render_template(
         'message.html',
@@ -162,14 +474,17 @@ def update_root_domains():
     )
 
 
-@app.route('/update_geoip', methods=['POST'])
+@views.route('/update_geoip', methods=['POST'])
 def update_geoip():
     """ Updates the GEO IP database.
 
     :return: JSON Response Object
     """
 
-    get_geoip_database(app.config['GEOIP_DB_URL'], app.config['MAXMIND_CITY_DB_PATH'])
+    get_geoip_database(current_app.config['GEOIP_DB_URL'], current_app.config['MAXMIND_CITY_DB_PATH'])
+    current_app.config['GEOIP_MEM_DB'].reload()
+    purge_results()
+    reload_workers()
 
     return render_template(
         'message.html',
@@ -182,35 +497,75 @@ def update_geoip():
     )
 
 
-@app.route('/update_blacklists', methods=['POST'])
+@views.route('/update_blacklists', methods=['POST'])
 def update_blacklists():
     """ Updates the file containing blacklisted IPs.
 
     :return: JSON Response Object
     """
 
-    get_blacklists(app.config['BLACKLISTS'], app.config['BLACKLIST_DB'])
+    config = current_app.config
+    stats = feeds.total_stats(get_blacklists(
+        config['BLACKLISTS'],
+        config['BLACKLIST_DB'],
+        config['BLACKLIST_FEED_DIR'],
+        config['BLACKLIST_DOWNLOAD_WORKERS'],
+        config['EXCLUDED_NETWORKS'],
+        config['IP_FILTER']
+    ))
+    config['BLACKLIST_MEM_DB'].reload()
+    purge_results()
+    reload_workers()
     return render_template(
         'message.html',
         **{
             'type': 'success',
             'category': 'Info',
             'reload': True,
-            'message': 'Blacklist database updated successfully.'
+            'message': 'Blacklist database updated successfully: {ranges} ranges from {entries} entries, {dropped} '
+                       'dropped, {merged} merged.'.format(dropped=stats['invalid'] + stats['excluded'], **stats)
         }
     )
 
 
-@app.route('/update_all', methods=['POST'])
+@views.route('/update_all', methods=['POST'])
 def update_all():
     """ Updates all static files.
 
     :return: JSON Response Object
     """
 
-    get_root_domains(app.config['ROOT_DOMAINS_URL'], app.config['ROOT_DOMAINS_PATH'])
-    get_geoip_database(app.config['GEOIP_DB_URL'], app.config['MAXMIND_CITY_DB_PATH'])
-    get_blacklists(app.config['BLACKLISTS'], app.config['BLACKLIST_DB'])
+    # The updates run on other threads, outside of the application context, so they get the settings passed in.
+    config = current_app.config
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        updates = [
+            executor.submit(get_root_domains, config['ROOT_DOMAINS_URL'], config['ROOT_DOMAINS_PATH']),
+            executor.submit(get_geoip_database, config['GEOIP_DB_URL'], config['MAXMIND_CITY_DB_PATH']),
+            executor.submit(
+                get_blacklists,
+                config['BLACKLISTS'],
+                config['BLACKLIST_DB'],
+                config['BLACKLIST_FEED_DIR'],
+                config['BLACKLIST_DOWNLOAD_WORKERS'],
+                config['EXCLUDED_NETWORKS'],
+                config['IP_FILTER']
+            )
+        ]
+        if config['USE_PUBLIC_SUFFIX_LIST']:
+            updates.append(executor.submit(
+                get_public_suffix_list,
+                config['PUBLIC_SUFFIX_LIST_URL'],
+                config['PUBLIC_SUFFIX_LIST_PATH']
+            ))
+        for update in updates:
+            update.result()
+    config['ROOT_DOMAINS_MEM_DB'].reload()
+    if config['USE_PUBLIC_SUFFIX_LIST']:
+        config['PUBLIC_SUFFIX_MEM_DB'].reload()
+    config['GEOIP_MEM_DB'].reload()
+    config['BLACKLIST_MEM_DB'].reload()
+    purge_results()
+    reload_workers()
     return render_template(
         'message.html',
         **{
@@ -222,7 +577,42 @@ def update_all():
     )
 
 
-@app.route('/<path:path>', methods=['GET'])
+@views.route('/stats', methods=['GET'])
+def get_stats():
+    """ Returns the lookup and result cache counters of the process that answered, identified by `pid`.
+
+    :return: JSON Response Object
+    """
+
+    stats = {'pid': os.getpid(), 'geoip_cache': current_app.config['GEOIP_MEM_DB'].cache.stats()}
+    enrichment_cache = current_app.config['EXTRACTOR'].enrichment
+    if enrichment_cache is not None:
+        stats['enrichment_cache'] = enrichment_cache.stats()
+    result_cache = current_app.config['EXTRACTOR'].results
+    if result_cache is not None:
+        stats['result_cache'] = result_cache.stats()
+    return jsonify(stats)
+
+
+@views.route('/metrics', methods=['GET'])
+def get_metrics():
+    """ Returns the extraction, lookup and request metrics in the Prometheus text format. Under the pre-forked
+    server, `METRICS_DIR` is the directory the workers share their metrics through, and the counters are the totals
+    of every worker.
+
+    :return: Text Response Object
+    """
+
+    config = current_app.config
+    gauges = config['EXTRACTOR'].gauges()
+    directory = config.get('METRICS_DIR')
+    if directory is None:
+        return Response(config['METRICS'].render(gauges), content_type=metrics.CONTENT_TYPE)
+    metrics.write_snapshot(config['METRICS'], directory, gauges)
+    return Response(metrics.render_shared(directory, config['METRICS'].buckets), content_type=metrics.CONTENT_TYPE)
+
+
+@views.route('/<path:path>', methods=['GET'])
 def static_proxy(path):
     """ Route that serves static files.
 
@@ -230,7 +620,27 @@ def static_proxy(path):
     :return: Response Object containing a static file
     """
 
-    return app.send_static_file(path)
+    return current_app.send_static_file(path)
+
+
+def purge_results():
+    """ Empties the result cache after an updater replaced a lookup file. Results derived from the old file would
+    be missed anyway, as the file is part of their version; purging frees their memory and disk space at once.
+    """
+
+    result_cache = current_app.config['EXTRACTOR'].results
+    if result_cache is not None:
+        result_cache.clear()
+
+
+def reload_workers():
+    """ Under the pre-forked server, asks the master process to reload the lookup files and replace its workers, so
+    every worker uses the files an updater just replaced. The server sets the `RELOAD` callable.
+    """
+
+    reload = current_app.config.get('RELOAD')
+    if reload is not None:
+        reload()
 
 
 def preflight_check(blacklist_file, geoip_file, root_domains_file):
@@ -249,422 +659,193 @@ def preflight_check(blacklist_file, geoip_file, root_domains_file):
         return True
 
 
-def extract_indicators(text_blob):
+def extract_indicators(text_blob, timings=None, cached=True):
     """ The primary function that handles combining all the functions involved with extracting
     and analyzing artifacts from the incoming text blobs.
 
     :param text_blob: String
+    :param timings: Optional `metrics.Timings` receiving the stage timings.
+    :param cached: False to extract the artifacts again even when they are cached.
     :return: A list of dictionaries containing artifacts.
     """
 
-    artifacts = []
-    artifacts.extend(
-        get_network_addresses(
-            text_blob,
-            app.config['MAXMIND_CITY_DB_PATH'],
-            app.config['BLACKLIST_DB'],
-            app.config['NAMED_NETWORKS'],
-            app.config['WHITELISTS']['network_addresses']
-        )
-    )
-    artifacts.extend(get_email_addresses(text_blob, app.config['WHITELISTS']['domains']))
-    artifacts.extend(get_urls(text_blob, app.config['WHITELISTS']['domains']))
-    artifacts.extend(
-        get_hostnames(
-            text_blob,
-            app.config['ROOT_DOMAINS_PATH'],
-            app.config['WHITELISTS']['domains']
-        )
-    )
-    return artifacts
+    return _config()['EXTRACTOR'].extract(text_blob, timings, cached)
 
 
-def get_root_domains(url, filename):
-    """ Updates root domain file.
+def extract_batch(documents, batch_size=100):
+    """ Extracts and analyzes artifacts from many documents, analyzing each batch of documents together.
 
-    :param url: URL of the root domains list.
-    :param filename: File name to write the list.
+    :param documents: Iterable of (document id, String) tuples
+    :param batch_size: Number of documents analyzed together.
+    :return: Generator of dictionaries with `id` and either `data`, a list of artifacts, or `error`.
     """
 
-    r = requests.get(url)
-    with open(filename, 'w') as f:
-        f.write(r.text)
-    return True
+    return _config()['EXTRACTOR'].extract_batch(documents, batch_size)
 
 
-def get_blacklists(blacklist_config, filename):
-    """ Updates blacklist file.
+def run_file_job(job, filename, min_length, utf16, application=None):
+    """ Background job that extracts artifacts from an uploaded file and reports progress on the job.
 
-    :param blacklist_config: A dict object containing Name/Url key value pairs.
-    :param filename: File name to write the lists.
+    :param job: `jobs.Job`
+    :param filename: Path to the uploaded file.
+    :param min_length: Minimum length of the extracted strings.
+    :param utf16: Also extract UTF-16LE strings.
+    :param application: The application that received the upload. The job runs on another thread, outside of the
+     request, so it needs its own application context to use that application's settings rather than those of
+     the module level application.
+    :return: `results.ResultSet`
     """
 
-    blacklists = get_blacklist_items(blacklist_config)
-    with open(filename, 'w') as f:
-        json.dump(blacklists, f)
-    return True
+    if application is None:
+        return results.ResultSet(extract_file_indicators(filename, min_length, utf16, progress=job.progress))
+    with application.app_context():
+        return results.ResultSet(extract_file_indicators(filename, min_length, utf16, progress=job.progress))
 
 
-def get_geoip_database(url, filename):
-    """ Updates root domain file.
+def extract_file_indicators(filename, min_length=strings.MIN_LENGTH, utf16=False, progress=None):
+    """ Extracts and analyzes artifacts from the printable strings in a file.
 
-    :param url: URL of the MaxMind GeoIP City Database.
-    :param filename: File name to write the db.
+    :param filename: Path to the file.
+    :param min_length: Minimum length of the extracted strings.
+    :param utf16: Also extract UTF-16LE strings.
+    :param progress: Optional callable receiving the bytes scanned and unique indicators found so far.
+    :return: A list of dictionaries containing artifacts.
     """
 
-    r = requests.get(url)
-    with open(filename, 'wb') as f:
-        data = gzip.decompress(r.content)
-        f.write(data)
-    return True
+    return _config()['EXTRACTOR'].extract_file(filename, min_length, utf16, progress)
 
 
-def extract_strings(stream):
-    """ Returns a string containing strings extracted from a file. Used to process binary input.
+def analyze_matches(matches):
+    """ Filters and analyzes the matches found by the scanner.
 
-    :param stream: A file stream
-    :return: String
+    :param matches: Dictionary of data type to a List of matched Strings.
+    :return: A list of dictionaries containing artifacts.
     """
 
-    chars = string.printable
-    min_length = 4
-    results = ""
-    result = ""
-    for c in stream.read():
-        if c in chars:
-            result += c
-            continue
-        if len(result) >= min_length:
-            results += result + " "
-        result = ""
-    if len(result) >= min_length:
-        results += result + " "
-    return results
-
-
-def get_network_addresses(text_blob, geoip_file, blacklist_file, named_networks, whitelisted_addresses):
-    """ Extracts network addresses from text.
-
-    :param text_blob: String
-    :param geoip_file: Path to the geoip database file.
-    :param blacklist_file: Path to the blacklist JSON file.
-    :param named_networks: Dictionary object containing name, `ipaddress.ip_network` pairs.
-    :param whitelisted_addresses: List of `ipaddress.IPNetwork` objects used to filter matches from the results.
-    :return: A list of dictionaries containing network addresses.
-    """
-
-    network_addresses = []
-    ip_regex = re.compile(
-        r'(?P<ip_address>'
-        r'(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])\.'
-        '(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])\.'
-        '(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])\.'
-        '(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9]))'
-    )
-    ip_matches = ip_regex.findall(text_blob)
-    if ip_matches:
-        for i in dedup_list(ip_matches):
-            # Filter white listed addresses.
-            if not whitelist_lookup(i, whitelisted_addresses):
-                network_addresses.append({'value': i, 'data_type': 'ipv4_address'})
-        network_addresses = analyze_network_address(
-            network_addresses,
-            geoip_file,
-            blacklist_file,
-            named_networks
-        )
-    return network_addresses
-
+    return _config()['EXTRACTOR'].analyze(matches)
 
-def get_email_addresses(text_blob, whitelist):
-    """ Returns a list of dict objects containing de-duplicated email addresses filtered through a white list.
 
-    :param text_blob: String
-    :param whitelist: A list of strings containing white listed domains.
-    :return: A list if dictionaries containing email addresses.
-    """
-    email_addresses = []
-    email_regex = re.compile(
-        r'''(?P<email>[a-zA-Z0-9\.]+@[a-zA-Z0-9]+(?:\-)?[a-zA-Z0-9]+(?:\.)?[a-zA-Z0-9]{2,6}?\.[a-zA-Z]{2,6})'''
-    )
-    email_matches = email_regex.findall(text_blob)
-    if email_matches:
-        for i in dedup_list(email_matches):
-            if not check_domain_whitelist(i, whitelist):
-                email_addresses.append({'value': i, 'data_type': 'email', 'tags': []})
-    return email_addresses
-
-
-def get_urls(text_blob, whitelist):
-    """ Returns a list of dict objects containing de-duplicated urls filtered through a white list.
+def get_root_domains(url, filename):
+    """ Updates root domain file.
 
-    :param text_blob: String
-    :param whitelist: A list of strings containing white listed domains.
-    :return: A list of dictionaries containing URLs.
+    :param url: URL of the root domains list.
+    :param filename: File name to write the list.
     """
 
-    urls = []
-    url_regex = re.compile(
-        r'''(?P<url>\b(?:https?|ftp|file):\/\/[\-A-Za-z0-9+&@#\/%?=~_|!:,.;]*[\-A-Za-z0-9+&@#\/%=~_])'''
-    )
-    url_matches = url_regex.findall(text_blob)
-    if url_matches:
-        for i in dedup_list(url_matches):
-            if not check_domain_whitelist(i, whitelist):
-                urls.append({'value': i, 'data_type': 'url', 'tags': []})
-    return urls
-
-
-def get_hostnames(text_blob, root_domains, whitelist):
-    """ Extracts host names from text.
-
-    :param text_blob: String
-    :param root_domains: Path to the root domains file.
-    :param whitelist: A list of strings containing white listed domains.
-    :return: A list of dictionaries containing host names.
-    """
+    import requests
 
-    hostnames = []
-    hostname_regex = re.compile(
-        r'(?P<hostname>'
-        r'(?:[a-z0-9_\-]{1,5})?(?:(?:[a-z0-9_\-]{1,})(?::(?:[a-z0-9_\-]{1,}))?)?(?:(?:www\.)|'
-        r'(?:[a-z0-9_\-]{1,}\.)+)?(?:[a-z0-9_\-]{3,})\.(?:[a-z]{2,4})(?:\/(?:[a-z0-9_\-]{1,}\/)+)?'
-        r'(?:[a-z0-9_\-]{1,})?(?:\.[a-z]{2,})?(?:\?)?(?:(?:(?:\&)?[a-z0-9_\-]{1,}(?:\=[a-z0-9_\-]{1,})?)+)?)'
-    )
-    hostname_matches = hostname_regex.findall(text_blob)
-    if hostname_matches:
-        deduped = dedup_list(hostname_matches)
-        valid = validate_root_domain(deduped, root_domains)
-        for i in valid:
-            if not check_domain_whitelist(i, whitelist):
-                hostnames.append({'value': i, 'data_type': 'dns_name', 'tags': []})
-    return hostnames
+    r = requests.get(url)
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'w') as f:
+        f.write(r.text)
+    os.replace(temp_filename, filename)
+    return True
 
 
-def check_domain_whitelist(string, whitelist):
-    """ Returns True if a white listed domain appears in the string, otherwise returns False.
+def get_public_suffix_list(url, filename):
+    """ Updates the Public Suffix List file.
 
-    :param string: A string possibly containing a domain name.
-    :param whitelist: A list of strings containing white listed domains.
-    :return: Bool
+    :param url: URL of the Public Suffix List.
+    :param filename: File name to write the list.
     """
 
-    for i in whitelist:
-        if i in string:
-            return True
-    return False
-
-
-def analyze_network_address(ips, geoip_file, blacklist_file, named_networks):
-    """ Performs geoip, blacklist, and named network lookups on network addresses. The country name is added to a
-     list object and then added to the original dictionary under the `tags` key.
+    import requests
 
-    The expected data structure is a list of dictionary objects with `type` and `value` keys defined.
-
-    Input Example:
-
-    ```
-    [
-      {
-        "type": "ip_address",
-        "value": "8.8.8.8"
-      },
-    ]
-    ```
+    r = requests.get(url)
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'w', encoding='utf-8') as f:
+        f.write(r.text)
+    os.replace(temp_filename, filename)
+    return True
 
-    :param ips: A list of dictionary objects
-    :param geoip_file: Path to the geoip database file.
-    :param blacklist_file: Path to the blacklist JSON file.
-    :param named_networks: Dictionary object containing name, `ipaddress.ip_network` pairs.
-    :return:
-    """
 
-    # Setup the GeoIP Reader
-    reader = geoip2.database.Reader(geoip_file)
+def get_blacklists(blacklist_config, filename, cache_dir=None, workers=4, excluded_networks=None, ip_filter=None):
+    """ Updates blacklist file. Feeds are downloaded concurrently and only feeds that changed since the last
+    update are downloaded and parsed again. Each cached feed records a digest of the excluded networks and IP
+    filter it was parsed with, so a feed cached under other filters is downloaded and filtered again and the index
+    rebuilt, whether or not it changed upstream.
 
-    # Setup the blacklist DB in memory.
-    with open(blacklist_file, 'r') as f:
-        blacklist = json.load(f)
-    for item in blacklist:
-        if item['type'] == 'ip_address':
-            item['value'] = ipaddress.ip_address(item['value'])
-        else:
-            item['value'] = ipaddress.ip_network(item['value'])
-    blacklist_memory_db = blacklist
-    del blacklist
-
-    # Begin analyzing extracted IP addresses.
-    for i in ips:
-        ip = ipaddress.ip_address(i['value'])
-        tags = []
-        try:
-            result = reader.city(i['value'])
-            tags.append(result.registered_country.name)
-            if result.traits.is_anonymous_proxy:
-                tags.append('Anon Proxy')
-            named = named_network_lookup(ip, named_networks)
-            if named:
-                tags.append(named)
-            bl = blacklist_lookup(ip, blacklist_memory_db)
-            if bl:
-                tags.append(bl)
-        except geoip2.errors.AddressNotFoundError:
-            tag = None
-            if ip.is_link_local:
-                tag = 'Link Local'
-            elif ip.is_loopback:
-                tag = 'Loopback'
-            elif ip.is_multicast:
-                tag = 'Multicast'
-            elif ip.is_private:
-                tag = 'Private'
-            elif ip.is_reserved:
-                tag = 'Reserved'
-            elif ip.is_unspecified:
-                tag = 'Unspecified'
-            tags.append(tag)
-        i.update({'tags': tags})
-    return ips
-
-
-def named_network_lookup(ip_address, named_networks):
-    """ Returns the name of the network or `None` if no matching IP was found in the `named_networks`.
-
-    :param ip_address: String IPv4 Network Address
-    :param named_networks: Dictionary object containing name, `ipaddress.ip_network` pairs.
-    :return: String or None
-    """
-
-    for network_name, network_objects in named_networks.items():
-        for n in network_objects:
-            if ip_address in n:
-                return network_name
-
-    return None
-
-
-def whitelist_lookup(ip_address, whitelisted_addresses):
-    """ Returns True if `ip_address` is found in the `ipaddress.ip_networks` contained in `whitelisted_addresses`.
-    Otherwise returns False.
-
-    :param ip_address: String IPv4 Address
-    :param whitelisted_addresses: List of `ipaddress.IPv4Network`
-    :return: Bool
+    :param blacklist_config: A dict object containing Name/Url key value pairs.
+    :param filename: File name to write the binary blacklist index.
+    :param cache_dir: Directory holding the per feed cache. Defaults to the directory of `filename`.
+    :param workers: Number of concurrent downloads.
+    :param excluded_networks: List of network Strings. Entries in these networks are dropped. Defaults to the
+     `EXCLUDED_NETWORKS` setting.
+    :param ip_filter: Regular expression String. Matching entries are dropped. Defaults to the `IP_FILTER` setting.
+    :return: Dictionary of feed name to the counts of entries found, dropped and merged, see `feeds.parse_feed`.
     """
-    ip = ipaddress.ip_address(ip_address)
-    for net in whitelisted_addresses:
-        if ip in net:
-            return True
-    return False
-
 
-def blacklist_lookup(ip_address, blacklist_mem_db):
-    """ Queries the in memory DB of blacklisted addresses for an IPv4 address. Returns the blacklist name
-     or `None` of no matching IP was found.
+    if cache_dir is None:
+        cache_dir = os.path.dirname(os.path.abspath(filename))
+    if excluded_networks is None:
+        excluded_networks = _config()['EXCLUDED_NETWORKS']
+    if ip_filter is None:
+        ip_filter = _config()['IP_FILTER']
 
-    :param blacklist_mem_db: Object containing the in memory blacklist db.
-    :param ip_address: String IPv4 Network Address
-    :return: String or None
-    """
+    def write_index(blacklists, changed):
+        # Rebuild the index when a feed changed or feeds were added to or removed from the config. The changed
+        # feeds are only cached once the index is written, so a failed update is retried in full next time. Feeds
+        # without ranges have no entry in the index, so they are left out of the comparison.
+        names = {name for name, ranges in blacklists.items() if ranges}
+        if changed or not os.path.isfile(filename) or blacklist_names(filename) != names:
+            netindex.write_index(feeds.compile_feeds(blacklists), filename)
 
-    for item in blacklist_mem_db:
-        if item['type'] == 'ip_network' and ip_address in item['value']:
-            return item['name']
-        elif ip_address == item['value']:
-            return item['name']
+    return feeds.update_feeds(blacklist_config, cache_dir, excluded_networks, workers, ip_filter, write_index)[2]
 
 
-def dedup_list(items):
-    """ Performs a de-duplication routine on a list of strings.
+def blacklist_names(filename):
+    """ Returns the names of the blacklists contained in a blacklist DB file.
 
-    :param items: List of Strings
-    :return: De-duplicated List of Strings
+    :param filename: Path to the blacklist DB file.
+    :return: Set of Strings
     """
 
-    deduped = []
-    pos = 0
-    items.sort()
-    for i in items:
-        if i != items[pos - 1]:
-            deduped.append(i)
-        pos += 1
-    del items
-    return deduped
+    return {name for label_set in netindex.load_blacklist(filename).label_sets for name in label_set}
 
 
-def validate_root_domain(items, root_domains):
-    """ Filters a list of potential FQDN's by cross checking the domain with IANA's list of valid root domains.
+def get_geoip_database(url, filename):
+    """ Updates root domain file.
 
-    :param items: List of FQDN strings
-    :param root_domains: Path to the root domains file.
-    :return: A filtered List of FQDN strings
+    :param url: URL of the MaxMind GeoIP City Database.
+    :param filename: File name to write the db.
     """
 
-    valid = []
-    with open(root_domains, 'r') as f:
-        roots = [i.lower().strip('\n') for i in f]
-        for hostname in items:
-            root = hostname.split('.')[-1]
-            if root in roots:
-                valid.append(hostname)
-        del roots
-    del items
-    return valid
+    import requests
 
+    r = requests.get(url)
+    # The running reader has the old file memory-mapped, so the new file is swapped in rather than overwritten.
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'wb') as f:
+        data = gzip.decompress(r.content)
+        f.write(data)
+    os.replace(temp_filename, filename)
+    return True
 
-def convert_list_to_string(in_list):
-    """ Concatenates a list of strings into a single string.
 
-    :param in_list: List of Strings
-    :return: String
+def main():
+    """ Runs the web application. The lookup files are loaded before the server starts so the first request
+    doesn't pay for them. With `SERVER_WORKERS` above one the application is served by pre-forked worker processes.
     """
 
-    out_string = ''
-    for item in in_list:
-        out_string += item + ', '
-    return out_string[:-2]
+    import multiprocessing
+    import webbrowser
 
+    try:
+        from Monteliblobber import server
+    except ImportError:
+        import server
 
-def request_blacklist(url, bl_name):
-    """ Downloads a blacklist file and uses IP or CIDR addresses defined in `settings.IP_FILTER` to
-     remove networks or IPs from the blacklist.
-
-    :param url: The blacklist file URL
-    :param bl_name: Name of the blacklist
-    :return: List of Dictionary Objects
-    """
-
-    filtered_ip_list = []
-    data_type = 'ip_address'
-    if '.netset' in url:
-        data_type = 'ip_network'
-    r = requests.get(url)
-    p = re.compile(r'^\d.+', re.MULTILINE)
-    for match in re.findall(p, r.text):
-        ip = match.strip('\n')
-        if not re.match(re.compile(app.config['IP_FILTER']), ip):
-            data = {'name': bl_name, 'type': data_type, 'value': ip}
-            filtered_ip_list.append(data)
-    return filtered_ip_list
-
+    multiprocessing.freeze_support()
 
-def get_blacklist_items(url_dict):
-    """ Aggregates IPs and networks from multiple blacklists.
+    application = get_app()
+    application.config['EXTRACTOR'].preload()
 
-    :param url_dict: Dictionary containing `URL` and `name` KV pairs.
-    :return: List of Dictionary Objects
-    """
+    if application.config['AUTO_OPEN_BROWSER']:
+        webbrowser.open_new_tab('http://' + application.config['SERVER_NAME'])
 
-    blacklist_items = []
-    for name, url in url_dict.items():
-        blacklist = request_blacklist(url, name)
-        blacklist_items.extend(blacklist)
-    return blacklist_items
+    config = application.config
+    server.run(application, config['HOST'], config['PORT'], config['SERVER_WORKERS'], config['SERVER_GRACEFUL_TIMEOUT'])
 
 
 if __name__ == '__main__':
-
-    if app.config['AUTO_OPEN_BROWSER']:
-        webbrowser.open_new_tab('http://' + app.config['SERVER_NAME'])
-
-    app.run(host=app.config['HOST'], port=app.config['PORT'])
+    main()
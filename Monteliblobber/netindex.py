@@ -0,0 +1,448 @@
+""" Compiled interval index used for network address lookups.
+
+The index can be stored in a compact binary file that is opened with `mmap`, so lookups binary-search the packed
+ranges in place and every process opening the file shares the same pages. Layout, all integers little-endian unless
+noted:
+
+    header      magic `MTBL`, u16 version, u16 reserved, u32 label count, u32 set count, u32 range count,
+                u32 IPv6 range count (version 2)
+    labels      per label: u16 byte length, UTF-8 name
+    sets        per label set: u16 label count, u16 label ids
+    padding     zero bytes up to a 4 byte boundary
+    starts      u32 per range, sorted
+    ends        u32 per range
+    set ids     u32 per range
+    starts6     16 byte big-endian integer per IPv6 range, sorted (version 2)
+    ends6       16 byte big-endian integer per IPv6 range (version 2)
+    set ids6    u32 per IPv6 range (version 2)
+
+Version 1 files have no IPv6 sections and are still read.
+"""
+
+import array
+import bisect
+import hashlib
+import ipaddress
+import json
+import mmap
+import os
+import socket
+import struct
+import sys
+
+_IPV4 = struct.Struct('!I')
+_HEADER_V1 = struct.Struct('<4sHHIII')
+_HEADER = struct.Struct('<4sHHIIII')
+_U16 = struct.Struct('<H')
+_IPV4_MAPPED = b'\x00' * 10 + b'\xff\xff'
+MAGIC = b'MTBL'
+VERSION = 2
+
+
+def ipv4_to_int(address):
+    """ Converts a dotted quad IPv4 address to an integer.
+
+    :param address: String IPv4 Address
+    :return: Integer
+    """
+
+    return _IPV4.unpack(socket.inet_aton(address))[0]
+
+
+def ipv6_to_int(address):
+    """ Converts an IPv6 address to an integer.
+
+    :param address: String IPv6 Address
+    :return: Integer
+    """
+
+    return int.from_bytes(socket.inet_pton(socket.AF_INET6, address), 'big')
+
+
+def parse_address(address):
+    """ Converts an IPv4 or IPv6 address to its family and integer value. IPv4-mapped IPv6 addresses are returned
+    as the IPv4 address they map.
+
+    :param address: String IP Address
+    :return: Tuple of (version Integer, address Integer)
+    """
+
+    if ':' not in address:
+        return 4, ipv4_to_int(address)
+    packed = socket.inet_pton(socket.AF_INET6, address)
+    if packed[:12] == _IPV4_MAPPED:
+        return 4, _IPV4.unpack(packed[12:])[0]
+    return 6, int.from_bytes(packed, 'big')
+
+
+def format_address(version, address):
+    """ Converts an integer address back to its compressed text form.
+
+    :param version: 4 or 6
+    :param address: Integer
+    :return: String
+    """
+
+    if version == 4:
+        return socket.inet_ntoa(_IPV4.pack(address))
+    return socket.inet_ntop(socket.AF_INET6, address.to_bytes(16, 'big'))
+
+
+def normalize_ipv6(candidate):
+    """ Validates an IPv6 address match and returns it in the compressed lower case form of RFC 5952, with
+    IPv4-mapped addresses written as `::ffff:a.b.c.d`.
+
+    :param candidate: String
+    :return: String, or None if the candidate isn't an IPv6 address.
+    """
+
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, candidate)
+    except (OSError, ValueError):
+        return None
+    if packed[:12] == _IPV4_MAPPED:
+        return '::ffff:' + socket.inet_ntoa(packed[12:])
+    return socket.inet_ntop(socket.AF_INET6, packed)
+
+
+def ip_range(value):
+    """ Converts an IPv4 or IPv6 address or CIDR network to its family and inclusive integer range. Host bits set
+    in a network value are ignored.
+
+    :param value: String IP Address or Network
+    :return: Tuple of (version, start, end) Integers
+    """
+
+    if ':' not in value:
+        return (4,) + ipv4_range(value)
+    address, _, prefix = value.partition('/')
+    start = ipv6_to_int(address)
+    if not prefix:
+        return 6, start, start
+    size = 1 << (128 - int(prefix))
+    start &= ~(size - 1)
+    return 6, start, start + size - 1
+
+
+def ipv4_range(value):
+    """ Converts an IPv4 address or CIDR network to an inclusive integer range. Host bits set in a network
+    value are ignored.
+
+    :param value: String IPv4 Address or Network
+    :return: Tuple of (start, end) Integers
+    """
+
+    address, _, prefix = value.partition('/')
+    start = ipv4_to_int(address)
+    if not prefix:
+        return start, start
+    size = 1 << (32 - int(prefix))
+    start &= ~(size - 1) & 0xFFFFFFFF
+    return start, start + size - 1
+
+
+class _Int128Column(object):
+    """ A read-only sequence of the 16 byte big-endian integers packed in a buffer, for binary searching the
+    IPv6 columns of a mapped index file in place.
+    """
+
+    def __init__(self, buf):
+        self.buf = buf
+
+    def __len__(self):
+        return len(self.buf) // 16
+
+    def __getitem__(self, pos):
+        if pos < 0:
+            pos += len(self)
+        return int.from_bytes(self.buf[pos * 16:pos * 16 + 16], 'big')
+
+
+class NetworkIndex(object):
+    """ A sorted table of disjoint integer address ranges. Every range points at the tuple of labels whose
+    networks cover it, so a single binary search returns all matching labels for an address.
+
+    The index holds IPv4 ranges. IPv6 ranges are held by a second `NetworkIndex` in `ipv6`, so each address
+    family is searched on its own keys.
+    """
+
+    def __init__(self, starts, ends, set_ids, label_sets, ipv6=None):
+        self.starts = starts
+        self.ends = ends
+        self.set_ids = set_ids
+        self.label_sets = label_sets
+        self.ipv6 = ipv6
+        self._digest = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    def lookup(self, address, version=4):
+        """ Returns the labels of every range containing `address`.
+
+        :param address: Integer address
+        :param version: Address family, 4 or 6.
+        :return: Tuple of Strings, empty if nothing matched.
+        """
+
+        if version == 6:
+            return self.ipv6.lookup(address) if self.ipv6 is not None else ()
+        pos = bisect.bisect_right(self.starts, address) - 1
+        if pos >= 0 and address <= self.ends[pos]:
+            return self.label_sets[self.set_ids[pos]]
+        return ()
+
+    def digest(self):
+        """ Returns a hash of the ranges and their labels that is stable across processes, used to version data
+        derived from the index.
+
+        :return: Hex String
+        """
+
+        if self._digest is None:
+            h = hashlib.sha1()
+            for start, end, sid in zip(self.starts, self.ends, self.set_ids):
+                h.update('{}-{}:{}\n'.format(start, end, '\x00'.join(self.label_sets[sid])).encode('utf-8'))
+            if self.ipv6 is not None:
+                h.update(b'ipv6:' + self.ipv6.digest().encode('ascii'))
+            self._digest = h.hexdigest()
+        return self._digest
+
+    @classmethod
+    def from_ranges(cls, ranges):
+        """ Compiles an index from possibly overlapping ranges. Overlaps are split into disjoint segments and
+        neighbouring segments with the same labels are merged.
+
+        :param ranges: Iterable of (start, end, label) tuples with inclusive integer bounds.
+        :return: `NetworkIndex`
+        """
+
+        label_ids = {}
+        labels = []
+        events = []
+        for start, end, label in ranges:
+            lid = label_ids.get(label)
+            if lid is None:
+                lid = label_ids[label] = len(labels)
+                labels.append(label)
+            events.append((start, 1, lid))
+            events.append((end + 1, -1, lid))
+        events.sort()
+
+        starts = []
+        ends = []
+        set_ids = []
+        label_sets = []
+        set_lookup = {}
+        active = {}
+        pos = 0
+        while pos < len(events):
+            point = events[pos][0]
+            while pos < len(events) and events[pos][0] == point:
+                _, delta, lid = events[pos]
+                count = active.get(lid, 0) + delta
+                if count:
+                    active[lid] = count
+                else:
+                    del active[lid]
+                pos += 1
+            if not active or pos == len(events):
+                continue
+            key = tuple(sorted(active))
+            sid = set_lookup.get(key)
+            if sid is None:
+                sid = set_lookup[key] = len(label_sets)
+                label_sets.append(tuple(labels[i] for i in key))
+            end = events[pos][0] - 1
+            if starts and set_ids[-1] == sid and ends[-1] + 1 == point:
+                ends[-1] = end
+            else:
+                starts.append(point)
+                ends.append(end)
+                set_ids.append(sid)
+
+        return cls(starts, ends, set_ids, label_sets)
+
+    @classmethod
+    def from_family_ranges(cls, ranges):
+        """ Compiles an index from ranges of both address families.
+
+        :param ranges: Iterable of (version, start, end, label) tuples with inclusive integer bounds.
+        :return: `NetworkIndex`
+        """
+
+        families = {4: [], 6: []}
+        for version, start, end, label in ranges:
+            families[version].append((start, end, label))
+        index = cls.from_ranges(families[4])
+        if families[6]:
+            index.ipv6 = cls.from_ranges(families[6])
+        return index
+
+
+def compile_blacklist(blacklist):
+    """ Compiles the blacklist records written by the updater into a `NetworkIndex`.
+
+    :param blacklist: List of dictionaries with `name`, `type` and `value` keys.
+    :return: `NetworkIndex`
+    """
+
+    return NetworkIndex.from_family_ranges(
+        ip_range(item['value']) + (item['name'],) for item in blacklist
+    )
+
+
+def compile_networks(networks):
+    """ Compiles labelled networks, such as the named networks or the network white list, into a `NetworkIndex`
+    so an address is classified with one lookup. An already compiled index is returned as is.
+
+    :param networks: Dictionary of label to a List of network Strings or `ipaddress` network objects, or a
+     `NetworkIndex`.
+    :return: `NetworkIndex`
+    """
+
+    if isinstance(networks, NetworkIndex):
+        return networks
+    ranges = []
+    for label, values in networks.items():
+        for value in values:
+            network = ipaddress.ip_network(value)
+            ranges.append((network.version, int(network.network_address), int(network.broadcast_address), label))
+    return NetworkIndex.from_family_ranges(ranges)
+
+
+def write_index(index, filename):
+    """ Writes a `NetworkIndex` to the binary index format. The file is written next to the target and renamed
+    over it, so processes that have the old file mapped keep reading a consistent copy.
+
+    :param index: `NetworkIndex`
+    :param filename: Path of the index file.
+    """
+
+    ipv6 = index.ipv6 if index.ipv6 is not None else NetworkIndex([], [], [], [])
+    # Both families share the label set table. IPv6 set ids are stored after the IPv4 sets.
+    label_sets = list(index.label_sets) + list(ipv6.label_sets)
+    ipv6_set_ids = [sid + len(index.label_sets) for sid in ipv6.set_ids]
+
+    labels = []
+    label_ids = {}
+    for label_set in label_sets:
+        for label in label_set:
+            if label not in label_ids:
+                label_ids[label] = len(labels)
+                labels.append(label)
+
+    parts = [_HEADER.pack(MAGIC, VERSION, 0, len(labels), len(label_sets), len(index), len(ipv6))]
+    for label in labels:
+        encoded = label.encode('utf-8')
+        parts.append(_U16.pack(len(encoded)) + encoded)
+    for label_set in label_sets:
+        ids = [label_ids[label] for label in label_set]
+        parts.append(struct.pack('<H%dH' % len(ids), len(ids), *ids))
+    header = b''.join(parts)
+    header += b'\x00' * (-len(header) % 4)
+
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'wb') as f:
+        f.write(header)
+        for column in (index.starts, index.ends, index.set_ids):
+            _write_u32_column(f, column)
+        for column in (ipv6.starts, ipv6.ends):
+            f.write(b''.join(value.to_bytes(16, 'big') for value in column))
+        _write_u32_column(f, ipv6_set_ids)
+    os.replace(temp_filename, filename)
+
+
+def _write_u32_column(f, column):
+    packed = array.array('I', column)
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    packed.tofile(f)
+
+
+def _u32_column(view):
+    if sys.byteorder == 'little':
+        return view.cast('I')
+    column = array.array('I', view.tobytes())
+    column.byteswap()
+    return column
+
+
+def open_index(filename):
+    """ Opens a binary index file with `mmap`. Only the label tables are decoded; the range columns are read
+    in place.
+
+    :param filename: Path of the index file.
+    :return: `NetworkIndex`
+    """
+
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        buf = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) if size else b''
+    if size < _HEADER_V1.size:
+        raise ValueError('Not a blacklist index file: {}'.format(filename))
+    magic, version = struct.unpack_from('<4sH', buf, 0)
+    if magic != MAGIC or version not in (1, VERSION):
+        raise ValueError('Unsupported blacklist index file: {}'.format(filename))
+    if version == 1:
+        _, _, _, label_count, set_count, range_count = _HEADER_V1.unpack_from(buf, 0)
+        range6_count = 0
+        offset = _HEADER_V1.size
+    else:
+        _, _, _, label_count, set_count, range_count, range6_count = _HEADER.unpack_from(buf, 0)
+        offset = _HEADER.size
+
+    labels = []
+    for _ in range(label_count):
+        length = _U16.unpack_from(buf, offset)[0]
+        offset += _U16.size
+        labels.append(bytes(buf[offset:offset + length]).decode('utf-8'))
+        offset += length
+    label_sets = []
+    for _ in range(set_count):
+        count = _U16.unpack_from(buf, offset)[0]
+        ids = struct.unpack_from('<%dH' % count, buf, offset + _U16.size)
+        label_sets.append(tuple(labels[i] for i in ids))
+        offset += _U16.size * (count + 1)
+    offset += -offset % 4
+
+    view = memoryview(buf)
+    columns = []
+    for _ in range(3):
+        columns.append(_u32_column(view[offset:offset + range_count * 4]))
+        offset += range_count * 4
+    index = NetworkIndex(columns[0], columns[1], columns[2], label_sets)
+    if range6_count:
+        starts = _Int128Column(view[offset:offset + range6_count * 16])
+        offset += range6_count * 16
+        ends = _Int128Column(view[offset:offset + range6_count * 16])
+        offset += range6_count * 16
+        index.ipv6 = NetworkIndex(starts, ends, _u32_column(view[offset:offset + range6_count * 4]), label_sets)
+    return index
+
+
+def import_json_blacklist(json_filename, filename):
+    """ Converts a blacklist JSON file from older versions into the binary index format.
+
+    :param json_filename: Path to the blacklist JSON file.
+    :param filename: Path of the index file to write.
+    """
+
+    with open(json_filename, 'r') as f:
+        write_index(compile_blacklist(json.load(f)), filename)
+
+
+def load_blacklist(filename):
+    """ Loads a blacklist DB file. Binary index files are memory-mapped; blacklist JSON files from older
+    versions are compiled in memory.
+
+    :param filename: Path to the blacklist DB file.
+    :return: `NetworkIndex`
+    """
+
+    with open(filename, 'rb') as f:
+        magic = f.read(len(MAGIC))
+    if magic == MAGIC:
+        return open_index(filename)
+    with open(filename, 'r') as f:
+        return compile_blacklist(json.load(f))
@@ -0,0 +1,91 @@
+""" Process-wide lookup data that is loaded once and kept resident in memory.
+"""
+
+import os
+import threading
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class FileResource(object):
+    """ Holds an object built from a file. The object is rebuilt when the file's modification time, size or
+    inode changes, and the new object replaces the old one in a single assignment so concurrent readers always
+    see a complete object. Replaced objects are left to the garbage collector because in-flight requests may
+    still hold them.
+    """
+
+    def __init__(self, path, loader):
+        self.path = path
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._state = (None, None)
+
+    def _stamp(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def get(self):
+        """ Returns the resident object, rebuilding it first if the file changed on disk.
+
+        :return: The object returned by `loader`.
+        """
+
+        stamp = self._stamp()
+        current_stamp, value = self._state
+        if stamp == current_stamp:
+            return value
+        with self._lock:
+            current_stamp, value = self._state
+            if stamp != current_stamp:
+                value = self.loader(self.path)
+                self._state = (stamp, value)
+        return value
+
+    def stamp(self):
+        """ Returns the (modification time, size, inode) stamp of the resident object, or of the file on disk when
+        nothing is loaded yet. Identifies the version of the data.
+
+        :return: Tuple
+        """
+
+        return self._state[0] or self._stamp()
+
+    def reload(self):
+        """ Rebuilds the resident object from the file regardless of its modification time.
+
+        :return: The object returned by `loader`.
+        """
+
+        with self._lock:
+            stamp = self._stamp()
+            value = self.loader(self.path)
+            self._state = (stamp, value)
+        return value
+
+    def preload(self):
+        """ Loads the file if it exists. Used at startup so the first request doesn't pay the load cost.
+
+        :return: Bool
+        """
+
+        if not os.path.isfile(self.path):
+            return False
+        self.get()
+        return True
+
+
+def get_resource(path, loader):
+    """ Returns the process-wide `FileResource` for a file and loader, creating it on first use.
+
+    :param path: Path to the backing file.
+    :param loader: Callable that builds the resident object from the path.
+    :return: `FileResource`
+    """
+
+    key = (os.path.abspath(path), loader)
+    resource = _registry.get(key)
+    if resource is None:
+        with _registry_lock:
+            resource = _registry.setdefault(key, FileResource(path, loader))
+    return resource
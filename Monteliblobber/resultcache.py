@@ -0,0 +1,256 @@
+""" Cache of the artifacts extracted from whole submissions.
+
+The same headers are pasted and the same samples uploaded again and again, and the artifacts of an input only
+change when the input, the lookup files or the settings do. Results are keyed by a BLAKE2b digest of the input bytes
+and the options of the extraction, and stored under the version of the lookup files and settings they were derived
+from; when the version changes the entries of older versions are dropped.
+
+Results are kept as JSON in an in memory LRU cache bounded by entry count and size, so every hit returns fresh
+objects the caller may change. With a database file they also spill to SQLite, compressed and bounded to
+`disk_size` bytes by evicting the least recently used, where they survive restarts and are shared by the worker
+processes of the pre-forked server.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+try:
+    from Monteliblobber import cache
+except ImportError:
+    import cache
+
+DEFAULT_MAX_SIZE = 256
+DEFAULT_MEMORY_SIZE = 64 * 1024 * 1024
+DEFAULT_DISK_SIZE = 1024 * 1024 * 1024
+
+READ_SIZE = 1024 * 1024
+
+
+def content_key(kind, data, *options):
+    """ Returns the cache key of an input.
+
+    :param kind: Name of the kind of input, such as `text` or `file`.
+    :param data: Bytes of the input.
+    :param options: Options of the extraction that change its result, with stable `str`s.
+    :return: String
+    """
+
+    return _key(kind, hashlib.blake2b(data, digest_size=16), options)
+
+
+def file_key(kind, filename, *options):
+    """ Returns the cache key of a file, read in pieces.
+
+    :param kind: Name of the kind of input.
+    :param filename: Path to the file.
+    :param options: Options of the extraction that change its result, with stable `str`s.
+    :return: String
+    """
+
+    h = hashlib.blake2b(digest_size=16)
+    with open(filename, 'rb') as f:
+        for piece in iter(lambda: f.read(READ_SIZE), b''):
+            h.update(piece)
+    return _key(kind, h, options)
+
+
+def _key(kind, h, options):
+    return ':'.join([kind] + [str(option) for option in options] + [h.hexdigest()])
+
+
+class ResultCache(object):
+    """ Extraction results cached in memory and, when `filename` is set, in a SQLite database. Like the enrichment
+    cache, database errors are counted and treated as misses, so the cache never fails an extraction.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, memory_size=DEFAULT_MEMORY_SIZE, filename=None,
+                 disk_size=DEFAULT_DISK_SIZE):
+        self.filename = filename
+        self.disk_size = disk_size
+        self.memory = cache.LRUCache(max_size, memory_size)
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.errors = 0
+        self._size = 0
+        self._count = 0
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            connection = sqlite3.connect(self.filename, timeout=30, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'key TEXT PRIMARY KEY, version TEXT NOT NULL, data BLOB NOT NULL, size INTEGER NOT NULL, '
+                'used REAL NOT NULL)'
+            )
+            self._count_rows(connection)
+            self._connection = connection
+        return self._connection
+
+    def _count_rows(self, connection):
+        self._count, self._size = connection.execute('SELECT COUNT(*), TOTAL(size) FROM results').fetchone()
+        self._size = int(self._size)
+
+    def close(self):
+        """ Closes the database connection; it is opened again on next use. A connection can't be used by a child
+        process, so the cache is closed before forking.
+        """
+
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def set_version(self, version):
+        """ Sets the version of the lookup files and settings that results are derived from. When it differs from
+        the previous version the memory cache is emptied and the database entries of other versions are deleted.
+
+        :param version: String
+        """
+
+        if version == self.version:
+            return
+        with self._lock:
+            if version == self.version:
+                return
+            self.memory.clear()
+            self.version = version
+            if self.filename is None:
+                return
+            try:
+                connection = self._connect()
+                with connection:
+                    connection.execute('DELETE FROM results WHERE version != ?', (version,))
+                self._count_rows(connection)
+            except sqlite3.Error:
+                self.errors += 1
+
+    def get(self, key, version):
+        """ Returns the cached artifacts of an input.
+
+        :param key: String returned by `content_key` or `file_key`.
+        :param version: Version of the lookup files and settings the artifacts must be derived from.
+        :return: A list of dictionaries containing artifacts, or None on a miss.
+        """
+
+        self.set_version(version)
+        data = self.memory.get(key)
+        if data is None and self.filename is not None:
+            with self._lock:
+                try:
+                    connection = self._connect()
+                    row = connection.execute(
+                        'SELECT data FROM results WHERE key = ? AND version = ?', (key, version)
+                    ).fetchone()
+                    if row is not None:
+                        with connection:
+                            connection.execute('UPDATE results SET used = ? WHERE key = ?', (time.time(), key))
+                        data = zlib.decompress(row[0])
+                except (sqlite3.Error, zlib.error):
+                    self.errors += 1
+            if data is not None:
+                self.memory.put(key, data)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(data)
+
+    def put(self, key, version, artifacts):
+        """ Stores the artifacts of an input. Results derived from a version that was replaced while they were
+        extracted are not stored.
+
+        :param key: String returned by `content_key` or `file_key`.
+        :param version: Version of the lookup files and settings the artifacts were derived from.
+        :param artifacts: A list of dictionaries containing artifacts.
+        """
+
+        if version != self.version:
+            return
+        data = json.dumps(artifacts).encode('utf-8')
+        self.memory.put(key, data)
+        if self.filename is None:
+            return
+        compressed = zlib.compress(data)
+        if len(compressed) > self.disk_size:
+            return
+        with self._lock:
+            try:
+                connection = self._connect()
+                with connection:
+                    connection.execute(
+                        'INSERT OR REPLACE INTO results (key, version, data, size, used) VALUES (?, ?, ?, ?, ?)',
+                        (key, version, compressed, len(compressed), time.time())
+                    )
+                self._count += 1
+                self._size += len(compressed)
+                if self._size > self.disk_size:
+                    self._evict(connection)
+            except sqlite3.Error:
+                self.errors += 1
+
+    def _evict(self, connection):
+        self._count_rows(connection)
+        # Evict down to 90% of the limit, so a full cache isn't trimmed on every insert.
+        excess = self._size - self.disk_size * 9 // 10
+        if excess <= 0 or self._size <= self.disk_size:
+            return
+        keys = []
+        for key, size in connection.execute('SELECT key, size FROM results ORDER BY used'):
+            keys.append(key)
+            excess -= size
+            if excess <= 0:
+                break
+        with connection:
+            connection.executemany('DELETE FROM results WHERE key = ?', [(key,) for key in keys])
+        self.evicted += len(keys)
+        self._count_rows(connection)
+
+    def clear(self):
+        """ Removes every result from memory and from the database. The counters are kept.
+        """
+
+        with self._lock:
+            self.memory.clear()
+            if self.filename is None:
+                return
+            try:
+                connection = self._connect()
+                with connection:
+                    connection.execute('DELETE FROM results')
+                self._count, self._size = 0, 0
+            except sqlite3.Error:
+                self.errors += 1
+
+    def stats(self):
+        """ Returns the cache counters. `hits` and `misses` count the lookups answered from memory or the database.
+
+        :return: Dictionary
+        """
+
+        lookups = self.hits + self.misses
+        stats = {
+            'version': self.version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'memory': self.memory.stats()
+        }
+        if self.filename is not None:
+            stats.update({
+                'size': self._count,
+                'bytes': self._size,
+                'max_bytes': self.disk_size,
+                'evicted': self.evicted,
+                'errors': self.errors
+            })
+        return stats
@@ -0,0 +1,230 @@
+""" Result sets kept on the server for paging and streamed export.
+
+Results are never serialized in one piece: the export functions are generators that yield one line, or one
+artifact, at a time, so a response can be streamed as it is produced. `ResultSet` holds the artifacts of one
+submission and answers the paged, sorted and filtered requests of the results table, so the browser only fetches
+the page it shows.
+"""
+
+import csv
+import datetime
+import io
+import json
+import threading
+import uuid
+
+try:
+    from Monteliblobber import cache
+except ImportError:
+    import cache
+
+COLUMNS = ('value', 'data_type', 'tags', 'count', 'first_seen')
+
+# Columns holding numbers, sorted numerically. Artifacts without them sort first.
+NUMERIC_COLUMNS = ('count', 'first_seen')
+
+# STIX 2.1 observable paths for each data type.
+STIX_PATHS = {
+    'ipv4_address': 'ipv4-addr:value',
+    'ipv6_address': 'ipv6-addr:value',
+    'email': 'email-addr:value',
+    'url': 'url:value',
+    'dns_name': 'domain-name:value',
+}
+
+# Namespace of the deterministic indicator ids, so exporting the same artifact twice gives the same id.
+STIX_NAMESPACE = uuid.UUID('a4c3e2b0-5f3b-4a8e-9d5e-6d0b1e7f2c41')
+
+
+def artifact_tags(artifact):
+    """ Returns the non-empty tags of an artifact.
+
+    :param artifact: Dictionary with `value`, `data_type` and `tags` keys.
+    :return: List of Strings
+    """
+
+    return [tag for tag in artifact.get('tags') or [] if tag]
+
+
+def iter_json_document(artifacts, extra=None):
+    """ Serializes artifacts as the `{"data": [...]}` document returned by the web application, one artifact at a
+    time.
+
+    :param artifacts: Iterable of artifact dictionaries.
+    :param extra: Optional dictionary of other keys of the document.
+    :return: Generator of Strings
+    """
+
+    yield '{"data": ['
+    separator = ''
+    for artifact in artifacts:
+        yield separator + json.dumps(artifact)
+        separator = ', '
+    yield ']'
+    for key, value in (extra or {}).items():
+        yield ', {}: {}'.format(json.dumps(key), json.dumps(value))
+    yield '}'
+
+
+def iter_ndjson(artifacts):
+    """ Serializes artifacts as NDJSON, one object per line.
+
+    :param artifacts: Iterable of artifact dictionaries.
+    :return: Generator of Strings
+    """
+
+    for artifact in artifacts:
+        yield json.dumps(artifact) + '\n'
+
+
+def iter_csv(artifacts):
+    """ Serializes artifacts as CSV rows with a header, the tags joined into one column. The occurrence columns are
+    left empty for artifacts without them.
+
+    :param artifacts: Iterable of artifact dictionaries.
+    :return: Generator of Strings
+    """
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for artifact in artifacts:
+        writer.writerow((
+            artifact['value'], artifact['data_type'], ', '.join(artifact_tags(artifact)),
+            artifact.get('count', ''), artifact.get('first_seen', '')
+        ))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stix_indicator(artifact, created):
+    """ Converts an artifact to a STIX 2.1 style indicator object. The artifact's tags become its labels.
+
+    :param artifact: Dictionary with `value`, `data_type` and `tags` keys.
+    :param created: Timestamp String of the export.
+    :return: Dictionary
+    """
+
+    value = artifact['value']
+    escaped = value.replace('\\', '\\\\').replace("'", "\\'")
+    return {
+        'type': 'indicator',
+        'spec_version': '2.1',
+        'id': 'indicator--{}'.format(uuid.uuid5(STIX_NAMESPACE, artifact['data_type'] + ':' + value)),
+        'created': created,
+        'modified': created,
+        'valid_from': created,
+        'pattern_type': 'stix',
+        'pattern': "[{} = '{}']".format(STIX_PATHS[artifact['data_type']], escaped),
+        'labels': artifact_tags(artifact),
+    }
+
+
+def iter_stix(artifacts):
+    """ Serializes artifacts as STIX 2.1 style indicator objects, one per line.
+
+    :param artifacts: Iterable of artifact dictionaries.
+    :return: Generator of Strings
+    """
+
+    created = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    for artifact in artifacts:
+        yield json.dumps(stix_indicator(artifact, created)) + '\n'
+
+
+# Export format name to (mimetype, file extension, serializer).
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson', iter_ndjson),
+    'csv': ('text/csv', 'csv', iter_csv),
+    'stix': ('application/x-ndjson', 'stix.jsonl', iter_stix),
+}
+
+
+def _sort_key(column):
+    if column in NUMERIC_COLUMNS:
+        return lambda artifact: artifact.get(column, -1)
+    if column == 'tags':
+        return lambda artifact: ', '.join(artifact_tags(artifact)).lower()
+    return lambda artifact: artifact[column].lower()
+
+
+def _matches(artifact, search):
+    if search in artifact['value'].lower() or search in artifact['data_type']:
+        return True
+    return any(search in tag.lower() for tag in artifact_tags(artifact))
+
+
+class ResultSet(object):
+    """ The artifacts of one submission, queried a page at a time.
+
+    Each view, a sort column, direction and search term, is computed once as a list of positions and kept in a
+    small cache, so paging through a large result set sorts and filters it only when the view changes. Removing
+    artifacts replaces the list and empties the cache. Only the artifacts are pickled.
+    """
+
+    def __init__(self, artifacts, view_cache_size=8):
+        self.artifacts = list(artifacts)
+        self.views = cache.LRUCache(view_cache_size)
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {'artifacts': self.artifacts, 'view_cache_size': self.views.max_size}
+
+    def __setstate__(self, state):
+        self.__init__(state['artifacts'], state['view_cache_size'])
+
+    def __len__(self):
+        return len(self.artifacts)
+
+    def __iter__(self):
+        return iter(self.artifacts)
+
+    def page(self, start=0, length=-1, search='', column=None, descending=False):
+        """ Returns one page of the sorted and filtered artifacts.
+
+        :param start: Position of the first artifact of the page.
+        :param length: Number of artifacts in the page, or -1 for all of them.
+        :param search: Case insensitive String matched against the value, data type and tags.
+        :param column: Name of the column to sort by, or None to keep the extraction order.
+        :param descending: Sort in descending order.
+        :return: Tuple of (number of artifacts matching the search, List of artifacts in the page)
+        """
+
+        if column not in COLUMNS:
+            column = None
+        search = search.strip().lower()
+        with self._lock:
+            artifacts = self.artifacts
+            views = self.views
+        key = (column, bool(descending) if column else False, search)
+        view = views.get(key)
+        if view is None:
+            positions = range(len(artifacts))
+            if column is not None:
+                sort_key = _sort_key(column)
+                positions = sorted(positions, key=lambda i: sort_key(artifacts[i]), reverse=bool(descending))
+            if search:
+                positions = [i for i in positions if _matches(artifacts[i], search)]
+            view = positions
+            views.put(key, view)
+        start = max(start, 0)
+        end = len(view) if length < 0 else start + length
+        return len(view), [artifacts[i] for i in view[start:end]]
+
+    def remove(self, keys):
+        """ Removes artifacts from the result set.
+
+        :param keys: Iterable of (data type, value) tuples.
+        :return: Number of artifacts removed.
+        """
+
+        keys = set(keys)
+        with self._lock:
+            kept = [a for a in self.artifacts if (a['data_type'], a['value']) not in keys]
+            removed = len(self.artifacts) - len(kept)
+            if removed:
+                self.artifacts = kept
+                self.views = cache.LRUCache(self.views.max_size)
+        return removed
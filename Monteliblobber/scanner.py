@@ -0,0 +1,369 @@
+""" Single pass indicator scanner.
+
+None of the indicator patterns can match whitespace, so every match lies inside one whitespace separated token. The
+scanner splits the blob into tokens once, routes each token to the patterns it could possibly match using cheap
+literal checks, and runs each compiled pattern over only the tokens routed to it. The matches are the same as
+running `findall` for every pattern over the whole blob.
+
+The incremental scanners de-duplicate matches with hash tables while they scan. Each unique match keeps the number
+of times it was found and the offset of its first match, and unique matches are returned in the order they were
+first found.
+"""
+
+import bisect
+import collections
+import concurrent.futures
+import itertools
+import re
+import threading
+
+IPV4_ADDRESS = 'ipv4_address'
+IPV6_ADDRESS = 'ipv6_address'
+EMAIL = 'email'
+URL = 'url'
+DNS_NAME = 'dns_name'
+DATA_TYPES = (IPV4_ADDRESS, IPV6_ADDRESS, EMAIL, URL, DNS_NAME)
+
+# The dotted quad of an IPv4-mapped IPv6 address, as in `::ffff:1.2.3.4`, is left to the IPv6 match, so the
+# address is reported once. The lookahead skips the lookbehinds at positions that can't start an address.
+IP_REGEX = re.compile(
+    r'(?=[0-9])(?<!:[fF]{4}:)(?<!:[fF]{4}:[0-9])(?<!:[fF]{4}:[0-9]{2})(?P<ip_address>'
+    r'(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])\.'
+    r'(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])\.'
+    r'(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])\.'
+    r'(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9]))'
+)
+
+# Matches IPv6 candidates: two or more colon separated hex groups, optionally ending in a dotted quad as in
+# IPv4-mapped addresses. Candidates are validated and normalized by `netindex.normalize_ipv6`.
+IPV6_REGEX = re.compile(
+    r'(?<![0-9A-Fa-f:])(?P<ipv6_address>'
+    r'(?:[0-9A-Fa-f]{0,4}:){2,8}'
+    r'(?:(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])'
+    r'(?:\.(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])){3}|[0-9A-Fa-f]{1,4})?)'
+    r'(?![0-9A-Fa-f:])'
+)
+
+EMAIL_REGEX = re.compile(
+    r'''(?P<email>[a-zA-Z0-9\.]+@[a-zA-Z0-9]+(?:\-)?[a-zA-Z0-9]+(?:\.)?[a-zA-Z0-9]{2,6}?\.[a-zA-Z]{2,6})'''
+)
+
+URL_REGEX = re.compile(
+    r'''(?P<url>\b(?:https?|ftp|file):\/\/[\-A-Za-z0-9+&@#\/%?=~_|!:,.;]*[\-A-Za-z0-9+&@#\/%=~_])'''
+)
+
+HOSTNAME_REGEX = re.compile(
+    r'(?P<hostname>'
+    r'(?:[a-z0-9_\-]{1,5})?(?:(?:[a-z0-9_\-]{1,})(?::(?:[a-z0-9_\-]{1,}))?)?(?:(?:www\.)|'
+    r'(?:[a-z0-9_\-]{1,}\.)+)?(?:[a-z0-9_\-]{3,})\.(?:[a-z]{2,4})(?:\/(?:[a-z0-9_\-]{1,}\/)+)?'
+    r'(?:[a-z0-9_\-]{1,})?(?:\.[a-z]{2,})?(?:\?)?(?:(?:(?:\&)?[a-z0-9_\-]{1,}(?:\=[a-z0-9_\-]{1,})?)+)?)'
+)
+
+PATTERNS = {
+    IPV4_ADDRESS: IP_REGEX,
+    IPV6_ADDRESS: IPV6_REGEX,
+    EMAIL: EMAIL_REGEX,
+    URL: URL_REGEX,
+    DNS_NAME: HOSTNAME_REGEX,
+}
+
+# Every host name match contains a label of at least three characters followed by a TLD.
+_HOSTNAME_HINT = re.compile(r'[a-z0-9_\-]{3}\.[a-z]{2}')
+_WHITESPACE = re.compile(r'\s')
+
+SEGMENT_SIZE = 1024 * 1024
+PARALLEL_SEGMENT_SIZE = 4 * 1024 * 1024
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def iter_segments(text_blob, segment_size=SEGMENT_SIZE):
+    """ Splits text into segments of roughly `segment_size` characters, cutting only at whitespace so no
+    token is split.
+
+    :param text_blob: String
+    :param segment_size: Approximate segment length.
+    :return: Generator of Strings
+    """
+
+    start = 0
+    length = len(text_blob)
+    while start < length:
+        end = start + segment_size
+        if end >= length:
+            yield text_blob[start:]
+            return
+        match = _WHITESPACE.search(text_blob, end)
+        if match is None:
+            yield text_blob[start:]
+            return
+        yield text_blob[start:match.start()]
+        start = match.start()
+
+
+def route_tokens(text):
+    """ Splits one segment of text into tokens and routes each token to the data types it could match.
+
+    :param text: String
+    :return: Dictionary of data type to a List of tokens, in text order.
+    """
+
+    dotted = []
+    colons = []
+    emails = []
+    urls = []
+    hostnames = []
+    hint = _HOSTNAME_HINT.search
+    for token in text.split():
+        if '.' in token:
+            dotted.append(token)
+            if '@' in token:
+                emails.append(token)
+            if hint(token):
+                hostnames.append(token)
+        if ':' in token:
+            if token.count(':') > 1:
+                colons.append(token)
+            if '://' in token:
+                urls.append(token)
+    return {IPV4_ADDRESS: dotted, IPV6_ADDRESS: colons, EMAIL: emails, URL: urls, DNS_NAME: hostnames}
+
+
+def scan_segment(text, data_types=DATA_TYPES):
+    """ Scans one segment of text.
+
+    :param text: String
+    :param data_types: Iterable of data types to extract.
+    :return: Dictionary of data type to a List of matched Strings, duplicates included.
+    """
+
+    tokens = route_tokens(text)
+    matches = {}
+    for data_type in data_types:
+        if tokens[data_type]:
+            matches[data_type] = PATTERNS[data_type].findall('\n'.join(tokens[data_type]))
+        else:
+            matches[data_type] = []
+    return matches
+
+
+def scan(text_blob, data_types=DATA_TYPES):
+    """ Extracts the raw matches for every indicator type in one pass over the text.
+
+    :param text_blob: String
+    :param data_types: Iterable of data types to extract.
+    :return: Dictionary of data type to a List of matched Strings, duplicates included.
+    """
+
+    matches = {data_type: [] for data_type in data_types}
+    for segment in iter_segments(text_blob):
+        for data_type, found in scan_segment(segment, data_types).items():
+            matches[data_type].extend(found)
+    return matches
+
+
+def tally_segment(segment, offset, data_types, occurrences, first_seen):
+    """ Scans one segment of text and adds its matches to running tallies.
+
+    The routed tokens of a data type are scanned joined by newlines. The offset of a new match is its position in
+    the joined tokens, mapped back to the segment through the token it lies in.
+
+    :param segment: String
+    :param offset: Offset of the segment in the whole text.
+    :param data_types: Iterable of data types to extract.
+    :param occurrences: Dictionary of data type to a `collections.Counter` of matched Strings, updated in place.
+    :param first_seen: Dictionary of data type to a dictionary of matched String to the offset of its first match,
+     in first match order, updated in place.
+    """
+
+    routed = route_tokens(segment)
+    for data_type in data_types:
+        tokens = routed[data_type]
+        if not tokens:
+            continue
+        seen = first_seen[data_type]
+        new = {}
+        found = []
+        add = found.append
+        for match in PATTERNS[data_type].finditer('\n'.join(tokens)):
+            value = match.group()
+            add(value)
+            if value not in seen and value not in new:
+                new[value] = match.start()
+        if new:
+            for value, position in zip(new, _segment_positions(segment, tokens, new.values())):
+                seen[value] = offset + position
+        occurrences[data_type].update(found)
+
+
+def _segment_positions(segment, tokens, positions):
+    # Maps ascending positions in the newline joined tokens to positions in the segment. Each token is located at
+    # its first whitespace delimited occurrence after the previous located token. An identical token in between
+    # would have held the same match first, so the occurrence found is the token the match came from.
+    starts = list(itertools.accumulate((len(token) + 1 for token in tokens), initial=0))
+    cursor = 0
+    located = (-1, 0)
+    for position in positions:
+        index = bisect.bisect_right(starts, position) - 1
+        if index != located[0]:
+            token = tokens[index]
+            start = segment.find(token, cursor)
+            while start > 0 and not segment[start - 1].isspace() or \
+                    start + len(token) < len(segment) and not segment[start + len(token)].isspace():
+                start = segment.find(token, start + 1)
+            located = (index, start)
+            cursor = start + len(token)
+        yield located[1] + position - starts[index]
+
+
+class Scanner(object):
+    """ Incremental scanner for text that arrives in pieces. Text is buffered until a segment is full and scanned
+    up to its last whitespace, so tokens spanning two pieces are scanned whole. Matches are de-duplicated as they
+    are found, so memory grows with the number of unique indicators rather than the size of the input.
+    `occurrences` counts the matches of each unique indicator and `first_seen` holds the character offset of its
+    first match.
+
+    A token longer than `max_token` characters is scanned in parts to keep the buffer bounded.
+    """
+
+    def __init__(self, data_types=DATA_TYPES, segment_size=SEGMENT_SIZE, max_token=64 * 1024):
+        self.data_types = tuple(data_types)
+        self.segment_size = segment_size
+        self.max_token = max_token
+        self.occurrences = {data_type: collections.Counter() for data_type in self.data_types}
+        self.first_seen = {data_type: {} for data_type in self.data_types}
+        self.characters = 0
+        self.scanned = 0
+        self._pending = []
+        self._pending_size = 0
+
+    def feed(self, text):
+        """ Adds a piece of text to the scanner.
+
+        :param text: String
+        """
+
+        self._pending.append(text)
+        self._pending_size += len(text)
+        self.characters += len(text)
+        if self._pending_size >= self.segment_size:
+            self._flush(final=False)
+
+    def found(self):
+        """ Returns the number of unique matches found so far.
+
+        :return: Integer
+        """
+
+        return sum(len(seen) for seen in self.first_seen.values())
+
+    def count(self, data_type):
+        """ Returns the number of matches of a data type, duplicates included.
+
+        :param data_type: Data type String.
+        :return: Integer
+        """
+
+        return sum(self.occurrences[data_type].values())
+
+    def close(self):
+        """ Scans any buffered text and returns the de-duplicated matches.
+
+        :return: Dictionary of data type to a List of unique matched Strings, in the order they were first found.
+        """
+
+        self._flush(final=True)
+        return {data_type: list(seen) for data_type, seen in self.first_seen.items()}
+
+    def _flush(self, final):
+        text = ''.join(self._pending)
+        carry = ''
+        if not final and text and not text[-1].isspace():
+            carry = text.rsplit(None, 1)[-1]
+            if len(carry) > self.max_token:
+                carry = ''
+            text = text[:len(text) - len(carry)]
+        self._pending = [carry] if carry else []
+        self._pending_size = len(carry)
+        if text:
+            self._scan(text)
+
+    def _scan(self, text):
+        for segment in iter_segments(text, self.segment_size):
+            tally_segment(segment, self.scanned, self.data_types, self.occurrences, self.first_seen)
+            self.scanned += len(segment)
+
+
+def scan_unique(text, data_types=DATA_TYPES, offset=0):
+    """ Scans text and returns the unique matches with their tallies. Runs in the worker processes of
+    `ParallelScanner`.
+
+    :param text: String
+    :param data_types: Iterable of data types to extract.
+    :param offset: Offset of the text in the whole input.
+    :return: Tuple of (Dictionary of data type to a dictionary of matched String to the offset of its first match,
+     Dictionary of data type to a `collections.Counter` of matched Strings)
+    """
+
+    occurrences = {data_type: collections.Counter() for data_type in data_types}
+    first_seen = {data_type: {} for data_type in data_types}
+    for segment in iter_segments(text):
+        tally_segment(segment, offset, data_types, occurrences, first_seen)
+        offset += len(segment)
+    return first_seen, occurrences
+
+
+def get_executor(workers):
+    """ Returns the process-wide pool of scanner worker processes, starting it on first use.
+
+    :param workers: Number of worker processes.
+    :return: `concurrent.futures.ProcessPoolExecutor`
+    """
+
+    executor = _executors.get(workers)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(workers)
+            if executor is None:
+                executor = _executors[workers] = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    return executor
+
+
+class ParallelScanner(Scanner):
+    """ A `Scanner` that spreads the work over a pool of processes. Buffered text is cut into chunks at whitespace,
+    which no match can span, so the chunks don't need to overlap. Each chunk is scanned and tallied in a worker
+    and the partial tallies are merged here. At most two chunks per worker are in flight, which bounds memory for
+    streamed input.
+    """
+
+    def __init__(self, executor, workers, data_types=DATA_TYPES, segment_size=PARALLEL_SEGMENT_SIZE, **kwargs):
+        super(ParallelScanner, self).__init__(data_types, segment_size, **kwargs)
+        self.executor = executor
+        self.max_in_flight = workers * 2
+        self._in_flight = collections.deque()
+
+    def close(self):
+        """ Scans any buffered text, waits for the workers and returns the merged matches.
+
+        :return: Dictionary of data type to a List of unique matched Strings, in the order they were first found.
+        """
+
+        self._flush(final=True)
+        self._collect(0)
+        return super(ParallelScanner, self).close()
+
+    def _scan(self, text):
+        for chunk in iter_segments(text, self.segment_size):
+            self._in_flight.append(self.executor.submit(scan_unique, chunk, self.data_types, self.scanned))
+            self.scanned += len(chunk)
+            self._collect(self.max_in_flight)
+
+    def _collect(self, limit):
+        # Chunks are merged in input order, so the first offset kept for a match is the earliest.
+        while len(self._in_flight) > limit:
+            first_seen, occurrences = self._in_flight.popleft().result()
+            for data_type, seen in first_seen.items():
+                merged = self.first_seen[data_type]
+                merged.update({value: offset for value, offset in seen.items() if value not in merged})
+                self.occurrences[data_type].update(occurrences[data_type])
@@ -0,0 +1,375 @@
+""" Production server with pre-forked worker processes.
+
+`serve` runs the application in this process on Werkzeug's threaded WSGI server. `Arbiter` runs it in several: the
+master process builds the application, loads the lookup files and binds the listening socket once, then forks the
+workers, which accept connections on the inherited socket and serve each request on a thread. The GeoIP reader,
+blacklist index and root domain set are built before the fork, so the workers share their memory pages
+copy-on-write instead of each loading a copy, and `gc.freeze` keeps the garbage collector from writing to, and so
+copying, those pages.
+
+The master is controlled with signals:
+
+- `SIGTERM` or `SIGINT` stops the server gracefully. The workers stop accepting connections, finish the requests
+  and jobs they are running, and exit. Workers still running after the graceful timeout are killed, as they are on
+  a second `SIGTERM` or `SIGINT`.
+- `SIGHUP` reloads the lookup files that changed and replaces the workers. The new workers are forked from the
+  reloaded master before the old ones are stopped, so connections are accepted throughout and no request is
+  dropped.
+
+Workers that exit on their own are replaced. Jobs are written to a spool directory shared by the workers, so any
+worker can answer for a job run by another. Each worker keeps its own metrics and writes a snapshot of them to a
+shared metrics directory every `METRICS_INTERVAL` seconds and when it exits. `/metrics` renders the sum of every
+snapshot, so its counters are the totals of all the workers whichever one answers, and don't drop when workers
+are replaced; they can lag the other workers by up to `METRICS_INTERVAL`. The cache gauges are per worker and
+carry a `pid` label. Forking is POSIX only; elsewhere `run` falls back to `serve`.
+"""
+
+import gc
+import os
+import select
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+
+try:
+    from Monteliblobber import jobs, metrics
+except ImportError:
+    import jobs
+    import metrics
+
+DEFAULT_GRACEFUL_TIMEOUT = 30
+
+# Seconds between the checks of a kept alive connection for a stopping server.
+IDLE_POLL_INTERVAL = 0.5
+
+# Seconds to wait before replacing a worker that exited on its own, so a worker failing at startup isn't forked
+# in a tight loop.
+RESPAWN_DELAY = 1.0
+
+# Seconds between the metrics snapshots of a worker.
+METRICS_INTERVAL = 1.0
+
+
+def _log(message):
+    sys.stderr.write('[{}] {}\n'.format(os.getpid(), message))
+
+
+class RequestHandler(WSGIRequestHandler):
+    """ Werkzeug's request handler, except a kept alive connection is closed between two requests once the server
+    is stopping, instead of holding the worker until the client closes it.
+    """
+
+    def handle(self):
+        try:
+            self.handle_one_request()
+            while not self.close_connection and self._wait_for_request():
+                self.handle_one_request()
+        except (ConnectionError, socket.timeout) as e:
+            self.connection_dropped(e)
+
+    def _wait_for_request(self):
+        # Clients wait for a response before sending the next request on a connection, so the read buffer is empty
+        # here and the socket tells whether another request arrived.
+        while not self.server.stopping:
+            if select.select([self.connection], [], [], IDLE_POLL_INTERVAL)[0]:
+                return True
+        return False
+
+
+class WSGIServer(ThreadedWSGIServer):
+    """ Werkzeug's threaded WSGI server, except closing it waits for the requests in flight to finish instead of
+    abandoning them.
+    """
+
+    daemon_threads = False
+    block_on_close = True
+    stopping = False
+
+    def stop(self):
+        """ Stops serving. Blocks until `serve_forever` returns, so it must be called from another thread.
+        """
+
+        self.stopping = True
+        self.shutdown()
+
+    def close(self):
+        """ Closes the socket once the requests in flight are finished.
+        """
+
+        self.stopping = True
+        self.server_close()
+
+
+def make_server(application, host, port, fd=None):
+    """ Builds a threaded WSGI server for the application.
+
+    :param application: WSGI application.
+    :param host: Host name or address String to listen on.
+    :param port: Port to listen on, or 0 for any free port.
+    :param fd: File descriptor of a bound and listening socket, used instead of binding `host` and `port`.
+    :return: `WSGIServer`
+    """
+
+    return WSGIServer(host, port, application, handler=RequestHandler, fd=fd)
+
+
+def bind_socket(host, port, backlog=128):
+    """ Binds a listening TCP socket.
+
+    :param host: Host name or address String to listen on.
+    :param port: Port to listen on, or 0 for any free port.
+    :param backlog: Length of the queue of connections not yet accepted.
+    :return: `socket.socket`
+    """
+
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    return socket.create_server((host, port), family=family, backlog=backlog)
+
+
+def load_lookup_data(application):
+    """ Loads the lookup files that exist, or reloads those replaced since they were loaded, then freezes every
+    object built so far so the garbage collector leaves their memory pages shared after a fork.
+
+    :param application: `flask.Flask` built by `create_app`.
+    """
+
+    config = application.config
+    blob_extractor = config['EXTRACTOR']
+    blob_extractor.preload()
+    geoip = config['GEOIP_MEM_DB']
+    if os.path.isfile(geoip.resource.path):
+        geoip.refresh()
+    if blob_extractor.enrichment is not None:
+        blob_extractor.enrichment.close()
+    if blob_extractor.results is not None:
+        blob_extractor.results.close()
+    gc.unfreeze()
+    gc.collect()
+    gc.freeze()
+
+
+def serve(application, host, port):
+    """ Runs the application in this process until it is interrupted, stopped with `SIGTERM` or quit from the web
+    interface. Requests in flight are finished before it returns.
+
+    :param application: `flask.Flask` built by `create_app`.
+    :param host: Host name or address String to listen on.
+    :param port: Port to listen on.
+    """
+
+    server = make_server(application, host, port)
+    application.config['SHUTDOWN'] = lambda: threading.Thread(target=server.stop).start()
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda signum, frame: application.config['SHUTDOWN']())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        application.config['JOB_QUEUE'].shutdown()
+
+
+class Arbiter(object):
+    """ The master process of the pre-forked server. It forks the workers and replaces them, but serves no requests
+    itself.
+    """
+
+    def __init__(self, application, host, port, workers, graceful_timeout=DEFAULT_GRACEFUL_TIMEOUT):
+        self.application = application
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.socket = None
+        self.generation = 0
+        self.children = {}
+        self.stopping = False
+        self._signals = []
+        self._wakeup = None
+        self._respawn_at = 0
+
+    def run(self):
+        """ Binds the socket, loads the lookup data and runs the workers until the master is told to stop.
+        """
+
+        self.socket = bind_socket(self.host, self.port)
+        self.port = self.socket.getsockname()[1]
+        config = self.application.config
+        spool_dir = tempfile.mkdtemp(prefix='monteliblobber-jobs-')
+        config['JOB_QUEUE'] = jobs.JobQueue(config['JOB_WORKERS'], config['JOB_TTL'], spool_dir)
+        config['METRICS_DIR'] = tempfile.mkdtemp(prefix='monteliblobber-metrics-')
+        try:
+            load_lookup_data(self.application)
+            self._install_signals()
+            _log('Listening on http://{}:{} with {} workers'.format(self.host, self.port, self.workers))
+            self._loop()
+            _log('Stopping')
+            self._stop()
+        finally:
+            self.socket.close()
+            shutil.rmtree(spool_dir, ignore_errors=True)
+            shutil.rmtree(config['METRICS_DIR'], ignore_errors=True)
+
+    def _install_signals(self):
+        # The handlers only record the signal. The wakeup pipe makes `_sleep` return as soon as one arrives,
+        # including `SIGCHLD` when a worker exits.
+        self._wakeup = os.pipe()
+        for fd in self._wakeup:
+            os.set_blocking(fd, False)
+        signal.set_wakeup_fd(self._wakeup[1])
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+            signal.signal(signum, self._handle_signal)
+
+    def _handle_signal(self, signum, frame):
+        if signum != signal.SIGCHLD:
+            self._signals.append(signum)
+
+    def _sleep(self, timeout):
+        if select.select([self._wakeup[0]], [], [], timeout)[0]:
+            try:
+                while os.read(self._wakeup[0], 1024):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def _loop(self):
+        while True:
+            self._reap()
+            while self._signals:
+                signum = self._signals.pop(0)
+                if signum == signal.SIGHUP:
+                    self._reload()
+                else:
+                    return
+            self._spawn()
+            self._sleep(max(min(self._respawn_at - time.monotonic(), 1.0), 0.01))
+
+    def _reload(self):
+        _log('Reloading the lookup files')
+        try:
+            load_lookup_data(self.application)
+        except Exception:
+            _log('Reload failed, the workers are kept:\n' + traceback.format_exc())
+            return
+        old = list(self.children)
+        self.generation += 1
+        self._respawn_at = 0
+        self._spawn()
+        self._kill(old, signal.SIGTERM)
+
+    def _spawn(self):
+        running = sum(1 for generation in self.children.values() if generation == self.generation)
+        if running >= self.workers or time.monotonic() < self._respawn_at:
+            return
+        for _ in range(self.workers - running):
+            # Until a worker installs its own handler, a `SIGTERM` would reach the handler of the master copied by
+            # the fork and be lost, so it is held back across the fork.
+            signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGTERM})
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    self._run_worker()
+                    status = 0
+                except BaseException:
+                    traceback.print_exc()
+                finally:
+                    os._exit(status)
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGTERM})
+            self.children[pid] = self.generation
+
+    def _reap(self):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if self.children.pop(pid, None) == self.generation and not self.stopping:
+                _log('Worker {} exited with status {}'.format(pid, os.waitstatus_to_exitcode(status)))
+                self._respawn_at = time.monotonic() + RESPAWN_DELAY
+
+    def _kill(self, pids, signum):
+        for pid in pids:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _stop(self):
+        self.stopping = True
+        del self._signals[:]
+        self._kill(self.children, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.children and not self._signals and time.monotonic() < deadline:
+            self._sleep(min(deadline - time.monotonic(), 0.1))
+            self._reap()
+        if self.children:
+            _log('Killing {} workers'.format(len(self.children)))
+            self._kill(self.children, signal.SIGKILL)
+            for pid in list(self.children):
+                os.waitpid(pid, 0)
+                del self.children[pid]
+
+    def _run_worker(self):
+        signal.set_wakeup_fd(-1)
+        for fd in self._wakeup:
+            os.close(fd)
+        # Interrupts from the terminal also reach the workers; the master decides how to stop them.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+        master = os.getppid()
+        config = self.application.config
+        config['SHUTDOWN'] = lambda: os.kill(master, signal.SIGTERM)
+        config['RELOAD'] = lambda: os.kill(master, signal.SIGHUP)
+        server = make_server(self.application, self.host, self.port, fd=self.socket.fileno())
+
+        def stop(*args):
+            threading.Thread(target=server.stop).start()
+
+        def write_metrics():
+            metrics.write_snapshot(config['METRICS'], config['METRICS_DIR'], config['EXTRACTOR'].gauges())
+
+        def watch_master():
+            while os.getppid() == master:
+                time.sleep(METRICS_INTERVAL)
+                write_metrics()
+            stop()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGTERM})
+        threading.Thread(target=watch_master, daemon=True).start()
+        try:
+            server.serve_forever()
+        finally:
+            server.close()
+            config['JOB_QUEUE'].shutdown()
+            write_metrics()
+
+
+def run(application, host, port, workers=1, graceful_timeout=DEFAULT_GRACEFUL_TIMEOUT):
+    """ Runs the application until it is stopped, in `workers` pre-forked processes where `os.fork` is available
+    and in this process otherwise.
+
+    :param application: `flask.Flask` built by `create_app`.
+    :param host: Host name or address String to listen on.
+    :param port: Port to listen on, or 0 for any free port.
+    :param workers: Number of worker processes.
+    :param graceful_timeout: Seconds the workers are given to finish their requests and jobs when stopping.
+    """
+
+    if workers > 1 and hasattr(os, 'fork'):
+        Arbiter(application, host, port, workers, graceful_timeout).run()
+    else:
+        serve(application, host, port)
@@ -14,6 +14,8 @@ DEFAULT_WHITELISTS = {
     'network_addresses': ['127.0.0.1', '10.0.0.0/8']
 }
 
+DEFAULT_WHITELIST_MATCH = 'substring'
+
 DEFAULT_BLACKLISTS = {
         'dshield_7D': 'https://raw.githubusercontent.com/firehol/blocklist-ipsets/master/dshield_7d.netset',
         'bambenek_c2': 'https://raw.githubusercontent.com/firehol/blocklist-ipsets/master/bambenek_c2.ipset',
@@ -21,6 +23,12 @@ DEFAULT_BLACKLISTS = {
         'tor_exit': 'https://raw.githubusercontent.com/firehol/blocklist-ipsets/master/tor_exits.ipset'
     }
 
+DEFAULT_EXCLUDED_NETWORKS = [
+    '0.0.0.0/8', '10.0.0.0/8', '100.64.0.0/10', '127.0.0.0/8', '169.254.0.0/16', '172.16.0.0/12', '192.0.0.0/24',
+    '192.168.0.0/16', '198.18.0.0/15', '224.0.0.0/4', '240.0.0.0/4',
+    '::/128', '::1/128', 'fc00::/7', 'fe80::/10', 'ff00::/8'
+]
+
 DEFAULT_AUTO_OPEN_BROWSER = True
 
 
@@ -33,17 +41,49 @@ class Config(object):
     LOCAL_CONF_DIR = os.path.join(USER_HOME_DIRECTORY, '.monteliblobber')
     LOCAL_CONF_FILE = os.path.join(LOCAL_CONF_DIR, 'monteliblobber.cfg')
     MAX_CONTENT_LENGTH = 500 * 1024 * 1024
+    STRINGS_MIN_LENGTH = 4
+    STRINGS_UTF16 = False
+    JOB_WORKERS = 2
+    JOB_TTL = 60 * 60
+    # Processes scanning one large input; set it to `os.cpu_count()` to scan inputs of `PARALLEL_MIN_SIZE` bytes
+    # or more in parallel.
+    EXTRACT_WORKERS = 1
+    PARALLEL_MIN_SIZE = 16 * 1024 * 1024
+    API_BATCH_SIZE = 100
     MAXMIND_CITY_DB_PATH = os.path.join(LOCAL_CONF_DIR, 'GeoLite2-City.mmdb')
     NAMED_NETWORKS = DEFAULT_LABELED_NETWORKS
     WHITELISTS = DEFAULT_WHITELISTS
+    WHITELIST_MATCH = DEFAULT_WHITELIST_MATCH
     AUTO_OPEN_BROWSER = DEFAULT_AUTO_OPEN_BROWSER
-    IP_FILTER = r'^127.+|^0.+|^172\.\d\d.+|^224.+|^238.+|^10\..+|^169\.254.+|^192\.168.+'
+    EXCLUDED_NETWORKS = DEFAULT_EXCLUDED_NETWORKS
+    IP_FILTER = None
     ROOT_DOMAINS_PATH = os.path.join(LOCAL_CONF_DIR, 'root_domains.txt')
     ROOT_DOMAINS_URL = 'http://data.iana.org/TLD/tlds-alpha-by-domain.txt'
+    USE_PUBLIC_SUFFIX_LIST = False
+    PUBLIC_SUFFIX_LIST_PATH = os.path.join(LOCAL_CONF_DIR, 'public_suffix_list.dat')
+    PUBLIC_SUFFIX_LIST_URL = 'https://publicsuffix.org/list/public_suffix_list.dat'
+    GEOIP_CACHE_SIZE = 65536
+    USE_ENRICHMENT_CACHE = False
+    ENRICHMENT_CACHE_PATH = os.path.join(LOCAL_CONF_DIR, 'enrichment_cache.sqlite')
+    ENRICHMENT_CACHE_SIZE = 1000000
+    ENRICHMENT_CACHE_PRELOAD = 65536
+    USE_RESULT_CACHE = False
+    RESULT_CACHE_SIZE = 256
+    RESULT_CACHE_MEMORY = 64 * 1024 * 1024
+    RESULT_CACHE_SPILL = False
+    RESULT_CACHE_PATH = os.path.join(LOCAL_CONF_DIR, 'result_cache.sqlite')
+    RESULT_CACHE_DISK_SIZE = 1024 * 1024 * 1024
+    PROFILE_REQUESTS = False
+    PROFILE_DIR = LOCAL_CONF_DIR
     GEOIP_DB_URL = 'http://geolite.maxmind.com/download/geoip/database/GeoLite2-City.mmdb.gz'
-    BLACKLIST_DB = os.path.join(LOCAL_CONF_DIR, 'blacklist_db.json')
+    BLACKLIST_DB = os.path.join(LOCAL_CONF_DIR, 'blacklist_db.bin')
+    BLACKLIST_JSON_DB = os.path.join(LOCAL_CONF_DIR, 'blacklist_db.json')
     BLACKLIST_MEM_DB = None
     BLACKLISTS = DEFAULT_BLACKLISTS
+    BLACKLIST_FEED_DIR = LOCAL_CONF_DIR
+    BLACKLIST_DOWNLOAD_WORKERS = 4
     HOST = '127.0.0.1'
     PORT = 5007
+    SERVER_WORKERS = 1
+    SERVER_GRACEFUL_TIMEOUT = 30
     SERVER_NAME = HOST + ':' + str(PORT)
@@ -17,6 +17,7 @@ var blobSubmitter = (function () {
         var form = new FormData();
         loader.addClass("loader");
         form.append("blob", blob_field.val());
+        form.append("store", "true");
         resultsBlock.removeClass('hidden');
         sendAjax('/', 'POST', form, SubmissionCallback);
 
@@ -32,7 +33,7 @@ var blobSubmitter = (function () {
         header.addClass("hidden");
         blob_form_section.toggleClass("hidden");
         instructionsContainer.toggleClass("hidden");
-        renderDataTable(resp);
+        renderDataTable(resp.id);
     };
 
     var sendAjax = function (url, method, data, callback) {
@@ -54,11 +55,19 @@ var blobSubmitter = (function () {
         });
     };
 
-    var renderDataTable = function (response, filename) {
-        var exportFilename = filename;
+    // The results stay on the server: the table fetches one sorted and filtered page at a time, and the exports
+    // are streamed from the server rather than built in the browser.
+    var renderDataTable = function (jobId) {
+        var jobUrl = '/jobs/' + jobId;
+        var exportResults = function (format) {
+            window.location = jobUrl + '/export?format=' + format;
+        };
         var tab = $('#result_table').DataTable({
             dom: '<"row" <"col-sm-6" B><"col-sm-3" i><"col-sm-3" f>><"row" <"col-sm-12" rt>><"row" <"col-sm-2" l><"col-sm-10" p><"clear">>',
-            data: response.data,
+            serverSide: true,
+            processing: true,
+            ajax: jobUrl + '/table',
+            searchDelay: 400,
             columns: [
                 {
                     title: "Value",
@@ -82,10 +91,15 @@ var blobSubmitter = (function () {
                             return tags;
                         }
                     }
+                },
+                {
+                    title: "Count",
+                    data: "count",
+                    orderSequence: ["desc", "asc"]
                 }
             ],
             lengthChange: true,
-            lengthMenu: [25, 50, 100, 200, 500, "All"],
+            lengthMenu: [[25, 50, 100, 200, 500], [25, 50, 100, 200, 500]],
             select: true,
             buttons: [
                 {
@@ -112,13 +126,37 @@ var blobSubmitter = (function () {
                 {
                     text: 'Delete Selected',
                     action: function () {
-                        tab.rows({selected: true}).remove().draw();
+                        var selected = tab.rows({selected: true}).data().toArray().map(function (row) {
+                            return {data_type: row.data_type, value: row.value};
+                        });
+                        $.ajax({
+                            type: 'POST',
+                            url: jobUrl + '/remove',
+                            data: JSON.stringify(selected),
+                            contentType: 'application/json',
+                            success: function () {
+                                tab.draw(false);
+                            }
+                        });
+                    }
+                },
+                {
+                    text: 'CSV',
+                    action: function () {
+                        exportResults('csv');
+                    }
+                },
+                {
+                    text: 'NDJSON',
+                    action: function () {
+                        exportResults('ndjson');
                     }
                 },
                 {
-                    extend: 'csvHtml5',
-                    exportOptions: {orthogonal: 'export'},
-                    filename: exportFilename
+                    text: 'STIX',
+                    action: function () {
+                        exportResults('stix');
+                    }
                 },
                 {
                     extend: 'copyHtml5',
@@ -128,11 +166,37 @@ var blobSubmitter = (function () {
         });
     };
 
-    var getResults = function (filename) {
-        resultsBlock.removeClass('hidden');
-        $.getJSON('/results', null, function ( response ) {
-            renderDataTable(response, filename);
-        });
+    var getResults = function (jobId) {
+        var jobStatus = $('#job_status');
+        loader.addClass("loader");
+
+        var showProgress = function (job) {
+            var scanned = (job.bytes_scanned / 1048576).toFixed(1);
+            var total = (job.bytes_total / 1048576).toFixed(1);
+            jobStatus.text('Scanned ' + scanned + ' of ' + total + ' MB, ' + job.indicators_found +
+                ' indicators found.');
+        };
+
+        var poll = function () {
+            $.getJSON('/jobs/' + jobId, null, function (job) {
+                if (job.status === 'finished') {
+                    loader.removeClass("loader");
+                    jobStatus.addClass('hidden');
+                    resultsBlock.removeClass('hidden');
+                    renderDataTable(jobId);
+                } else if (job.status === 'failed') {
+                    loader.removeClass("loader");
+                    jobStatus.addClass('text-danger').text('Processing failed: ' + job.error);
+                } else {
+                    showProgress(job);
+                    setTimeout(poll, 1000);
+                }
+            }).fail(function () {
+                loader.removeClass("loader");
+                jobStatus.addClass('text-danger').text('The job was not found. It may have expired.');
+            });
+        };
+        poll();
     };
 
     return {
@@ -0,0 +1,111 @@
+""" Printable string extraction for binary input.
+"""
+
+import functools
+import mmap
+import os
+import re
+import string
+
+CHUNK_SIZE = 1024 * 1024
+MIN_LENGTH = 4
+
+_PRINTABLE_RUN = re.compile('[{}]+'.format(re.escape(string.printable)))
+_PRINTABLE_BYTES = re.escape(string.printable.encode('ascii'))
+
+
+@functools.lru_cache(maxsize=32)
+def _ascii_regex(min_length):
+    return re.compile(b'[' + _PRINTABLE_BYTES + b']{%d,}' % min_length)
+
+
+@functools.lru_cache(maxsize=32)
+def _utf16_regex(min_length):
+    return re.compile(b'(?:[' + _PRINTABLE_BYTES + b']\x00){%d,}' % min_length)
+
+
+def iter_strings(stream, min_length=MIN_LENGTH, chunk_size=CHUNK_SIZE):
+    """ Reads a text stream in fixed size chunks and yields the runs of printable characters that are at least
+    `min_length` long, each followed by a space. Runs that span chunks are joined, and long runs are yielded in
+    pieces as they are read, so memory use is bounded by the chunk size.
+
+    :param stream: A file stream opened in text mode.
+    :param min_length: Minimum number of printable characters in a run.
+    :param chunk_size: Number of characters read at a time.
+    :return: Generator of Strings
+    """
+
+    run = ''
+    streaming = False
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        matched = False
+        for match in _PRINTABLE_RUN.finditer(chunk):
+            matched = True
+            piece = match.group()
+            if match.start() == 0:
+                piece = run + piece
+            elif streaming:
+                yield ' '
+                streaming = False
+            run = ''
+            if match.end() == len(chunk):
+                if streaming or len(piece) >= min_length:
+                    yield piece
+                    streaming = True
+                else:
+                    run = piece
+            else:
+                if streaming or len(piece) >= min_length:
+                    yield piece + ' '
+                streaming = False
+        if not matched:
+            # The whole chunk is unprintable, which ends any run carried over from the previous chunk.
+            if streaming:
+                yield ' '
+                streaming = False
+            run = ''
+    if streaming:
+        yield ' '
+
+
+def iter_file_strings(filename, min_length=MIN_LENGTH, utf16=False, chunk_size=CHUNK_SIZE, progress=None):
+    """ Yields the printable ASCII strings in a file, each followed by a space, like `strings`. The file is
+    memory-mapped and searched with a compiled bytes pattern, and long strings are decoded in `chunk_size`
+    pieces so memory use stays bounded. Every byte outside `string.printable` ends a string.
+
+    :param filename: Path to the file.
+    :param min_length: Minimum number of printable characters in a string.
+    :param utf16: Also yield UTF-16LE strings, like `strings -el`, after the ASCII strings.
+    :param chunk_size: Maximum number of characters decoded at a time.
+    :param progress: Optional callable receiving the number of bytes scanned, called about once per
+     `chunk_size` bytes. Each pass over the file counts its bytes again.
+    :return: Generator of Strings
+    """
+
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            patterns = [(_ascii_regex(min_length), 'ascii', chunk_size)]
+            if utf16:
+                patterns.append((_utf16_regex(min_length), 'utf-16-le', chunk_size * 2))
+            for done, (pattern, encoding, step) in enumerate(patterns):
+                base = done * size
+                report_at = chunk_size
+                for match in pattern.finditer(buf):
+                    start, end = match.span()
+                    if progress is not None and end >= report_at:
+                        progress(base + end)
+                        report_at = end + chunk_size
+                    if end - start <= step:
+                        yield buf[start:end].decode(encoding) + ' '
+                        continue
+                    for offset in range(start, end, step):
+                        yield buf[offset:min(offset + step, end)].decode(encoding)
+                    yield ' '
+                if progress is not None:
+                    progress(base + size)
@@ -0,0 +1,80 @@
+""" Compares load time, resident memory and lookup throughput of the JSON blacklist DB and the
+memory-mapped binary index.
+
+Usage: python benchmarks/bench_blacklist_format.py [entries] [lookups]
+"""
+
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from Monteliblobber import netindex  # noqa: E402
+from bench_blacklist_lookup import synthetic_blacklist  # noqa: E402
+
+
+def current_rss_kb():
+    """ Resident set size of this process, falling back to the peak where /proc is unavailable. """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def child(filename, lookups):
+    """ Loads one file in a fresh process and reports timings and RSS growth as JSON. """
+    base_rss = current_rss_kb()
+    start = time.perf_counter()
+    index = netindex.load_blacklist(filename)
+    load = time.perf_counter() - start
+    rnd = random.Random(3)
+    probes = [rnd.getrandbits(32) for _ in range(lookups)]
+    start = time.perf_counter()
+    for p in probes:
+        index.lookup(p)
+    lookup = time.perf_counter() - start
+    rss = current_rss_kb() - base_rss
+    print(json.dumps({'load': load, 'lookup': lookup, 'rss_kb': rss}))
+
+
+def main(entries=200000, lookups=100000):
+    blacklist = synthetic_blacklist(entries)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        json_filename = os.path.join(temp_dir, 'blacklist_db.json')
+        bin_filename = os.path.join(temp_dir, 'blacklist_db.bin')
+        with open(json_filename, 'w') as f:
+            json.dump(blacklist, f)
+        netindex.import_json_blacklist(json_filename, bin_filename)
+
+        print('entries: {}  lookups: {}'.format(entries, lookups))
+        print('{:8} {:>10} {:>10} {:>12} {:>14}'.format('format', 'size KB', 'load s', 'RSS KB', 'lookups/s'))
+        for label, filename in (('json', json_filename), ('binary', bin_filename)):
+            out = subprocess.check_output(
+                [sys.executable, __file__, '--child', filename, str(lookups)], cwd=ROOT
+            )
+            result = json.loads(out.decode())
+            print('{:8} {:>10} {:>10.4f} {:>12} {:>14.0f}'.format(
+                label,
+                os.path.getsize(filename) // 1024,
+                result['load'],
+                result['rss_kb'],
+                lookups / result['lookup']
+            ))
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child(sys.argv[2], int(sys.argv[3]))
+    else:
+        main(*[int(a) for a in sys.argv[1:]])
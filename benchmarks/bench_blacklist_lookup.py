@@ -0,0 +1,66 @@
+""" Compares the compiled blacklist index against the original linear scan.
+
+Usage: python benchmarks/bench_blacklist_lookup.py [entries] [lookups]
+"""
+
+import ipaddress
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Monteliblobber import netindex  # noqa: E402
+
+
+def synthetic_blacklist(entries, seed=1):
+    rnd = random.Random(seed)
+    names = ['dshield_7D', 'bambenek_c2', 'alienvault', 'tor_exit']
+    blacklist = []
+    for _ in range(entries):
+        address = str(ipaddress.IPv4Address(rnd.getrandbits(32)))
+        if rnd.random() < 0.1:
+            blacklist.append({'name': names[0], 'type': 'ip_network', 'value': address + '/24'})
+        else:
+            blacklist.append({'name': rnd.choice(names[1:]), 'type': 'ip_address', 'value': address})
+    return blacklist
+
+
+def linear_lookup(ip_address, blacklist_mem_db):
+    """ The original `blacklist_lookup` implementation. """
+    for item in blacklist_mem_db:
+        if item['type'] == 'ip_network' and ip_address in item['value']:
+            return item['name']
+        elif ip_address == item['value']:
+            return item['name']
+
+
+def main(entries=20000, lookups=200):
+    blacklist = synthetic_blacklist(entries)
+    rnd = random.Random(2)
+    probes = [ipaddress.IPv4Address(rnd.getrandbits(32)) for _ in range(lookups)]
+    probes[::4] = [ipaddress.ip_address(i['value'].split('/')[0]) for i in blacklist[:len(probes[::4])]]
+
+    legacy = [dict(i) for i in blacklist]
+    for item in legacy:
+        if item['type'] == 'ip_address':
+            item['value'] = ipaddress.ip_address(item['value'])
+        else:
+            item['value'] = ipaddress.ip_network(item['value'], strict=False)
+
+    build = timeit.timeit(lambda: netindex.compile_blacklist(blacklist), number=1)
+    index = netindex.compile_blacklist(blacklist)
+
+    linear = timeit.timeit(lambda: [linear_lookup(p, legacy) for p in probes], number=1)
+    compiled = timeit.timeit(lambda: [index.lookup(int(p)) for p in probes], number=1)
+
+    print('entries: {}  segments: {}  lookups: {}'.format(entries, len(index), lookups))
+    print('index build:   {:10.4f} s'.format(build))
+    print('linear scan:   {:10.2f} us/lookup'.format(linear / lookups * 1e6))
+    print('compiled:      {:10.2f} us/lookup'.format(compiled / lookups * 1e6))
+    print('speedup:       {:10.0f}x'.format(linear / compiled))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,46 @@
+""" Compares the feed parser against the original per line regular expression filter, for a sorted `.ipset` and a
+`.netset` style feed.
+
+Usage: python benchmarks/bench_feed_parse.py [entries]
+"""
+
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Monteliblobber import feeds, netindex, settings  # noqa: E402
+
+IP_FILTER = r'^127.+|^0.+|^172\.\d\d.+|^224.+|^238.+|^10\..+|^169\.254.+|^192\.168.+'
+
+
+def regex_parse(text, ip_filter):
+    """ The original parser: one regular expression match and one conversion per entry. """
+    excluded = re.compile(ip_filter)
+    return [netindex.ip_range(ip) for ip in feeds._FEED_LINE.findall(text) if not excluded.match(ip)]
+
+
+def synthetic_feed(entries, prefix, seed):
+    rnd = random.Random(seed)
+    values = sorted({rnd.getrandbits(32) & ~((1 << (32 - prefix)) - 1) for _ in range(entries)})
+    suffix = '/{}'.format(prefix) if prefix < 32 else ''
+    return '# synthetic feed\n' + '\n'.join(netindex.format_address(4, value) + suffix for value in values) + '\n'
+
+
+def main(entries=100000):
+    excluded = netindex.compile_networks({'excluded': settings.DEFAULT_EXCLUDED_NETWORKS})
+    print('entries: {}'.format(entries))
+    for name, prefix in (('ipset', 32), ('netset', 24)):
+        text = synthetic_feed(entries, prefix, seed=prefix)
+        regex = min(timeit.repeat(lambda: regex_parse(text, IP_FILTER), number=1, repeat=5))
+        parsed = min(timeit.repeat(lambda: feeds.parse_feed(text, excluded), number=1, repeat=5))
+        _, stats = feeds.parse_feed(text, excluded)
+        print('{:<7} regex filter: {:8.1f} ms   parser: {:8.1f} ms  ({:.1f}x)  {}'.format(
+            name, regex * 1000, parsed * 1000, regex / parsed, stats))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,79 @@
+""" Compares the compiled named network and network white list indexes against the original loops.
+
+Usage: python benchmarks/bench_network_lookup.py [named networks] [lookups]
+"""
+
+import ipaddress
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Monteliblobber import netindex  # noqa: E402
+
+
+def synthetic_networks(count, seed=1):
+    rnd = random.Random(seed)
+    networks = {}
+    for n in range(count):
+        prefix = rnd.choice([16, 20, 24, 28, 32])
+        address = ipaddress.IPv4Address(rnd.getrandbits(32))
+        network = ipaddress.ip_network('{}/{}'.format(address, prefix), strict=False)
+        networks.setdefault('NET{}'.format(n % (count // 4 or 1)), []).append(network)
+    return networks
+
+
+def named_network_loop(ip_address, named_networks):
+    """ The original `named_network_lookup` implementation. """
+    for network_name, network_objects in named_networks.items():
+        for n in network_objects:
+            if ip_address in n:
+                return network_name
+    return None
+
+
+def whitelist_loop(ip_address, whitelisted_addresses):
+    """ The original `whitelist_lookup` implementation. """
+    ip = ipaddress.ip_address(ip_address)
+    for net in whitelisted_addresses:
+        if ip in net:
+            return True
+    return False
+
+
+def main(count=500, lookups=5000):
+    named = synthetic_networks(count)
+    whitelist = [net for nets in synthetic_networks(count, seed=2).values() for net in nets]
+    rnd = random.Random(3)
+    probes = [str(ipaddress.IPv4Address(rnd.getrandbits(32))) for _ in range(lookups)]
+    nets = [net for values in named.values() for net in values]
+    probes[::4] = [str(rnd.choice(nets).network_address) for _ in probes[::4]]
+
+    build = timeit.timeit(lambda: netindex.compile_networks(named), number=1)
+    named_index = netindex.compile_networks(named)
+    whitelist_index = netindex.compile_networks({'whitelist': whitelist})
+
+    def original():
+        for p in probes:
+            if not whitelist_loop(p, whitelist):
+                named_network_loop(ipaddress.ip_address(p), named)
+
+    def compiled():
+        for p in probes:
+            address = netindex.ipv4_to_int(p)
+            if not whitelist_index.lookup(address):
+                named_index.lookup(address)
+
+    linear = timeit.timeit(original, number=1)
+    indexed = timeit.timeit(compiled, number=1)
+    print('named networks: {}  white listed: {}  lookups: {}'.format(len(nets), len(whitelist), lookups))
+    print('index build:   {:10.4f} s'.format(build))
+    print('loops:         {:10.2f} us/address'.format(linear / lookups * 1e6))
+    print('compiled:      {:10.2f} us/address'.format(indexed / lookups * 1e6))
+    print('speedup:       {:10.0f}x'.format(linear / indexed))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
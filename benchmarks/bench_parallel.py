@@ -0,0 +1,45 @@
+""" Measures how extraction scales with the number of scanner worker processes.
+
+Usage: python benchmarks/bench_parallel.py [megabytes] [max workers]
+"""
+
+import concurrent.futures
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Monteliblobber import scanner  # noqa: E402
+from bench_scanner import synthetic_log  # noqa: E402
+
+
+def main(megabytes=64, max_workers=os.cpu_count() or 1):
+    text_blob = synthetic_log(megabytes * 1024 * 1024)
+    mb = len(text_blob) / 1024 / 1024
+
+    start = time.perf_counter()
+    serial = scanner.Scanner()
+    serial.feed(text_blob)
+    expected = serial.close()
+    baseline = time.perf_counter() - start
+    print('blob: {:.1f} MB'.format(mb))
+    print('{:>8} {:>10} {:>10} {:>8}'.format('workers', 'seconds', 'MB/s', 'speedup'))
+    print('{:>8} {:>10.2f} {:>10.2f} {:>8.2f}'.format('serial', baseline, mb / baseline, 1.0))
+
+    for workers in range(1, max_workers + 1):
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        # Start the worker processes before timing.
+        list(executor.map(scanner.scan_unique, [''] * workers))
+        start = time.perf_counter()
+        parallel = scanner.ParallelScanner(executor, workers)
+        parallel.feed(text_blob)
+        result = parallel.close()
+        elapsed = time.perf_counter() - start
+        assert result == expected
+        print('{:>8} {:>10.2f} {:>10.2f} {:>8.2f}'.format(workers, elapsed, mb / elapsed, baseline / elapsed))
+        executor.shutdown()
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
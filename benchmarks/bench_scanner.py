@@ -0,0 +1,57 @@
+""" Measures extraction throughput of the single pass scanner against one `findall` per pattern.
+
+Usage: python benchmarks/bench_scanner.py [megabytes]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Monteliblobber import scanner  # noqa: E402
+
+WORDS = [
+    'the', 'quick', 'GET', '/index.html', 'HTTP/1.1', '200', 'user', 'failed', 'login', 'from', 'port', 'ssh2',
+    'Mozilla/5.0', 'admin@corp.example.com', 'http://evil.example.ru/a/b.php?x=1', 'host-{0}.example.net',
+    '{0}.{1}.{2}.{3}', 'session={0}{1}{2}',
+]
+
+
+def synthetic_log(size, seed=1):
+    rnd = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size:
+        line = ' '.join(rnd.choice(WORDS).format(*[rnd.randrange(256) for _ in range(4)]) for _ in range(12))
+        lines.append(line)
+        total += len(line) + 1
+    return '\n'.join(lines)
+
+
+def per_pattern(text_blob):
+    return {data_type: pattern.findall(text_blob) for data_type, pattern in scanner.PATTERNS.items()}
+
+
+def timed(func, text_blob):
+    start = time.perf_counter()
+    result = func(text_blob)
+    return time.perf_counter() - start, result
+
+
+def main(megabytes=20):
+    text_blob = synthetic_log(megabytes * 1024 * 1024)
+    mb = len(text_blob) / 1024 / 1024
+    baseline, expected = timed(per_pattern, text_blob)
+    single, result = timed(scanner.scan, text_blob)
+    for data_type in scanner.DATA_TYPES:
+        assert sorted(result[data_type]) == sorted(expected[data_type]), data_type
+
+    print('blob: {:.1f} MB'.format(mb))
+    print('findall per pattern: {:8.2f} MB/s'.format(mb / baseline))
+    print('single pass scanner: {:8.2f} MB/s'.format(mb / single))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,93 @@
+""" Compares the original character by character `extract_strings` with the chunked text extractor and the
+memory-mapped bytes extractor on synthetic binary files.
+
+Usage: python benchmarks/bench_strings.py [megabytes ...] [--legacy-limit MB]
+
+The original implementation is slow enough that it only runs for files up to `--legacy-limit` megabytes
+(default 100).
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Monteliblobber import strings  # noqa: E402
+
+
+def legacy_extract_strings(stream):
+    """ The original `extract_strings` implementation. """
+    chars = string.printable
+    min_length = 4
+    results = ""
+    result = ""
+    for c in stream.read():
+        if c in chars:
+            result += c
+            continue
+        if len(result) >= min_length:
+            results += result + " "
+        result = ""
+    if len(result) >= min_length:
+        results += result + " "
+    return results
+
+
+def write_sample(filename, size, seed=1):
+    """ Writes a mix of random binary noise and printable log-like text. """
+    rnd = random.Random(seed)
+    noise = bytes(rnd.getrandbits(8) for _ in range(64 * 1024))
+    text = b'GET /index.html HTTP/1.1 host-12.example.net 10.1.2.3 admin@corp.example.com\n' * 200
+    written = 0
+    with open(filename, 'wb') as f:
+        while written < size:
+            block = noise if rnd.random() < 0.7 else text
+            f.write(block)
+            written += len(block)
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def consume(iterator):
+    for _ in iterator:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('sizes', nargs='*', type=int, default=[10, 100, 500])
+    parser.add_argument('--legacy-limit', type=int, default=100)
+    args = parser.parse_args()
+
+    print('{:>8} {:>12} {:>12} {:>12}'.format('MB', 'legacy s', 'chunked s', 'mmap s'))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in args.sizes:
+            filename = os.path.join(temp_dir, 'sample.bin')
+            write_sample(filename, size * 1024 * 1024)
+
+            def legacy():
+                with open(filename, errors='ignore') as f:
+                    legacy_extract_strings(f)
+
+            def chunked():
+                with open(filename, errors='ignore') as f:
+                    consume(strings.iter_strings(f))
+
+            legacy_time = timed(legacy) if size <= args.legacy_limit else float('nan')
+            chunked_time = timed(chunked)
+            mmap_time = timed(lambda: consume(strings.iter_file_strings(filename)))
+            print('{:>8} {:>12.2f} {:>12.2f} {:>12.2f}'.format(size, legacy_time, chunked_time, mmap_time))
+            os.remove(filename)
+
+
+if __name__ == '__main__':
+    main()
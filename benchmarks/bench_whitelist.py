@@ -0,0 +1,49 @@
+""" Compares the compiled domain white list against the original substring loop.
+
+Usage: python benchmarks/bench_whitelist.py [domains] [candidates]
+"""
+
+import os
+import random
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Monteliblobber import domains  # noqa: E402
+
+
+def random_domain(rnd):
+    label = ''.join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randint(4, 12)))
+    return '{}.{}'.format(label, rnd.choice(['com', 'net', 'org', 'co.uk', 'de']))
+
+
+def loop_check(candidate, whitelist):
+    """ The original `check_domain_whitelist` implementation. """
+    for i in whitelist:
+        if i in candidate:
+            return True
+    return False
+
+
+def main(entries=5000, candidates=2000):
+    rnd = random.Random(1)
+    whitelist = [random_domain(rnd) for _ in range(entries)]
+    probes = ['https://www.{}/index.html'.format(random_domain(rnd)) for _ in range(candidates)]
+    probes[::10] = ['mail.' + rnd.choice(whitelist) for _ in probes[::10]]
+
+    print('domains: {}  candidates: {}'.format(entries, candidates))
+    loop = timeit.timeit(lambda: [loop_check(p, whitelist) for p in probes], number=1)
+    print('substring loop:    {:10.2f} us/candidate'.format(loop / candidates * 1e6))
+    for match in (domains.SUBSTRING, domains.SUFFIX):
+        build = timeit.timeit(lambda: domains.DomainWhitelist(whitelist, match), number=1)
+        compiled = domains.DomainWhitelist(whitelist, match)
+        elapsed = timeit.timeit(lambda: [compiled.matches(p) for p in probes], number=1)
+        print('{:<9} build:   {:10.4f} s'.format(match, build))
+        print('{:<9} match:   {:10.2f} us/candidate  ({:.0f}x)'.format(
+            match, elapsed / candidates * 1e6, loop / elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
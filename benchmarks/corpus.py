@@ -0,0 +1,290 @@
+""" Synthetic corpora and lookup fixtures for the benchmark suite.
+
+Text blobs mix log-like filler with IPv4 and IPv6 addresses, email addresses, URLs and host names at a given
+density, the share of words that are indicators. Binary samples scatter such text, partly as UTF-16LE, between
+runs of random bytes, the way strings sit in a memory dump or an executable. The fixtures are a root domain list, a
+blacklist index, white lists and named networks, and a config file pointing at them, so the whole pipeline runs
+offline. There is no GeoIP database: `SyntheticGeoIPReader` answers in its place.
+
+Everything is derived from the seed, so the same arguments always give the same bytes.
+
+Usage: python benchmarks/corpus.py DIRECTORY [--size MEGABYTES] [--density FRACTION] [--unique N] [--seed N]
+"""
+
+import argparse
+import ipaddress
+import os
+import random
+import sys
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Monteliblobber import netindex  # noqa: E402
+
+KINDS = ('ipv4', 'ipv6', 'email', 'url', 'hostname')
+
+# Share of each kind of indicator.
+DEFAULT_MIX = {'ipv4': 0.35, 'ipv6': 0.05, 'email': 0.2, 'url': 0.2, 'hostname': 0.2}
+
+FILLER = [
+    'the', 'quick', 'GET', 'POST', '/index.html', 'HTTP/1.1', '200', '404', 'user', 'failed', 'login', 'from',
+    'port', 'ssh2', 'Mozilla/5.0', 'session', 'accepted', 'password', 'for', 'invalid', 'connection', 'closed', 'by',
+    'ERROR', 'INFO', 'WARN', '2019-03-04T10:22:31Z', 'pid=4242', 'status=sent', 'relay=local', 'v1.2.3', '10:22:31',
+]
+
+TLDS = ['com', 'net', 'org', 'ru', 'cn', 'io', 'info', 'de', 'uk', 'br']
+
+# Top level domains left out of the root domain fixture, so some host names fail validation.
+INVALID_TLDS = ['zzx', 'local', 'lan']
+
+PRIVATE_NETWORKS = ['10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16']
+
+COUNTRIES = ['United States', 'Russia', 'China', 'Germany', 'Brazil', 'Netherlands', 'France', 'Japan']
+
+BLACKLIST_NAMES = ['dshield_7D', 'bambenek_c2', 'alienvault', 'tor_exit']
+
+
+def _label(rnd, low=3, high=10):
+    return ''.join(rnd.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(rnd.randint(low, high)))
+
+
+class Generator(object):
+    """ Deterministic source of synthetic indicators and text. Each kind of indicator is drawn from a pool of
+    `unique` distinct values, which sets how often values repeat and so how much de-duplication saves.
+    """
+
+    def __init__(self, seed=1, unique=5000, mix=None):
+        self.seed = seed
+        self.mix = mix or DEFAULT_MIX
+        self.rnd = random.Random(seed)
+        self.domains = self._domains(random.Random('{}-domains'.format(seed)), max(unique // 4, 10))
+        self.pools = {
+            kind: [getattr(self, '_' + kind)(random.Random('{}-{}-{}'.format(seed, kind, i))) for i in range(unique)]
+            for kind in KINDS
+        }
+        self._kinds = list(self.mix)
+        self._weights = [self.mix[kind] for kind in self._kinds]
+
+    @staticmethod
+    def _domains(rnd, count):
+        domains = []
+        for _ in range(count):
+            tld = rnd.choice(INVALID_TLDS) if rnd.random() < 0.05 else rnd.choice(TLDS)
+            domains.append('{}.{}'.format(_label(rnd, 4, 12), tld))
+        return domains
+
+    def _ipv4(self, rnd):
+        if rnd.random() < 0.1:
+            network = ipaddress.ip_network(rnd.choice(PRIVATE_NETWORKS))
+            return str(network[rnd.randrange(network.num_addresses)])
+        return str(ipaddress.IPv4Address(rnd.randrange(1 << 24, 223 << 24)))
+
+    def _ipv6(self, rnd):
+        return str(ipaddress.IPv6Address((0x2001 << 112) | rnd.getrandbits(96) << 16 >> rnd.choice((0, 16, 32))))
+
+    def _email(self, rnd):
+        return '{}@{}'.format(_label(rnd), rnd.choice(self.domains))
+
+    def _url(self, rnd):
+        path = '/'.join(_label(rnd) for _ in range(rnd.randint(0, 3)))
+        query = '?id={}'.format(rnd.randrange(10000)) if rnd.random() < 0.3 else ''
+        return '{}://{}.{}/{}{}'.format(rnd.choice(('http', 'https')), _label(rnd), rnd.choice(self.domains), path,
+                                        query)
+
+    def _hostname(self, rnd):
+        return '{}.{}'.format(_label(rnd), rnd.choice(self.domains))
+
+    def indicator(self, kind=None):
+        """ Returns one indicator from the pools.
+
+        :param kind: One of `KINDS`, or None to pick one by the mix.
+        :return: String
+        """
+
+        if kind is None:
+            kind = self.rnd.choices(self._kinds, self._weights)[0]
+        return self.rnd.choice(self.pools[kind])
+
+    def line(self, density, words=12):
+        """ Returns one line of filler words, each replaced by an indicator with probability `density`.
+
+        :param density: Share of the words that are indicators.
+        :param words: Number of words in the line.
+        :return: String
+        """
+
+        rnd = self.rnd
+        return ' '.join(self.indicator() if rnd.random() < density else rnd.choice(FILLER) for _ in range(words))
+
+    def text(self, size, density=0.05):
+        """ Returns a text blob of at least `size` characters.
+
+        :param size: Number of characters.
+        :param density: Share of the words that are indicators.
+        :return: String
+        """
+
+        lines = []
+        total = 0
+        while total < size:
+            line = self.line(density)
+            lines.append(line)
+            total += len(line) + 1
+        return '\n'.join(lines) + '\n'
+
+    def binary(self, size, density=0.05, utf16=0.2):
+        """ Returns binary data of at least `size` bytes: random bytes with lines of text in between.
+
+        :param size: Number of bytes.
+        :param density: Share of the words of the text that are indicators.
+        :param utf16: Share of the text lines encoded as UTF-16LE rather than ASCII.
+        :return: Bytes
+        """
+
+        rnd = self.rnd
+        parts = []
+        total = 0
+        while total < size:
+            noise = rnd.randbytes(rnd.randint(64, 2048))
+            line = self.line(density).encode('utf-16-le' if rnd.random() < utf16 else 'ascii')
+            parts.append(noise)
+            parts.append(line)
+            total += len(noise) + len(line)
+        return b''.join(parts)
+
+    def blacklist_ranges(self, entries, listed=0.1):
+        """ Returns blacklist ranges: a share of the IPv4 and IPv6 pools, so lookups find some of them, and random
+        hosts and networks.
+
+        :param entries: Number of random entries besides the listed pool addresses.
+        :param listed: Share of the pool addresses that are blacklisted.
+        :return: List of (version, start, end, name) tuples
+        """
+
+        rnd = random.Random('{}-blacklist'.format(self.seed))
+        ranges = []
+        for kind, version in (('ipv4', 4), ('ipv6', 6)):
+            for value in self.pools[kind][:int(len(self.pools[kind]) * listed)]:
+                address = int(ipaddress.ip_address(value))
+                ranges.append((version, address, address, rnd.choice(BLACKLIST_NAMES)))
+        for _ in range(entries):
+            address = rnd.randrange(1 << 24, 223 << 24)
+            if rnd.random() < 0.1:
+                address &= ~0xff
+                ranges.append((4, address, address + 0xff, BLACKLIST_NAMES[0]))
+            else:
+                ranges.append((4, address, address, rnd.choice(BLACKLIST_NAMES[1:])))
+        return ranges
+
+    def write_fixtures(self, directory, blacklist_entries=20000):
+        """ Writes the lookup fixtures and a config file using them. The config keeps the enrichment cache and the
+        uploads in `directory`, runs every extraction in one process and doesn't cache the results of whole
+        extractions.
+
+        :param directory: Path to an existing directory.
+        :param blacklist_entries: Number of random blacklist entries.
+        :return: Path to the config file.
+        """
+
+        paths = {
+            'ROOT_DOMAINS_PATH': os.path.join(directory, 'root_domains.txt'),
+            'BLACKLIST_DB': os.path.join(directory, 'blacklist_db.bin'),
+            'BLACKLIST_JSON_DB': os.path.join(directory, 'blacklist_db.json'),
+            'MAXMIND_CITY_DB_PATH': os.path.join(directory, 'GeoLite2-City.mmdb'),
+            'ENRICHMENT_CACHE_PATH': os.path.join(directory, 'enrichment_cache.sqlite'),
+            'LOCAL_CONF_DIR': directory,
+            'PROFILE_DIR': directory,
+        }
+        with open(paths['ROOT_DOMAINS_PATH'], 'w') as f:
+            f.write('# Synthetic root domains\n')
+            f.write(''.join(tld.upper() + '\n' for tld in TLDS))
+        netindex.write_index(
+            netindex.NetworkIndex.from_family_ranges(self.blacklist_ranges(blacklist_entries)), paths['BLACKLIST_DB']
+        )
+        # Only checked for existence; `SyntheticGeoIPReader` answers the lookups.
+        open(paths['MAXMIND_CITY_DB_PATH'], 'wb').close()
+
+        settings = dict(paths)
+        settings.update({
+            'NAMED_NETWORKS': {
+                'CORP': [value + '/32' for value in self.pools['ipv4'][-20:]] + ['203.0.113.0/24'],
+                'LAB': ['198.51.100.0/24'],
+            },
+            'WHITELISTS': {
+                'domains': self.domains[:5],
+                'network_addresses': ['127.0.0.1', '10.0.0.0/8'],
+            },
+            'AUTO_OPEN_BROWSER': False,
+            'EXTRACT_WORKERS': 1,
+            'USE_RESULT_CACHE': False,
+        })
+        config = os.path.join(directory, 'benchmark.cfg')
+        with open(config, 'w') as f:
+            for name, value in settings.items():
+                f.write('{} = {!r}\n'.format(name, value))
+        return config
+
+
+class SyntheticGeoIPReader(object):
+    """ Stands in for `geoip2.database.Reader`. Public addresses get a country derived from their hash, and
+    private ones aren't found, like in the GeoLite2 database. Install it with `install_geoip_reader`.
+    """
+
+    def __init__(self):
+        import geoip2.errors
+        self._not_found = geoip2.errors.AddressNotFoundError
+
+    def city(self, address):
+        ip = ipaddress.ip_address(address)
+        if ip.is_private or ip.is_reserved or ip.is_multicast:
+            raise self._not_found('{} is not in the database.'.format(address))
+        return _City(COUNTRIES[zlib.crc32(address.encode('ascii')) % len(COUNTRIES)])
+
+
+class _Country(object):
+
+    def __init__(self, name):
+        self.name = name
+
+
+class _Traits(object):
+    is_anonymous_proxy = False
+
+
+class _City(object):
+
+    def __init__(self, country):
+        self.registered_country = _Country(country)
+        self.traits = _Traits()
+
+
+def install_geoip_reader():
+    """ Makes the GeoIP databases of this process open as a `SyntheticGeoIPReader`.
+    """
+
+    from Monteliblobber import geolocation
+    geolocation.open_reader = lambda filename: SyntheticGeoIPReader()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Writes a synthetic corpus and the lookup fixtures.')
+    parser.add_argument('directory')
+    parser.add_argument('--size', type=float, default=4, help='Megabytes of text and of binary data.')
+    parser.add_argument('--density', type=float, default=0.05, help='Share of the words that are indicators.')
+    parser.add_argument('--unique', type=int, default=5000, help='Distinct indicators of each kind.')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    generator = Generator(args.seed, args.unique)
+    size = int(args.size * 1024 * 1024)
+    with open(os.path.join(args.directory, 'corpus.txt'), 'w') as f:
+        f.write(generator.text(size, args.density))
+    with open(os.path.join(args.directory, 'corpus.bin'), 'wb') as f:
+        f.write(generator.binary(size, args.density))
+    print(generator.write_fixtures(args.directory))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+""" Benchmark suite for the extraction pipeline, with results that can be compared across commits.
+
+Every case runs on the same synthetic corpus and lookup fixtures, built offline from a seed by `corpus`: string
+extraction, the scanner, each `get_*` extractor, `dedup_list`, `validate_root_domain`, the address enrichment with
+and without its cache, and end-to-end `/` and `/file` requests through the Flask test client. Each case runs once
+to warm up and then `--repeat` times. The results, with the commit and the parameters they were measured with, are
+written as JSON, and a previous results file can be compared against to flag the cases whose median got slower by
+more than `--threshold`.
+
+GeoIP lookups are answered by a synthetic reader unless `--geoip` names a GeoLite2 City database. The end-to-end
+cases use the enrichment cache, so their repeats after the first find every address in it. The result cache is off
+except in the `_result_cached` cases, where every repeat is answered from it.
+
+Usage:
+    python benchmarks/suite.py [--size MEGABYTES] [--density FRACTION] [--repeat N] [--output results.json]
+    python benchmarks/suite.py --compare baseline.json [--threshold 1.2] [--cases get_,http]
+"""
+
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from Monteliblobber import enrichment, extractor, geolocation, monteliblobber, scanner, strings  # noqa: E402
+import corpus  # noqa: E402
+
+FORMAT_VERSION = 1
+
+
+class Case(object):
+    """ One timed operation. `setup` runs before every repeat, untimed. `size` is the number of input bytes, for
+    the throughput. `count` gives the number of items in a result, its length by default.
+    """
+
+    def __init__(self, name, func, setup=None, size=0, count=None):
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.size = size
+        self.count = count
+
+    def run(self, repeat, warmup=1):
+        """ Times the case.
+
+        :param repeat: Number of timed runs.
+        :param warmup: Number of untimed runs first.
+        :return: Dictionary of the durations in seconds, their statistics and the size of the result.
+        """
+
+        seconds = []
+        result = None
+        for i in range(warmup + repeat):
+            if self.setup is not None:
+                self.setup()
+            start = time.perf_counter()
+            result = self.func()
+            elapsed = time.perf_counter() - start
+            if i >= warmup:
+                seconds.append(elapsed)
+        median = statistics.median(seconds)
+        return {
+            'seconds': seconds,
+            'min': min(seconds),
+            'median': median,
+            'mean': statistics.mean(seconds),
+            'stdev': statistics.stdev(seconds) if len(seconds) > 1 else 0.0,
+            'bytes': self.size,
+            'mb_per_s': self.size / median / 1024 / 1024 if self.size and median else None,
+            'items': self._count(result),
+        }
+
+    def _count(self, result):
+        if self.count is not None:
+            return self.count(result)
+        return len(result) if hasattr(result, '__len__') else None
+
+
+def _total(result):
+    values = result.values() if hasattr(result, 'values') else result
+    return sum(len(value) for value in values)
+
+
+def build_cases(directory, args):
+    """ Writes the corpus and the fixtures, and returns the cases using them.
+
+    :param directory: Path to an empty directory for the fixtures.
+    :param args: Parsed command line arguments.
+    :return: List of `Case`
+    """
+
+    generator = corpus.Generator(args.seed, args.unique)
+    config_file = generator.write_fixtures(directory, args.blacklist_entries)
+    size = int(args.size * 1024 * 1024)
+    text = generator.text(size, args.density)
+    binary = generator.binary(size, args.density)
+    binary_file = os.path.join(directory, 'corpus.bin')
+    with open(binary_file, 'wb') as f:
+        f.write(binary)
+
+    if args.geoip:
+        with open(config_file, 'a') as f:
+            f.write('MAXMIND_CITY_DB_PATH = {!r}\n'.format(os.path.abspath(args.geoip)))
+    else:
+        corpus.install_geoip_reader()
+    config = extractor.load_config(config_file)
+    geoip_file = config['MAXMIND_CITY_DB_PATH']
+    blacklist_file = config['BLACKLIST_DB']
+    root_domains_file = config['ROOT_DOMAINS_PATH']
+    named_networks = config['NAMED_NETWORKS']
+    network_whitelist = config['WHITELISTS']['network_addresses']
+    domain_whitelist = config['WHITELISTS']['domains']
+    geoip_cache = geolocation.get_database(geoip_file).cache
+
+    matches = scanner.scan(text)
+    ipv4_addresses = extractor.dedup_list(matches[scanner.IPV4_ADDRESS])
+    hostnames = extractor.dedup_list(matches[scanner.DNS_NAME])
+
+    def extract_strings():
+        with open(binary_file, errors='ignore') as f:
+            return extractor.extract_strings(f)
+
+    def file_strings():
+        return ''.join(strings.iter_file_strings(binary_file, utf16=True))
+
+    def analyze(enrichment_cache=None):
+        ips = [{'value': value, 'data_type': 'ipv4_address'} for value in ipv4_addresses]
+        return extractor.analyze_network_address(ips, geoip_file, blacklist_file, named_networks, enrichment_cache)
+
+    cold_cache_file = os.path.join(directory, 'cold_cache.sqlite')
+    cold_cache = [None]
+
+    def new_cold_cache():
+        geoip_cache.clear()
+        if cold_cache[0] is not None:
+            cold_cache[0].close()
+        if os.path.exists(cold_cache_file):
+            os.remove(cold_cache_file)
+        cold_cache[0] = enrichment.EnrichmentCache(cold_cache_file)
+
+    warm_cache = enrichment.EnrichmentCache(os.path.join(directory, 'warm_cache.sqlite'))
+
+    def clear_warm_memory():
+        geoip_cache.clear()
+        warm_cache.memory.clear()
+
+    application = monteliblobber.create_app(config_file)
+    application.config['TESTING'] = True
+    client = application.test_client()
+    cached_application = monteliblobber.create_app(config_file)
+    cached_application.config['EXTRACTOR'] = extractor.Extractor(dict(cached_application.config, USE_RESULT_CACHE=True))
+    cached_application.config['TESTING'] = True
+    cached_client = cached_application.test_client()
+
+    def post_blob(client=client):
+        response = client.post('/', data={'blob': text})
+        return response.get_json()['data']
+
+    def post_file(client=client):
+        response = client.post(
+            '/file', data={'file': (io.BytesIO(binary), 'corpus.bin')}, headers={'Accept': 'application/json'}
+        )
+        job_id = response.get_json()['id']
+        while client.get('/jobs/' + job_id).get_json()['finished'] is None:
+            time.sleep(0.001)
+        return client.get('/jobs/{}/results'.format(job_id)).get_json()['data']
+
+    return [
+        Case('extract_strings', extract_strings, size=len(binary)),
+        Case('file_strings', file_strings, size=len(binary)),
+        Case('scan', lambda: scanner.scan(text), size=len(text), count=_total),
+        Case('get_network_addresses', lambda: extractor.get_network_addresses(
+            text, geoip_file, blacklist_file, named_networks, network_whitelist
+        ), geoip_cache.clear, len(text)),
+        Case('get_ipv6_addresses', lambda: extractor.get_ipv6_addresses(
+            text, geoip_file, blacklist_file, named_networks, network_whitelist
+        ), geoip_cache.clear, len(text)),
+        Case('get_email_addresses', lambda: extractor.get_email_addresses(text, domain_whitelist), size=len(text)),
+        Case('get_urls', lambda: extractor.get_urls(text, domain_whitelist), size=len(text)),
+        Case('get_hostnames', lambda: extractor.get_hostnames(text, root_domains_file, domain_whitelist),
+             size=len(text)),
+        Case('dedup_list', lambda: [extractor.dedup_list(found) for found in matches.values()], count=_total),
+        Case('validate_root_domain', lambda: extractor.validate_root_domain(hostnames, root_domains_file)),
+        Case('enrichment_uncached', analyze, geoip_cache.clear),
+        Case('enrichment_cold', lambda: analyze(cold_cache[0]), new_cold_cache),
+        Case('enrichment_warm_disk', lambda: analyze(warm_cache), clear_warm_memory),
+        Case('enrichment_warm_memory', lambda: analyze(warm_cache), geoip_cache.clear),
+        Case('http_index', post_blob, size=len(text)),
+        Case('http_file', post_file, size=len(binary)),
+        Case('http_index_result_cached', lambda: post_blob(cached_client), size=len(text)),
+        Case('http_file_result_cached', lambda: post_file(cached_client), size=len(binary)),
+    ]
+
+
+def git_revision():
+    """ Returns the commit of the working tree and whether it has uncommitted changes, or None outside of git.
+
+    :return: Tuple of (commit String or None, Bool or None)
+    """
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True
+        ).stdout.decode().strip()
+        status = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, check=True
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def compare(baseline, results, threshold):
+    """ Prints the median of each case against a baseline and returns the cases slower by more than `threshold`.
+
+    :param baseline: Results dictionary of an earlier run.
+    :param results: Results dictionary of this run.
+    :param threshold: Ratio of the current to the baseline median above which a case is a regression.
+    :return: List of case names
+    """
+
+    if baseline.get('params') != results['params']:
+        print('warning: the baseline was measured with other parameters: {}'.format(baseline.get('params')))
+    print('\nbaseline: {}'.format(baseline.get('meta', {}).get('commit')))
+    print('{:<24} {:>12} {:>12} {:>8}'.format('case', 'baseline ms', 'current ms', 'ratio'))
+    regressions = []
+    for name, case in results['cases'].items():
+        before = baseline.get('cases', {}).get(name)
+        if before is None:
+            print('{:<24} {:>12} {:>12.2f} {:>8}'.format(name, '-', case['median'] * 1000, '-'))
+            continue
+        ratio = case['median'] / before['median'] if before['median'] else float('inf')
+        flag = ''
+        if ratio > threshold:
+            regressions.append(name)
+            flag = '  slower'
+        print('{:<24} {:>12.2f} {:>12.2f} {:>8.2f}{}'.format(
+            name, before['median'] * 1000, case['median'] * 1000, ratio, flag
+        ))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Times the extraction pipeline on a synthetic corpus.')
+    parser.add_argument('--size', type=float, default=2, help='Megabytes of text and of binary input.')
+    parser.add_argument('--density', type=float, default=0.05, help='Share of the words that are indicators.')
+    parser.add_argument('--unique', type=int, default=5000, help='Distinct indicators of each kind.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--blacklist-entries', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs of each case.')
+    parser.add_argument('--cases', help='Comma separated substrings; only the cases matching one of them run.')
+    parser.add_argument('--geoip', help='GeoLite2 City database to use instead of the synthetic reader.')
+    parser.add_argument('-o', '--output', help='Write the results to this JSON file.')
+    parser.add_argument('--compare', help='Results JSON file of an earlier run to compare against.')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='Median ratio above which a case counts as a regression. Defaults to 1.2.')
+    args = parser.parse_args(argv)
+
+    commit, dirty = git_revision()
+    results = {
+        'version': FORMAT_VERSION,
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'geoip': 'file' if args.geoip else 'synthetic',
+        },
+        'params': {
+            'size': args.size,
+            'density': args.density,
+            'unique': args.unique,
+            'seed': args.seed,
+            'blacklist_entries': args.blacklist_entries,
+            'repeat': args.repeat,
+        },
+        'cases': {},
+    }
+    selected = [pattern for pattern in (args.cases or '').split(',') if pattern]
+
+    with tempfile.TemporaryDirectory() as directory:
+        cases = build_cases(directory, args)
+        print('{:<24} {:>10} {:>10} {:>10} {:>8}'.format('case', 'median ms', 'min ms', 'MB/s', 'items'))
+        for case in cases:
+            if selected and not any(pattern in case.name for pattern in selected):
+                continue
+            result = results['cases'][case.name] = case.run(args.repeat)
+            print('{:<24} {:>10.2f} {:>10.2f} {:>10} {:>8}'.format(
+                case.name, result['median'] * 1000, result['min'] * 1000,
+                '{:.1f}'.format(result['mb_per_s']) if result['mb_per_s'] else '-',
+                result['items'] if result['items'] is not None else '-'
+            ))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print('\n{} cases slower than {:.2f}x the baseline: {}'.format(
+                len(regressions), args.threshold, ', '.join(regressions)
+            ))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
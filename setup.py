@@ -17,4 +17,7 @@ setup(
     author_email='andrewstokes@users.noreply.github.com',
     description='A reasonable way to extract and contextualize network artifacts from blobs.',
     long_description=readme,
+    entry_points={
+        'console_scripts': ['monteliblobber = Monteliblobber.cli:main'],
+    },
 )
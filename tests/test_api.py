@@ -0,0 +1,309 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+from flask import json
+from Monteliblobber import extractor, monteliblobber
+
+
+class BatchApiTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = monteliblobber.app
+        self.saved = dict(self.app.config)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app.config['ROOT_DOMAINS_PATH'] = os.path.join(self.temp_dir.name, 'root_domains.txt')
+        with open(self.app.config['ROOT_DOMAINS_PATH'], 'w') as f:
+            f.write('# Root domains\nCOM\nRU\n')
+        self.app.config['EXTRACTOR'] = extractor.Extractor(self.app.config)
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.documents = [
+            {'id': 'a', 'blob': 'From: evil@evil-example.ru visit http://evil.example.ru/a.php'},
+            'Contact bob@bob-example.com or evil@evil-example.ru, https://bob-example.com/contact',
+            {'id': 'c', 'blob': 'nothing to see here'},
+        ]
+
+    def tearDown(self):
+        self.app.config.clear()
+        self.app.config.update(self.saved)
+        self.temp_dir.cleanup()
+
+    def results(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    def values(self, result):
+        return sorted(artifact['value'] for artifact in result['data'])
+
+    def test_json_array(self):
+        """ Every document gets its own result line, in input order.
+        """
+        results = self.results(self.client.post('/api/v1/extract', json=self.documents))
+        self.assertEqual([r['id'] for r in results], ['a', 1, 'c'])
+        self.assertEqual(self.values(results[0]), [
+            'evil-example.ru', 'evil.example.ru', 'evil@evil-example.ru', 'http://evil.example.ru/a.php'
+        ])
+        self.assertEqual(self.values(results[1]), [
+            'bob-example.com', 'bob@bob-example.com', 'evil-example.ru', 'evil@evil-example.ru',
+            'https://bob-example.com/contact'
+        ])
+        self.assertEqual(results[2]['data'], [])
+
+    def test_ndjson(self):
+        body = '\n'.join(json.dumps(document) for document in self.documents) + '\nnot json\n\n'
+        response = self.client.post('/api/v1/extract', data=body, content_type='application/x-ndjson')
+        results = self.results(response)
+        self.assertEqual([r['id'] for r in results], ['a', 1, 'c', 3])
+        self.assertEqual(len(results[1]['data']), 5)
+        self.assertIn('error', results[3])
+
+    def test_enrichment_shared_across_batch(self):
+        """ The matches of a batch are analyzed together, once per batch.
+        """
+        self.app.config['API_BATCH_SIZE'] = 2
+        blob_extractor = self.app.config['EXTRACTOR']
+        with mock.patch.object(blob_extractor, 'analyze', wraps=blob_extractor.analyze) as analyze:
+            results = self.results(self.client.post('/api/v1/extract', json=self.documents))
+        self.assertEqual(len(results), 3)
+        self.assertEqual(analyze.call_count, 1)
+        emails = analyze.call_args_list[0][0][0]['email']
+        self.assertEqual(sorted(emails), ['bob@bob-example.com', 'evil@evil-example.ru'])
+
+    def test_occurrences(self):
+        """ Counts and first match offsets are kept per document.
+        """
+        documents = ['evil@evil-example.ru x evil@evil-example.ru', 'bob@bob-example.com evil@evil-example.ru']
+        results = self.results(self.client.post('/api/v1/extract', json=documents))
+        emails = [
+            [(a['value'], a['count'], a['first_seen']) for a in result['data'] if a['data_type'] == 'email']
+            for result in results
+        ]
+        self.assertEqual(emails, [
+            [('evil@evil-example.ru', 2, 0)],
+            [('bob@bob-example.com', 1, 0), ('evil@evil-example.ru', 1, 20)]
+        ])
+
+    def test_invalid_documents(self):
+        results = self.results(self.client.post('/api/v1/extract', json=['ok text', 42, {'id': 'x'}]))
+        self.assertEqual(results[0], {'id': 0, 'data': []})
+        self.assertIn('error', results[1])
+        self.assertEqual(results[2]['id'], 'x')
+        self.assertIn('error', results[2])
+
+    def test_rejects_other_bodies(self):
+        response = self.client.post('/api/v1/extract', json={'blob': 'text'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ResultsApiTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = monteliblobber.app
+        self.saved = dict(self.app.config)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app.config['ROOT_DOMAINS_PATH'] = os.path.join(self.temp_dir.name, 'root_domains.txt')
+        with open(self.app.config['ROOT_DOMAINS_PATH'], 'w') as f:
+            f.write('# Root domains\nCOM\nRU\n')
+        self.app.config['EXTRACTOR'] = extractor.Extractor(self.app.config)
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.blob = 'evil@evil-example.ru bob@bob-example.com http://evil.example.ru/a.php http://bob-example.com/b'
+
+    def tearDown(self):
+        self.app.config.clear()
+        self.app.config.update(self.saved)
+        self.temp_dir.cleanup()
+
+    def store(self):
+        response = self.client.post('/', data={'blob': self.blob, 'store': 'true'})
+        self.assertEqual(response.status_code, 200)
+        return '/jobs/' + json.loads(response.data)['id']
+
+    def test_streamed_document(self):
+        """ Without `store` the artifacts are streamed back in the original document format.
+        """
+        response = self.client.post('/', data={'blob': self.blob})
+        data = json.loads(response.data)['data']
+        self.assertEqual(len(data), 7)
+        self.assertEqual(json.loads(self.client.get(self.store() + '/results').data)['data'], data)
+
+    def test_table(self):
+        job_url = self.store()
+        query = {
+            'draw': '3', 'start': '1', 'length': '2', 'search[value]': 'EXAMPLE.RU',
+            'order[0][column]': '0', 'order[0][dir]': 'desc', 'columns[0][data]': 'value'
+        }
+        page = json.loads(self.client.get(job_url + '/table', query_string=query).data)
+        self.assertEqual((page['draw'], page['recordsTotal'], page['recordsFiltered']), (3, 7, 4))
+        self.assertEqual([a['value'] for a in page['data']], ['evil@evil-example.ru', 'evil.example.ru'])
+
+    def test_remove(self):
+        job_url = self.store()
+        response = self.client.post(job_url + '/remove', json=[{'data_type': 'email', 'value': 'bob@bob-example.com'}])
+        self.assertEqual(json.loads(response.data), {'removed': 1, 'remaining': 6})
+        emails = self.client.get(job_url + '/export', query_string={'format': 'csv'}).get_data(as_text=True)
+        self.assertNotIn('bob@bob-example.com', emails)
+        self.assertEqual(self.client.post(job_url + '/remove', json={'value': 'x'}).status_code, 400)
+
+    def test_remove_malformed(self):
+        """ Artifacts without String `data_type` and `value` are rejected and nothing is removed.
+        """
+        job_url = self.store()
+        for body in (
+                [{'data_type': 'email'}], [{'data_type': 'email', 'value': ['bob@bob-example.com']}],
+                [{'data_type': 1, 'value': 'bob@bob-example.com'}], [{'data_type': 'email', 'value': None}],
+                [{'data_type': 'email', 'value': 'bob@bob-example.com'}, {'value': {}}]
+        ):
+            with self.subTest(body=body):
+                response = self.client.post(job_url + '/remove', json=body)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', json.loads(response.data))
+        response = self.client.get(job_url + '/export', query_string={'format': 'csv'})
+        self.assertIn('bob@bob-example.com', response.get_data(as_text=True))
+
+    def test_export(self):
+        job_url = self.store()
+        response = self.client.get(job_url + '/export', query_string={'format': 'stix'})
+        self.assertEqual(response.headers['Content-Disposition'], 'attachment; filename="blob.stix.jsonl"')
+        patterns = [json.loads(line)['pattern'] for line in response.get_data(as_text=True).splitlines()]
+        self.assertIn("[email-addr:value = 'evil@evil-example.ru']", patterns)
+        self.assertEqual(self.client.get(job_url + '/export', query_string={'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/jobs/missing/export').status_code, 404)
+
+
+class ResultCacheApiTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = monteliblobber.app
+        self.saved = dict(self.app.config)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app.config['ROOT_DOMAINS_PATH'] = os.path.join(self.temp_dir.name, 'root_domains.txt')
+        with open(self.app.config['ROOT_DOMAINS_PATH'], 'w') as f:
+            f.write('# Root domains\nCOM\nRU\n')
+        self.app.config['USE_RESULT_CACHE'] = True
+        self.app.config['EXTRACTOR'] = extractor.Extractor(self.app.config)
+        self.app.config['ROOT_DOMAINS_MEM_DB'] = self.app.config['EXTRACTOR'].root_domains
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.blob = 'From: evil@evil-example.ru visit http://evil.example.ru/a.php and evil@evil-example.ru'
+
+    def tearDown(self):
+        self.app.config.clear()
+        self.app.config.update(self.saved)
+        self.temp_dir.cleanup()
+
+    def extract(self):
+        response = self.client.post('/', data={'blob': self.blob})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data)['data']
+
+    def test_identical_submissions(self):
+        """ An identical submission is answered from the cache, by `/` and by the batch API alike.
+        """
+        blob_extractor = self.app.config['EXTRACTOR']
+        first = self.extract()
+        with mock.patch.object(blob_extractor, 'analyze', wraps=blob_extractor.analyze) as analyze:
+            self.assertEqual(self.extract(), first)
+            response = self.client.post('/api/v1/extract', json=[self.blob, 'bob@bob-example.com'])
+            results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(results[0]['data'], first)
+        self.assertEqual(analyze.call_count, 1)
+        self.assertEqual(blob_extractor.results.hits, 2)
+
+        stats = json.loads(self.client.get('/stats').data)['result_cache']
+        self.assertEqual((stats['hits'], stats['memory']['size']), (2, 2))
+
+    def test_file(self):
+        filename = os.path.join(self.temp_dir.name, 'sample.bin')
+        with open(filename, 'wb') as f:
+            f.write(b'\x00\x01' + self.blob.encode('ascii') + b'\x00')
+        blob_extractor = self.app.config['EXTRACTOR']
+        first = blob_extractor.extract_file(filename)
+        progress = []
+        self.assertEqual(blob_extractor.extract_file(filename, progress=lambda *args: progress.append(args)), first)
+        self.assertEqual(progress, [(os.path.getsize(filename), len(first))])
+        blob_extractor.extract_file(filename, min_length=6)
+        self.assertEqual((blob_extractor.results.hits, blob_extractor.results.misses), (1, 2))
+
+    def test_purged_by_updaters(self):
+        """ Replacing a lookup file changes the version of the results; the updaters also empty the cache.
+        """
+        self.extract()
+        os.utime(self.app.config['ROOT_DOMAINS_PATH'], ns=(0, 0))
+        self.app.config['ROOT_DOMAINS_MEM_DB'].reload()
+        self.extract()
+        blob_extractor = self.app.config['EXTRACTOR']
+        self.assertEqual(blob_extractor.results.hits, 0)
+
+        with mock.patch.object(monteliblobber, 'get_root_domains') as get_root_domains:
+            self.client.post('/update_roots')
+        get_root_domains.assert_called_once()
+        self.assertEqual(len(blob_extractor.results.memory), 0)
+        self.extract()
+        self.assertEqual(blob_extractor.results.hits, 0)
+
+
+class MetricsApiTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = monteliblobber.app
+        self.saved = dict(self.app.config)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app.config['ROOT_DOMAINS_PATH'] = os.path.join(self.temp_dir.name, 'root_domains.txt')
+        with open(self.app.config['ROOT_DOMAINS_PATH'], 'w') as f:
+            f.write('# Root domains\nCOM\nRU\n')
+        self.app.config['EXTRACTOR'] = extractor.Extractor(self.app.config)
+        self.app.config['METRICS'] = self.app.config['EXTRACTOR'].metrics
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.blob = (
+            'evil@evil-example.ru evil@evil-example.ru bob@bob-example.com '
+            'http://bob-example.com/b http://bob-example.com/c'
+        )
+
+    def tearDown(self):
+        self.app.config.clear()
+        self.app.config.update(self.saved)
+        self.temp_dir.cleanup()
+
+    def test_timings(self):
+        """ The stage timings and counters are returned on request only.
+        """
+        self.assertNotIn('timings', json.loads(self.client.post('/', data={'blob': self.blob}).data))
+        response = json.loads(self.client.post('/', data={'blob': self.blob, 'timings': 'true'}).data)
+        timings = response['timings']
+        self.assertEqual(timings['input_bytes'], len(self.blob))
+        self.assertEqual((timings['matches']['email'], timings['unique_matches']['email']), (3, 2))
+        self.assertEqual(timings['dedup_ratio']['email'], 1.5)
+        self.assertEqual(timings['artifacts']['email'], 2)
+        self.assertIn('scan', timings['stages_ms'])
+        self.assertIn('analyze_dns_name', timings['stages_ms'])
+        self.assertEqual(len(response['data']), 6)
+
+    def test_metrics(self):
+        self.client.post('/', data={'blob': self.blob})
+        response = self.client.get('/metrics')
+        self.assertEqual(response.mimetype, 'text/plain')
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertIn('monteliblobber_extractions_total{source="text"} 1', lines)
+        self.assertIn('monteliblobber_matches_total{data_type="email"} 3', lines)
+        self.assertIn('monteliblobber_http_responses_total{endpoint="monteliblobber.index",status="200"} 1', lines)
+        self.assertIn('monteliblobber_cache_entries{cache="geoip"} 0', lines)
+
+    def test_profile(self):
+        """ A request is only profiled when profiling is enabled.
+        """
+        response = self.client.post('/?profile=1', data={'blob': self.blob})
+        self.assertNotIn('X-Profile', response.headers)
+        self.app.config['PROFILE_REQUESTS'] = True
+        self.app.config['PROFILE_DIR'] = self.temp_dir.name
+        response = self.client.post('/?profile=1', data={'blob': self.blob})
+        filename = response.headers['X-Profile']
+        self.assertEqual(os.path.dirname(filename), self.temp_dir.name)
+        self.assertTrue(os.path.isfile(filename))
+
+
+if __name__ == '__main__':
+    unittest.main()
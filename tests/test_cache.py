@@ -0,0 +1,54 @@
+import unittest
+from Monteliblobber import cache
+
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = cache.LRUCache(2)
+
+    def test_least_recently_used_evicted(self):
+        """ The entry that was used longest ago is dropped when the cache is full.
+        """
+        self.cache.put('a', 1)
+        self.cache.put('b', 2)
+        self.cache.get('a')
+        self.cache.put('c', 3)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('c'), 3)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_counters(self):
+        self.cache.put('a', 1)
+        self.cache.get('a')
+        self.cache.get('a')
+        self.cache.get('missing')
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (2, 1, 1))
+        self.assertAlmostEqual(stats['hit_rate'], 2 / 3)
+
+    def test_clear_keeps_counters(self):
+        self.cache.put('a', 1)
+        self.cache.get('a')
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+
+    def test_max_weight(self):
+        """ Entries are also evicted to keep their total weight under the limit, and a heavier entry isn't stored.
+        """
+        weighted = cache.LRUCache(10, max_weight=5)
+        weighted.put('a', 'xx')
+        weighted.put('b', 'xx')
+        weighted.put('c', 'xx')
+        self.assertIsNone(weighted.get('a'))
+        self.assertEqual(weighted.weight, 4)
+        weighted.put('b', 'x' * 6)
+        self.assertIsNone(weighted.get('b'))
+        self.assertEqual((len(weighted), weighted.stats()['weight']), (1, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
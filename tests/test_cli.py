@@ -0,0 +1,109 @@
+import unittest
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+from flask import json
+from Monteliblobber import cli, netindex
+
+TEST_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class ExtractCommandTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        root = self.temp_dir.name
+        self.config = os.path.join(root, 'test.cfg')
+        with open(self.config, 'w') as f:
+            f.write('BLACKLIST_DB = {!r}\n'.format(os.path.join(root, 'blacklist_db.bin')))
+            f.write('MAXMIND_CITY_DB_PATH = {!r}\n'.format(os.path.join(root, 'GeoLite2-City.mmdb')))
+            f.write('ROOT_DOMAINS_PATH = {!r}\n'.format(os.path.join(root, 'root_domains.txt')))
+            f.write('ENRICHMENT_CACHE_PATH = {!r}\n'.format(os.path.join(root, 'enrichment_cache.sqlite')))
+            f.write("WHITELISTS = {'domains': ['example.com'], 'network_addresses': []}\n")
+        netindex.write_index(netindex.compile_blacklist([]), os.path.join(root, 'blacklist_db.bin'))
+        open(os.path.join(root, 'GeoLite2-City.mmdb'), 'w').close()
+        with open(os.path.join(root, 'root_domains.txt'), 'w') as f:
+            f.write('# Root domains\nCOM\nRU\n')
+
+        self.input_dir = os.path.join(root, 'input')
+        os.makedirs(os.path.join(self.input_dir, 'nested'))
+        with open(os.path.join(self.input_dir, 'a.log'), 'w') as f:
+            f.write('login from evil@evil-example.ru and bob@bob-example.com\n')
+            f.write('via http://evil-example.ru/a.php then http://evil-example.ru/b.php\n')
+        with open(os.path.join(self.input_dir, 'nested', 'b.bin'), 'wb') as f:
+            f.write(b'\x00\x01http://www.example.com/ok\x00\xffhttps://bad-example.ru/x\x00\x00')
+        self.output = os.path.join(root, 'out')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def run_extract(self, *args):
+        status = cli.main(['extract', '-c', self.config, '-o', self.output] + list(args) + [self.input_dir])
+        self.assertEqual(status, 0)
+        with open(self.output, newline='') as f:
+            return f.read()
+
+    def test_ndjson(self):
+        """ Every artifact is written with the file it came from, and directories are walked.
+        """
+        rows = [json.loads(line) for line in self.run_extract('-w', '1').splitlines()]
+        found = {(os.path.basename(row['source']), row['data_type'], row['value']) for row in rows}
+        self.assertIn(('a.log', 'email', 'evil@evil-example.ru'), found)
+        self.assertIn(('a.log', 'url', 'http://evil-example.ru/a.php'), found)
+        self.assertIn(('b.bin', 'url', 'https://bad-example.ru/x'), found)
+        self.assertNotIn(('b.bin', 'url', 'http://www.example.com/ok'), found)
+
+    def test_workers_match_single_process(self):
+        self.assertEqual(self.run_extract('-w', '2'), self.run_extract('-w', '1'))
+
+    def test_single_path_without_pool(self):
+        """ A single file is extracted in this process, whatever the number of workers.
+        """
+        path = os.path.join(self.input_dir, 'a.log')
+        with mock.patch('concurrent.futures.ProcessPoolExecutor') as executor:
+            results = list(cli.iter_results(cli.extractor.load_config(self.config), [path], workers=4))
+        executor.assert_not_called()
+        self.assertEqual([(source, error) for source, _, error in results], [(path, None)])
+
+    def test_min_length_rejected(self):
+        for value in ('0', '-1'):
+            with self.subTest(value=value), mock.patch('sys.stderr'), self.assertRaises(SystemExit):
+                cli.main(['extract', '-c', self.config, '-n', value, self.input_dir])
+
+    def test_csv(self):
+        rows = list(csv.reader(self.run_extract('-f', 'csv', '-w', '1').splitlines()))
+        self.assertEqual(tuple(rows[0]), cli.CSV_FIELDS)
+        self.assertIn('evil@evil-example.ru', [row[1] for row in rows[1:]])
+
+    def test_missing_file_reported(self):
+        status = cli.main(['extract', '-c', self.config, '-o', self.output, '-w', '1', 'missing.log'])
+        self.assertEqual(status, 1)
+
+    def test_missing_lookup_files(self):
+        os.remove(os.path.join(self.temp_dir.name, 'root_domains.txt'))
+        self.assertEqual(cli.main(['extract', '-c', self.config, '-o', self.output, self.input_dir]), 2)
+
+    def test_stdin(self):
+        result = subprocess.run(
+            [sys.executable, '-m', 'Monteliblobber', 'extract', '-c', self.config, '-'],
+            input=b'mail evil@evil-example.ru and bob@bob-example.com', stdout=subprocess.PIPE, check=True,
+            cwd=os.path.dirname(TEST_ROOT)
+        )
+        rows = [json.loads(line) for line in result.stdout.decode().splitlines()]
+        self.assertIn(('<stdin>', 'evil@evil-example.ru'), [(row['source'], row['value']) for row in rows])
+
+    def test_no_flask_import(self):
+        """ The extractor and command line interface run without importing Flask.
+        """
+        result = subprocess.run(
+            [sys.executable, '-c', 'import sys, Monteliblobber.cli; print("flask" in sys.modules)'],
+            stdout=subprocess.PIPE, check=True, cwd=os.path.dirname(TEST_ROOT)
+        )
+        self.assertEqual(result.stdout.strip(), b'False')
+
+
+if __name__ == '__main__':
+    unittest.main()
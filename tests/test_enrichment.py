@@ -0,0 +1,134 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+from Monteliblobber import enrichment, extractor, geolocation, netindex
+
+
+class StubReader(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def city(self, address):
+        self.calls.append(address)
+
+        class Result(object):
+            class registered_country(object):
+                name = 'Spain'
+
+            class traits(object):
+                is_anonymous_proxy = False
+
+        return Result()
+
+
+class EnrichmentCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'enrichment_cache.sqlite')
+        self.cache = self.new_cache()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def new_cache(self, max_size=100, memory_size=10):
+        enrichment_cache = enrichment.EnrichmentCache(self.path, max_size, memory_size)
+        enrichment_cache.set_version('v1')
+        return enrichment_cache
+
+    def test_survives_restart(self):
+        """ Entries written by one process are found by the next one.
+        """
+        self.cache.put_many({'8.8.8.8': ['United States', 'GOOG'], '10.0.0.1': ['Private']})
+        restarted = self.new_cache()
+        self.assertEqual(restarted.get_many(['8.8.8.8', '1.1.1.1']), {'8.8.8.8': ['United States', 'GOOG']})
+        self.assertEqual((restarted.hits, restarted.misses), (1, 1))
+
+    def test_close(self):
+        """ A closed cache opens the database again on next use.
+        """
+        self.cache.put_many({'8.8.8.8': ['United States']})
+        self.cache.close()
+        self.assertIsNone(self.cache._connection)
+        self.cache.memory.clear()
+        self.assertEqual(self.cache.get_many(['8.8.8.8']), {'8.8.8.8': ['United States']})
+
+    def test_new_version_invalidates(self):
+        self.cache.put_many({'8.8.8.8': ['United States']})
+        self.cache.set_version('v2')
+        self.assertEqual(self.cache.get_many(['8.8.8.8']), {})
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_eviction(self):
+        """ The least recently used entries are evicted once the database is full.
+        """
+        enrichment_cache = self.new_cache(max_size=10)
+        for i in range(15):
+            enrichment_cache.put_many({'10.0.0.{}'.format(i): ['Private']})
+        self.assertLessEqual(enrichment_cache.stats()['size'], 10)
+        self.assertGreater(enrichment_cache.evicted, 0)
+        restarted = self.new_cache()
+        self.assertEqual(list(restarted.get_many(['10.0.0.0', '10.0.0.14'])), ['10.0.0.14'])
+
+    def test_preload(self):
+        self.cache.put_many({'10.0.0.{}'.format(i): ['Private'] for i in range(20)})
+        restarted = enrichment.EnrichmentCache(self.path, memory_size=10)
+        self.assertEqual(restarted.preload('v1'), 10)
+        self.assertEqual(len(restarted.memory), 10)
+        restarted.get_many(['10.0.0.{}'.format(i) for i in range(20)])
+        stats = restarted.stats()
+        self.assertEqual((stats['memory']['hits'], stats['hits'], stats['misses']), (10, 10, 0))
+        self.assertEqual(stats['hit_rate'], 1.0)
+        self.assertEqual(enrichment.EnrichmentCache(os.path.join(self.temp_dir.name, 'missing')).preload('v1'), 0)
+
+    def test_errors_are_misses(self):
+        broken = enrichment.EnrichmentCache(os.path.join(self.temp_dir.name, 'missing', 'cache.sqlite'))
+        broken.set_version('v1')
+        broken.put_many({'8.8.8.8': ['United States']})
+        self.assertEqual(broken.get_many(['1.1.1.1']), {})
+        self.assertEqual((broken.misses, broken.errors), (1, 3))
+
+
+class AnalyzeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        root = self.temp_dir.name
+        self.geoip_file = os.path.join(root, 'GeoLite2-City.mmdb')
+        self.blacklist_file = os.path.join(root, 'blacklist_db.bin')
+        open(self.geoip_file, 'w').close()
+        netindex.write_index(netindex.compile_blacklist([{'name': 'bad', 'value': '6.6.6.6'}]), self.blacklist_file)
+        self.named_networks = netindex.compile_networks({'GOOG': ['8.8.8.8']})
+        self.cache = enrichment.EnrichmentCache(os.path.join(root, 'enrichment_cache.sqlite'))
+        self.reader = StubReader()
+        patcher = mock.patch.object(geolocation, 'open_reader', return_value=self.reader)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def analyze(self, *addresses):
+        ips = [{'value': address, 'data_type': 'ipv4_address'} for address in addresses]
+        extractor.analyze_network_address(ips, self.geoip_file, self.blacklist_file, self.named_networks, self.cache)
+        return {i['value']: i['tags'] for i in ips}
+
+    def test_cached_addresses_not_looked_up(self):
+        """ Tags of addresses seen before come from the cache.
+        """
+        first = self.analyze('8.8.8.8', '6.6.6.6')
+        self.assertEqual(first, {'8.8.8.8': ['Spain', 'GOOG'], '6.6.6.6': ['Spain', 'bad']})
+        self.assertEqual(self.analyze('8.8.8.8', '6.6.6.6', '1.1.1.1')['1.1.1.1'], ['Spain'])
+        self.assertEqual(self.reader.calls, ['8.8.8.8', '6.6.6.6', '1.1.1.1'])
+        self.assertEqual(self.cache.memory.hits, 2)
+
+    def test_blacklist_update_invalidates(self):
+        self.analyze('6.6.6.6')
+        netindex.write_index(netindex.compile_blacklist([]), self.blacklist_file)
+        self.assertEqual(self.analyze('6.6.6.6'), {'6.6.6.6': ['Spain']})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,229 @@
+import unittest
+import hashlib
+import http.server
+import ipaddress
+import os
+import tempfile
+import threading
+from Monteliblobber import feeds, monteliblobber, netindex
+
+EXCLUDED_NETWORKS = ['127.0.0.0/8', '0.0.0.0/8', '10.0.0.0/8', 'fe80::/10']
+
+
+def ip_ranges(*values):
+    return [netindex.ip_range(value) for value in values]
+
+
+class ParseFeedTestCase(unittest.TestCase):
+
+    def test_collapse(self):
+        """ Overlapping and adjacent entries are merged, and duplicates counted as merged.
+        """
+        text = '# comment\n198.51.100.1\n198.51.100.0/25\n198.51.100.128/25\n203.0.113.9\n203.0.113.9\n203.0.113.10\n'
+        parsed, stats = feeds.parse_feed(text, EXCLUDED_NETWORKS)
+        self.assertEqual(parsed, ip_ranges('198.51.100.0/24') + [
+            (4, netindex.ipv4_to_int('203.0.113.9'), netindex.ipv4_to_int('203.0.113.10'))
+        ])
+        self.assertEqual(stats, {'entries': 6, 'invalid': 0, 'excluded': 0, 'merged': 4, 'ranges': 2})
+
+    def test_excluded_networks(self):
+        """ Entries within an excluded network are dropped and networks overlapping one are clipped.
+        """
+        text = '10.1.2.3\n10.0.0.0/8\n8.0.0.0/6\n127.0.0.1\nfe80::1\n2001:db8::/32\n'
+        parsed, stats = feeds.parse_feed(text, EXCLUDED_NETWORKS)
+        self.assertEqual(parsed, [
+            (4, netindex.ipv4_to_int('8.0.0.0'), netindex.ipv4_to_int('9.255.255.255')),
+            (4, netindex.ipv4_to_int('11.0.0.0'), netindex.ipv4_to_int('11.255.255.255')),
+        ] + ip_ranges('2001:db8::/32'))
+        self.assertEqual((stats['excluded'], stats['ranges']), (4, 3))
+
+    def test_invalid_entries(self):
+        text = '300.1.1.1\n1.2.3\n1.2.3.4/33\n5.5.5.5/x\n6.6.6.6/8/8\n2001:db8::g\n192.0.2.1\n'
+        parsed, stats = feeds.parse_feed(text)
+        self.assertEqual(parsed, ip_ranges('192.0.2.1'))
+        self.assertEqual((stats['entries'], stats['invalid']), (7, 6))
+
+    def test_ip_filter(self):
+        parsed, stats = feeds.parse_feed('192.0.2.1\n198.51.100.1\n', ip_filter=r'^192\.')
+        self.assertEqual(parsed, ip_ranges('198.51.100.1'))
+        self.assertEqual(stats['excluded'], 1)
+
+    def test_host_bits_ignored(self):
+        parsed, _ = feeds.parse_feed('198.51.100.77/24\n')
+        self.assertEqual(parsed, ip_ranges('198.51.100.0/24'))
+
+
+class FeedHandler(http.server.BaseHTTPRequestHandler):
+    """ Serves the feeds in `server.feeds` with `ETag` validation and counts full downloads. """
+
+    def do_GET(self):
+        body = self.server.feeds.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.server.downloads.append(self.path)
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FeedUpdateTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FeedHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = 'http://127.0.0.1:{}'.format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.server.downloads = []
+        self.server.feeds = {
+            '/dshield.netset': b'# comment\n198.51.100.0/24\n10.0.0.0/8\n',
+            '/tor.ipset': b'# comment\n203.0.113.9\n127.0.0.1\n2001:db8::9\nfe80::1\n',
+        }
+        self.config = {
+            'dshield': self.base_url + '/dshield.netset',
+            'tor_exit': self.base_url + '/tor.ipset',
+        }
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def update(self):
+        return feeds.update_feeds(self.config, self.temp_dir.name, EXCLUDED_NETWORKS, workers=2)[:2]
+
+    def test_parse_and_filter(self):
+        ranges, changed = self.update()
+        self.assertEqual(changed, ['dshield', 'tor_exit'])
+        self.assertEqual(ranges['dshield'], [netindex.ip_range('198.51.100.0/24')])
+        self.assertEqual(ranges['tor_exit'], [netindex.ip_range('203.0.113.9'), netindex.ip_range('2001:db8::9')])
+
+    def test_unchanged_feeds_not_downloaded(self):
+        """ A second update sends the cached validators and reuses the cached ranges on a 304.
+        """
+        first, _ = self.update()
+        self.server.downloads = []
+        second, changed = self.update()
+        self.assertEqual(changed, [])
+        self.assertEqual(self.server.downloads, [])
+        self.assertEqual(second, first)
+
+    def test_stats(self):
+        """ The counts of the last parse are kept with a cached feed.
+        """
+        first = feeds.update_feeds(self.config, self.temp_dir.name, EXCLUDED_NETWORKS, workers=2)[2]
+        self.assertEqual(first['tor_exit'], {'entries': 4, 'invalid': 0, 'excluded': 2, 'merged': 0, 'ranges': 2})
+        second = feeds.update_feeds(self.config, self.temp_dir.name, EXCLUDED_NETWORKS, workers=2)[2]
+        self.assertEqual(second, first)
+        self.assertEqual(feeds.total_stats(first)['excluded'], 3)
+
+    def test_filter_change_downloads_again(self):
+        """ Cached feeds are parsed again when the excluded networks change.
+        """
+        self.update()
+        self.server.downloads = []
+        ranges, changed, _ = feeds.update_feeds(self.config, self.temp_dir.name, ['198.51.100.0/24'], workers=2)
+        self.assertEqual(changed, ['dshield', 'tor_exit'])
+        self.assertEqual(ranges['dshield'], ip_ranges('10.0.0.0/8'))
+
+    def test_only_changed_feed_downloaded(self):
+        self.update()
+        self.server.downloads = []
+        self.server.feeds['/tor.ipset'] += b'203.0.113.20\n'
+        ranges, changed = self.update()
+        self.assertEqual(changed, ['tor_exit'])
+        self.assertEqual(self.server.downloads, ['/tor.ipset'])
+        self.assertEqual(len(ranges['tor_exit']), 3)
+
+    def test_compiled_index(self):
+        ranges, _ = self.update()
+        index = feeds.compile_feeds(ranges)
+        self.assertEqual(index.lookup(int(ipaddress.ip_address('198.51.100.7'))), ('dshield',))
+        self.assertEqual(index.lookup(int(ipaddress.ip_address('203.0.113.9'))), ('tor_exit',))
+        self.assertEqual(index.lookup(int(ipaddress.ip_address('2001:db8::9')), 6), ('tor_exit',))
+
+    def test_failed_update_not_cached(self):
+        """ When a feed fails, the feeds that changed in the same update are downloaded again by the next one, so
+        the index built from them is rebuilt.
+        """
+        self.update()
+        self.server.feeds['/tor.ipset'] += b'203.0.113.20\n'
+        self.config['missing'] = self.base_url + '/missing.ipset'
+        commits = []
+
+        def commit(*args):
+            commits.append(args)
+
+        with self.assertRaises(Exception):
+            feeds.update_feeds(self.config, self.temp_dir.name, EXCLUDED_NETWORKS, 2, commit=commit)
+        self.assertEqual(commits, [])
+        del self.config['missing']
+        self.server.downloads = []
+        ranges, changed, _ = feeds.update_feeds(self.config, self.temp_dir.name, EXCLUDED_NETWORKS, 2, commit=commit)
+        self.assertEqual(changed, ['tor_exit'])
+        self.assertEqual(commits, [(ranges, ['tor_exit'])])
+        self.assertEqual(len(ranges['tor_exit']), 3)
+
+    def test_failed_commit_not_cached(self):
+        def fail(*args):
+            raise OSError('No space left on device')
+
+        with self.assertRaises(OSError):
+            feeds.update_feeds(self.config, self.temp_dir.name, EXCLUDED_NETWORKS, 2, commit=fail)
+        self.assertEqual(self.update()[1], ['dshield', 'tor_exit'])
+
+    def test_filter_change_rebuilds_index(self):
+        """ Changing the excluded networks or the IP filter rebuilds the index from refiltered feeds, even when the
+        feeds are unchanged upstream and an update failed in between.
+        """
+        index = os.path.join(self.temp_dir.name, 'blacklist_db.bin')
+        address = int(ipaddress.ip_address('10.1.2.3'))
+        monteliblobber.get_blacklists(self.config, index, workers=2, excluded_networks=EXCLUDED_NETWORKS, ip_filter='')
+        self.assertEqual(netindex.load_blacklist(index).lookup(address), ())
+
+        self.config['missing'] = self.base_url + '/missing.ipset'
+        with self.assertRaises(Exception):
+            monteliblobber.get_blacklists(self.config, index, workers=2, excluded_networks=[], ip_filter='')
+        del self.config['missing']
+        monteliblobber.get_blacklists(self.config, index, workers=2, excluded_networks=[], ip_filter='')
+        self.assertEqual(netindex.load_blacklist(index).lookup(address), ('dshield',))
+
+        monteliblobber.get_blacklists(self.config, index, workers=2, excluded_networks=[], ip_filter=r'^10\.')
+        self.assertEqual(netindex.load_blacklist(index).lookup(address), ())
+
+    def test_empty_feed_keeps_index(self):
+        """ A feed without ranges doesn't make every update rewrite an unchanged index.
+        """
+        self.server.feeds['/empty.ipset'] = b'# comment\n10.1.2.3\n'
+        self.config['empty'] = self.base_url + '/empty.ipset'
+        index = os.path.join(self.temp_dir.name, 'blacklist_db.bin')
+        monteliblobber.get_blacklists(self.config, index, workers=2, excluded_networks=EXCLUDED_NETWORKS, ip_filter='')
+        os.utime(index, (0, 0))
+        monteliblobber.get_blacklists(self.config, index, workers=2, excluded_networks=EXCLUDED_NETWORKS, ip_filter='')
+        self.assertEqual(os.stat(index).st_mtime, 0)
+
+    def test_missing_feed(self):
+        self.config['missing'] = self.base_url + '/missing.ipset'
+        with self.assertRaises(Exception):
+            self.update()
+
+
+if __name__ == '__main__':
+    unittest.main()
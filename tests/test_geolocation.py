@@ -0,0 +1,68 @@
+import unittest
+import geoip2.errors
+from Monteliblobber import geolocation
+
+
+class StubResult(object):
+
+    class registered_country(object):
+        name = 'Spain'
+
+    class traits(object):
+        is_anonymous_proxy = True
+
+
+class StubReader(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def city(self, address):
+        self.calls.append(address)
+        if address.startswith('10.'):
+            raise geoip2.errors.AddressNotFoundError(address)
+        return StubResult()
+
+
+class StubResource(object):
+
+    def __init__(self):
+        self.reader = StubReader()
+
+    def get(self):
+        return self.reader
+
+    def reload(self):
+        self.reader = StubReader()
+
+
+class GeoIPDatabaseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.db = geolocation.GeoIPDatabase('GeoLite2-City.mmdb', cache_size=10)
+        self.db.resource = StubResource()
+        self.db.refresh()
+
+    def test_tags(self):
+        """ Known addresses get country tags, unknown ones their special purpose range.
+        """
+        self.assertEqual(self.db.lookup('87.236.220.167'), (True, ('Spain', 'Anon Proxy')))
+        self.assertEqual(self.db.lookup('10.1.1.1'), (False, ('Private',)))
+
+    def test_cached(self):
+        """ Repeated addresses are answered from the cache without touching the reader.
+        """
+        for _ in range(3):
+            self.db.lookup('87.236.220.167')
+        self.assertEqual(self.db.resource.reader.calls, ['87.236.220.167'])
+        self.assertEqual((self.db.cache.hits, self.db.cache.misses), (2, 1))
+
+    def test_reload_clears_cache(self):
+        self.db.lookup('87.236.220.167')
+        self.db.reload()
+        self.db.lookup('87.236.220.167')
+        self.assertEqual(self.db.resource.reader.calls, ['87.236.220.167'])
+
+
+if __name__ == '__main__':
+    unittest.main()
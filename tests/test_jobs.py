@@ -0,0 +1,140 @@
+import unittest
+import os
+import tempfile
+import threading
+import time
+from Monteliblobber import jobs, results
+
+
+def wait(job, timeout=5):
+    deadline = time.time() + timeout
+    while job.finished is None and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class JobQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = jobs.JobQueue(workers=2, ttl=60)
+
+    def test_results(self):
+        """ The return value of the job function becomes the job results.
+        """
+        job = self.queue.submit(lambda j, a, b: a + b, 1, 2, name='sum')
+        wait(job)
+        self.assertEqual(job.status, jobs.FINISHED)
+        self.assertEqual(job.results, 3)
+        self.assertIs(self.queue.get(job.id), job)
+
+    def test_progress(self):
+        release = threading.Event()
+
+        def work(job):
+            job.progress(10, 2)
+            release.wait(5)
+            return []
+
+        job = self.queue.submit(work, bytes_total=20)
+        deadline = time.time() + 5
+        while job.bytes_scanned == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        status = job.to_dict()
+        self.assertEqual(status['status'], jobs.RUNNING)
+        self.assertEqual((status['bytes_scanned'], status['bytes_total'], status['indicators_found']), (10, 20, 2))
+        release.set()
+        wait(job)
+
+    def test_failure_and_cleanup(self):
+        """ A failing job records its error and still runs its cleanup.
+        """
+        cleaned = []
+
+        def work(job):
+            raise ValueError('bad input')
+
+        job = self.queue.submit(work, cleanup=lambda: cleaned.append(True))
+        wait(job)
+        self.assertEqual(job.status, jobs.FAILED)
+        self.assertEqual(job.error, 'bad input')
+        self.assertEqual(cleaned, [True])
+
+    def test_add(self):
+        """ Results produced outside of the queue are kept as a finished job.
+        """
+        job = self.queue.add([1, 2], name='blob')
+        self.assertEqual((job.status, job.results, job.name), (jobs.FINISHED, [1, 2], 'blob'))
+        self.assertIs(self.queue.get(job.id), job)
+
+    def test_expiry(self):
+        """ Finished jobs are dropped once they are older than the TTL.
+        """
+        job = self.queue.submit(lambda j: None)
+        wait(job)
+        job.finished -= 120
+        self.assertIsNone(self.queue.get(job.id))
+
+
+class SpooledJobQueueTestCase(unittest.TestCase):
+    """ Queues sharing a spool directory, as the workers of the pre-forked server do.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.queue = jobs.JobQueue(workers=2, ttl=60, spool_dir=self.temp_dir.name)
+        self.other = jobs.JobQueue(workers=2, ttl=60, spool_dir=self.temp_dir.name)
+
+    def tearDown(self):
+        self.queue.shutdown()
+        self.other.shutdown()
+        self.temp_dir.cleanup()
+
+    def test_other_queue_sees_job(self):
+        release = threading.Event()
+
+        def work(job):
+            job.progress(10, 2)
+            release.wait(5)
+            return results.ResultSet([{'value': 'evil.example.ru', 'data_type': 'dns_name', 'tags': []}])
+
+        job = self.queue.submit(work, name='upload', bytes_total=20)
+        deadline = time.time() + 5
+        while self.other.get(job.id).bytes_scanned == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        status = self.other.get(job.id).to_dict()
+        self.assertEqual((status['status'], status['name'], status['bytes_scanned']), (jobs.RUNNING, 'upload', 10))
+
+        release.set()
+        wait(job)
+        spooled = self.other.get(job.id)
+        self.assertEqual(spooled.status, jobs.FINISHED)
+        self.assertEqual([a['value'] for a in spooled.results], ['evil.example.ru'])
+        self.assertIs(self.other.get(job.id), spooled)
+
+    def test_changed_results(self):
+        """ Results changed and saved by one queue are read again by the other.
+        """
+        artifacts = [
+            {'value': 'evil.example.ru', 'data_type': 'dns_name', 'tags': []},
+            {'value': 'bob-example.com', 'data_type': 'dns_name', 'tags': []}
+        ]
+        job = self.queue.add(results.ResultSet(artifacts), name='blob')
+        spooled = self.other.get(job.id)
+        self.assertEqual(len(spooled.results), 2)
+        spooled.results.remove([('dns_name', 'evil.example.ru')])
+        self.other.save(spooled)
+        self.assertEqual([a['value'] for a in self.queue.get(job.id).results], ['bob-example.com'])
+
+    def test_cleanup_when_save_fails(self):
+        """ The cleanup runs even when saving the results raises an unexpected error.
+        """
+        cleaned = threading.Event()
+        self.queue.submit(lambda job: threading.Lock(), cleanup=cleaned.set)
+        self.assertTrue(cleaned.wait(5))
+
+    def test_unknown_job(self):
+        self.assertIsNone(self.other.get('0' * 32))
+        self.assertIsNone(self.other.get('../' + os.path.basename(self.temp_dir.name)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from Monteliblobber import metrics
+
+
+class TimingsTestCase(unittest.TestCase):
+
+    def test_to_dict(self):
+        timings = metrics.Timings()
+        timings.add_stage('scan', 0.5)
+        timings.add_stage('scan', 0.25)
+        timings.add_lookups('geoip', 4, 0.002)
+        timings.matches['email'] += 6
+        timings.unique['email'] += 3
+        timings.unique['url'] += 0
+        timings.cache_hits['geoip'] += 1
+        result = timings.to_dict()
+        self.assertEqual(result['stages_ms'], {'scan': 750.0})
+        self.assertEqual(result['total_ms'], 750.0)
+        self.assertEqual(result['dedup_ratio'], {'email': 2.0})
+        self.assertEqual(result['lookups'], {'geoip': {'count': 4, 'ms': 2.0}})
+        self.assertEqual(result['cache_hits'], {'geoip': 1})
+
+    def test_stage(self):
+        timings = metrics.Timings()
+        with self.assertRaises(ValueError):
+            with timings.stage('analyze'):
+                raise ValueError()
+        self.assertIn('analyze', timings.stages)
+
+
+class RegistryTestCase(unittest.TestCase):
+
+    def test_render(self):
+        """ Counters, histograms and gauges are rendered in the Prometheus text format.
+        """
+        registry = metrics.Registry(buckets=(0.1, 1.0))
+        timings = metrics.Timings()
+        timings.input_bytes = 100
+        timings.add_stage('scan', 0.5)
+        timings.artifacts['url'] += 2
+        registry.record(timings, 'text')
+        registry.record(timings, 'text')
+        registry.inc('monteliblobber_http_responses_total', endpoint='index', status=200)
+        text = registry.render([('monteliblobber_cache_entries', {'cache': 'geoip'}, 7)])
+        lines = text.splitlines()
+        self.assertIn('# TYPE monteliblobber_stage_seconds histogram', lines)
+        self.assertIn('monteliblobber_extractions_total{source="text"} 2', lines)
+        self.assertIn('monteliblobber_input_bytes_total{source="text"} 200', lines)
+        self.assertIn('monteliblobber_artifacts_total{data_type="url"} 4', lines)
+        self.assertIn('monteliblobber_http_responses_total{endpoint="index",status="200"} 1', lines)
+        self.assertIn('monteliblobber_cache_entries{cache="geoip"} 7', lines)
+        buckets = [line for line in lines if line.startswith('monteliblobber_stage_seconds_bucket')]
+        self.assertEqual(buckets, [
+            'monteliblobber_stage_seconds_bucket{stage="scan",le="0.1"} 0',
+            'monteliblobber_stage_seconds_bucket{stage="scan",le="1.0"} 2',
+            'monteliblobber_stage_seconds_bucket{stage="scan",le="+Inf"} 2',
+        ])
+        self.assertIn('monteliblobber_stage_seconds_count{stage="scan"} 2', lines)
+
+    def test_label_escaping(self):
+        registry = metrics.Registry()
+        registry.inc('custom_total', endpoint='a"b\\c')
+        self.assertIn('custom_total{endpoint="a\\"b\\\\c"} 1', registry.render())
+
+    def test_merge(self):
+        timings = metrics.Timings()
+        timings.add_stage('scan', 0.5)
+        registry = metrics.Registry(buckets=(0.1, 1.0))
+        registry.record(timings, 'text')
+        merged = metrics.Registry(buckets=(0.1, 1.0))
+        merged.merge(registry.snapshot())
+        merged.merge(registry.snapshot())
+        lines = merged.render().splitlines()
+        self.assertIn('monteliblobber_extractions_total{source="text"} 2', lines)
+        self.assertIn('monteliblobber_stage_seconds_bucket{stage="scan",le="1.0"} 2', lines)
+        self.assertIn('monteliblobber_stage_seconds_sum{stage="scan"} 1.0', lines)
+
+
+class SharedMetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_render_shared(self):
+        """ Counters are summed over every snapshot; gauges are only kept for running processes, with a pid label.
+        """
+        registry = metrics.Registry()
+        registry.inc('monteliblobber_http_responses_total', endpoint='index', status=200)
+        metrics.write_snapshot(registry, self.temp_dir.name, [('monteliblobber_cache_entries', {'cache': 'geoip'}, 3)])
+        # A snapshot left by a process that exited.
+        exited = subprocess.Popen([sys.executable, '-c', ''])
+        exited.wait()
+        with open(os.path.join(self.temp_dir.name, 'metrics_{}.json'.format(exited.pid)), 'w') as f:
+            snapshot = registry.snapshot()
+            snapshot['gauges'] = [['monteliblobber_cache_entries', {'cache': 'geoip'}, 5]]
+            json.dump(snapshot, f)
+
+        lines = metrics.render_shared(self.temp_dir.name).splitlines()
+        self.assertIn('monteliblobber_http_responses_total{endpoint="index",status="200"} 2', lines)
+        gauges = [line for line in lines if line.startswith('monteliblobber_cache_entries')]
+        self.assertEqual(gauges, ['monteliblobber_cache_entries{cache="geoip",pid="%d"} 3' % os.getpid()])
+
+
+if __name__ == '__main__':
+    unittest.main()
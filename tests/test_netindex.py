@@ -0,0 +1,212 @@
+import unittest
+import ipaddress
+import json
+import os
+import tempfile
+from Monteliblobber import extractor, netindex
+
+
+def ip(value):
+    return int(ipaddress.ip_address(value))
+
+
+class NetworkIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.blacklist = [
+            {'name': 'dshield', 'type': 'ip_network', 'value': '10.0.0.0/24'},
+            {'name': 'alienvault', 'type': 'ip_address', 'value': '10.0.0.5'},
+            {'name': 'tor_exit', 'type': 'ip_network', 'value': '10.0.0.0/30'},
+            {'name': 'alienvault', 'type': 'ip_address', 'value': '10.0.1.0'},
+            {'name': 'alienvault', 'type': 'ip_address', 'value': '10.0.1.1'},
+        ]
+        self.index = netindex.compile_blacklist(self.blacklist)
+
+    def test_all_matching_names_returned(self):
+        """ Every list containing an address is returned, in feed order.
+        """
+        self.assertEqual(self.index.lookup(ip('10.0.0.5')), ('dshield', 'alienvault'))
+        self.assertEqual(self.index.lookup(ip('10.0.0.2')), ('dshield', 'tor_exit'))
+        self.assertEqual(self.index.lookup(ip('10.0.0.200')), ('dshield',))
+
+    def test_range_boundaries(self):
+        """ Range bounds are inclusive and addresses outside every range match nothing.
+        """
+        self.assertEqual(self.index.lookup(ip('10.0.0.0')), ('dshield', 'tor_exit'))
+        self.assertEqual(self.index.lookup(ip('10.0.0.255')), ('dshield',))
+        self.assertEqual(self.index.lookup(ip('9.255.255.255')), ())
+        self.assertEqual(self.index.lookup(ip('10.0.1.2')), ())
+
+    def test_adjacent_ranges_merged(self):
+        """ Neighbouring ranges with the same labels collapse into one segment.
+        """
+        self.assertEqual(self.index.lookup(ip('10.0.1.1')), ('alienvault',))
+        self.assertEqual(len(self.index), 5)
+
+    def test_matches_linear_scan(self):
+        """ The index agrees with a containment check against every entry.
+        """
+        networks = [(i['name'], ipaddress.ip_network(i['value'])) for i in self.blacklist]
+        for value in ['10.0.0.1', '10.0.0.3', '10.0.0.4', '10.0.0.5', '10.0.1.0', '10.0.1.1', '11.0.0.0']:
+            with self.subTest(value):
+                address = ipaddress.ip_address(value)
+                expected = []
+                for name, net in networks:
+                    if address in net and name not in expected:
+                        expected.append(name)
+                self.assertEqual(sorted(self.index.lookup(int(address))), sorted(expected))
+
+    def test_ipv4_range(self):
+        self.assertEqual(netindex.ipv4_range('192.168.1.7'), (ip('192.168.1.7'), ip('192.168.1.7')))
+        self.assertEqual(netindex.ipv4_range('192.168.1.7/24'), (ip('192.168.1.0'), ip('192.168.1.255')))
+        self.assertEqual(netindex.ipv4_range('0.0.0.0/0'), (0, 2 ** 32 - 1))
+
+    def test_ip_range(self):
+        self.assertEqual(netindex.ip_range('192.168.1.7/24'), (4, ip('192.168.1.0'), ip('192.168.1.255')))
+        self.assertEqual(
+            netindex.ip_range('2001:db8::1/32'), (6, ip('2001:db8::'), ip('2001:db8:ffff:ffff:ffff:ffff:ffff:ffff'))
+        )
+        self.assertEqual(netindex.ip_range('::1'), (6, 1, 1))
+
+
+class AddressTestCase(unittest.TestCase):
+
+    def test_parse_address(self):
+        """ IPv4-mapped IPv6 addresses parse as the IPv4 address they map.
+        """
+        self.assertEqual(netindex.parse_address('198.51.100.7'), (4, ip('198.51.100.7')))
+        self.assertEqual(netindex.parse_address('::ffff:198.51.100.7'), (4, ip('198.51.100.7')))
+        self.assertEqual(netindex.parse_address('2001:DB8::1'), (6, ip('2001:db8::1')))
+        self.assertEqual(netindex.format_address(6, ip('2001:db8::1')), '2001:db8::1')
+        self.assertEqual(netindex.format_address(4, ip('198.51.100.7')), '198.51.100.7')
+
+    def test_normalize_ipv6(self):
+        self.assertEqual(netindex.normalize_ipv6('2001:DB8:0:0:0:0:0:1'), '2001:db8::1')
+        self.assertEqual(netindex.normalize_ipv6('::FFFF:c633:6407'), '::ffff:198.51.100.7')
+        for candidate in ['12:30:45', '00:1a:2b:3c:4d:5e', '1::2::3', '2001:db8::12345']:
+            with self.subTest(candidate):
+                self.assertIsNone(netindex.normalize_ipv6(candidate))
+
+
+class CompileNetworksTestCase(unittest.TestCase):
+
+    def test_named_networks(self):
+        """ Nested and overlapping named networks all match, in config order.
+        """
+        index = netindex.compile_networks({
+            'CORP': ['172.16.0.0/12'],
+            'PARTNER': [ipaddress.ip_network('172.16.4.0/24'), '8.8.8.8'],
+            'V6': ['2001:db8::/32']
+        })
+        self.assertEqual(index.lookup(ip('172.16.4.1')), ('CORP', 'PARTNER'))
+        self.assertEqual(index.lookup(ip('172.31.255.255')), ('CORP',))
+        self.assertEqual(index.lookup(ip('8.8.8.8')), ('PARTNER',))
+        self.assertEqual(index.lookup(ip('8.8.4.4')), ())
+
+    def test_ipv6_networks(self):
+        """ Each address family is looked up in its own index.
+        """
+        index = netindex.compile_networks({'DOC': ['2001:db8::/32', '192.0.2.0/24'], 'HOST': ['2001:db8::1']})
+        self.assertEqual(index.lookup(ip('2001:db8::1'), 6), ('DOC', 'HOST'))
+        self.assertEqual(index.lookup(ip('2001:db8::2'), 6), ('DOC',))
+        self.assertEqual(index.lookup(ip('2001:db9::1'), 6), ())
+        self.assertEqual(index.lookup(ip('192.0.2.1')), ('DOC',))
+        self.assertEqual(index.lookup(ip('::c000:201'), 6), ())
+        self.assertEqual(netindex.compile_networks({'V4': ['192.0.2.0/24']}).lookup(1, 6), ())
+
+    def test_digest(self):
+        networks = {'DOC': ['2001:db8::/32', '192.0.2.0/24']}
+        digest = netindex.compile_networks(networks).digest()
+        self.assertEqual(netindex.compile_networks(dict(networks)).digest(), digest)
+        self.assertNotEqual(netindex.compile_networks({'TEST': networks['DOC']}).digest(), digest)
+        self.assertNotEqual(netindex.compile_networks({'DOC': ['2001:db8::/48', '192.0.2.0/24']}).digest(), digest)
+
+    def test_compiled_index_returned_as_is(self):
+        index = netindex.compile_networks({'whitelist': ['127.0.0.1']})
+        self.assertIs(netindex.compile_networks(index), index)
+
+    def test_named_network_lookup(self):
+        """ The lookup answers the same from the networks and from their compiled index.
+        """
+        named_networks = {
+            'CORP': [ipaddress.ip_network('172.16.0.0/12')],
+            'PARTNER': [ipaddress.ip_network('172.16.4.0/24')],
+            'V6': [ipaddress.ip_network('2001:db8::/32')]
+        }
+        index = netindex.compile_networks(named_networks)
+        for address, name in (('172.16.4.1', 'CORP'), ('2001:db8::1', 'V6'), ('8.8.8.8', None)):
+            address = ipaddress.ip_address(address)
+            with self.subTest(address=address):
+                self.assertEqual(extractor.named_network_lookup(address, named_networks), name)
+                self.assertEqual(extractor.named_network_lookup(address, index), name)
+
+
+class IndexFileTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, 'blacklist_db.bin')
+        self.blacklist = [
+            {'name': 'dshield', 'type': 'ip_network', 'value': '198.51.100.0/24'},
+            {'name': 'bambenek_c2', 'type': 'ip_address', 'value': '198.51.100.10'},
+            {'name': 'tor_exit', 'type': 'ip_address', 'value': '203.0.113.9'},
+            {'name': 'dshield', 'type': 'ip_network', 'value': '2001:db8:1::/48'},
+            {'name': 'tor_exit', 'type': 'ip_address', 'value': '2001:db8:1::9'},
+        ]
+        self.index = netindex.compile_blacklist(self.blacklist)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_round_trip(self):
+        """ A memory-mapped index answers lookups the same as the in memory index.
+        """
+        netindex.write_index(self.index, self.filename)
+        mapped = netindex.load_blacklist(self.filename)
+        self.assertEqual(len(mapped), len(self.index))
+        for value in ['198.51.100.0', '198.51.100.10', '198.51.100.255', '203.0.113.9', '203.0.113.10', '1.1.1.1']:
+            with self.subTest(value):
+                self.assertEqual(mapped.lookup(ip(value)), self.index.lookup(ip(value)))
+        self.assertEqual(len(mapped.ipv6), len(self.index.ipv6))
+        for value in ['2001:db8:1::', '2001:db8:1::9', '2001:db8:1:ffff:ffff:ffff:ffff:ffff', '2001:db8:2::', '::']:
+            with self.subTest(value):
+                self.assertEqual(mapped.lookup(ip(value), 6), self.index.lookup(ip(value), 6))
+        self.assertEqual(mapped.lookup(ip('2001:db8:1::9'), 6), ('dshield', 'tor_exit'))
+
+    def test_version_1_file(self):
+        """ Index files written before IPv6 support, without the IPv6 sections, still open.
+        """
+        ipv4_only = netindex.compile_blacklist(self.blacklist[:3])
+        netindex.write_index(ipv4_only, self.filename)
+        with open(self.filename, 'rb') as f:
+            data = f.read()
+        header = netindex._HEADER.unpack_from(data, 0)
+        with open(self.filename, 'wb') as f:
+            f.write(netindex._HEADER_V1.pack(netindex.MAGIC, 1, 0, *header[3:6]) + data[netindex._HEADER.size:])
+        mapped = netindex.open_index(self.filename)
+        self.assertEqual(mapped.lookup(ip('198.51.100.10')), ('dshield', 'bambenek_c2'))
+        self.assertEqual(mapped.lookup(ip('2001:db8:1::9'), 6), ())
+
+    def test_empty_index(self):
+        netindex.write_index(netindex.compile_blacklist([]), self.filename)
+        self.assertEqual(netindex.load_blacklist(self.filename).lookup(ip('1.1.1.1')), ())
+
+    def test_json_import(self):
+        """ Blacklist JSON files from older versions still load and can be converted.
+        """
+        json_filename = os.path.join(self.temp_dir.name, 'blacklist_db.json')
+        with open(json_filename, 'w') as f:
+            json.dump(self.blacklist, f)
+        self.assertEqual(netindex.load_blacklist(json_filename).lookup(ip('198.51.100.10')), ('dshield', 'bambenek_c2'))
+        netindex.import_json_blacklist(json_filename, self.filename)
+        self.assertEqual(netindex.open_index(self.filename).lookup(ip('203.0.113.9')), ('tor_exit',))
+
+    def test_rejects_other_files(self):
+        with open(self.filename, 'wb') as f:
+            f.write(b'MTBX' + bytes(32))
+        with self.assertRaises(ValueError):
+            netindex.open_index(self.filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
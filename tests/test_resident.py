@@ -0,0 +1,73 @@
+import unittest
+import os
+import tempfile
+from Monteliblobber import resident
+
+
+class FileResourceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'data.txt')
+        with open(self.path, 'w') as f:
+            f.write('first')
+        self.loads = []
+        self.resource = resident.FileResource(self.path, self.loader)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def loader(self, path):
+        with open(path) as f:
+            value = f.read()
+        self.loads.append(value)
+        return value
+
+    def test_loaded_once(self):
+        """ The file is only parsed on first use while it is unchanged.
+        """
+        for _ in range(3):
+            self.assertEqual(self.resource.get(), 'first')
+        self.assertEqual(self.loads, ['first'])
+
+    def test_rebuilt_when_file_changes(self):
+        """ A rewritten file is picked up on the next access.
+        """
+        self.resource.get()
+        with open(self.path, 'w') as f:
+            f.write('second!')
+        self.assertEqual(self.resource.get(), 'second!')
+        self.assertEqual(self.loads, ['first', 'second!'])
+
+    def test_reload(self):
+        """ `reload` rebuilds the object even when the file looks unchanged.
+        """
+        self.resource.get()
+        self.resource.reload()
+        self.assertEqual(self.loads, ['first', 'first'])
+
+    def test_stamp(self):
+        """ The stamp is that of the loaded object until a changed file is loaded.
+        """
+        stamp = self.resource.stamp()
+        self.resource.get()
+        self.assertEqual(self.resource.stamp(), stamp)
+        with open(self.path, 'w') as f:
+            f.write('second!')
+        self.assertEqual(self.resource.stamp(), stamp)
+        self.resource.get()
+        self.assertNotEqual(self.resource.stamp(), stamp)
+
+    def test_preload_missing_file(self):
+        missing = resident.FileResource(os.path.join(self.temp_dir.name, 'missing'), self.loader)
+        self.assertFalse(missing.preload())
+        self.assertTrue(self.resource.preload())
+
+    def test_registry_shared(self):
+        """ The same file and loader always map to the same resource.
+        """
+        self.assertIs(resident.get_resource(self.path, self.loader), resident.get_resource(self.path, self.loader))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import os
+import tempfile
+from Monteliblobber import resultcache
+
+ARTIFACTS = [{'data_type': 'email', 'value': 'evil@evil-example.ru', 'tags': [], 'count': 2, 'first_seen': 0}]
+
+
+class ResultCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'result_cache.sqlite')
+        self.key = resultcache.content_key('text', b'evil@evil-example.ru evil@evil-example.ru')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_keys(self):
+        """ Keys depend on the content and the options of the extraction, not on how the content was read.
+        """
+        filename = os.path.join(self.temp_dir.name, 'sample.bin')
+        with open(filename, 'wb') as f:
+            f.write(b'\x00sample\x00')
+        self.assertEqual(
+            resultcache.file_key('file', filename, 4, 0), resultcache.content_key('file', b'\x00sample\x00', 4, 0)
+        )
+        self.assertNotEqual(resultcache.file_key('file', filename, 4, 1), resultcache.file_key('file', filename, 4, 0))
+        self.assertNotEqual(resultcache.content_key('text', b'a'), resultcache.content_key('text', b'b'))
+
+    def test_hit_returns_copy(self):
+        result_cache = resultcache.ResultCache()
+        self.assertIsNone(result_cache.get(self.key, 'v1'))
+        result_cache.put(self.key, 'v1', ARTIFACTS)
+        artifacts = result_cache.get(self.key, 'v1')
+        self.assertEqual(artifacts, ARTIFACTS)
+        artifacts[0]['tags'].append('changed')
+        self.assertEqual(result_cache.get(self.key, 'v1'), ARTIFACTS)
+        self.assertEqual((result_cache.hits, result_cache.misses), (2, 1))
+
+    def test_new_version_invalidates(self):
+        result_cache = resultcache.ResultCache(filename=self.path)
+        result_cache.get(self.key, 'v1')
+        result_cache.put(self.key, 'v1', ARTIFACTS)
+        self.assertIsNone(result_cache.get(self.key, 'v2'))
+        self.assertEqual(result_cache.stats()['size'], 0)
+        result_cache.put(self.key, 'v1', ARTIFACTS)
+        self.assertIsNone(result_cache.get(self.key, 'v2'))
+
+    def test_spill_survives_restart(self):
+        result_cache = resultcache.ResultCache(filename=self.path)
+        result_cache.set_version('v1')
+        result_cache.put(self.key, 'v1', ARTIFACTS)
+        restarted = resultcache.ResultCache(filename=self.path)
+        self.assertEqual(restarted.get(self.key, 'v1'), ARTIFACTS)
+        self.assertEqual(len(restarted.memory), 1)
+        self.assertIsNone(resultcache.ResultCache().get(self.key, 'v1'))
+
+    def test_disk_eviction(self):
+        """ The least recently used results are evicted once the database is full.
+        """
+        result_cache = resultcache.ResultCache(filename=self.path, disk_size=400)
+        result_cache.set_version('v1')
+        keys = [resultcache.content_key('text', str(i).encode('ascii')) for i in range(10)]
+        for i, key in enumerate(keys):
+            result_cache.put(key, 'v1', [dict(ARTIFACTS[0], count=i)])
+        stats = result_cache.stats()
+        self.assertLessEqual(stats['bytes'], 400)
+        self.assertGreater(stats['evicted'], 0)
+        restarted = resultcache.ResultCache(filename=self.path)
+        self.assertIsNone(restarted.get(keys[0], 'v1'))
+        self.assertEqual(restarted.get(keys[-1], 'v1')[0]['count'], 9)
+
+    def test_clear(self):
+        result_cache = resultcache.ResultCache(filename=self.path)
+        result_cache.set_version('v1')
+        result_cache.put(self.key, 'v1', ARTIFACTS)
+        result_cache.clear()
+        self.assertIsNone(result_cache.get(self.key, 'v1'))
+        self.assertEqual(result_cache.stats()['size'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
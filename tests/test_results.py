@@ -0,0 +1,100 @@
+import unittest
+import csv
+import io
+import json
+import pickle
+from Monteliblobber import results
+
+ARTIFACTS = [
+    {'value': 'b.example.ru', 'data_type': 'dns_name', 'tags': []},
+    {'value': '8.8.8.8', 'data_type': 'ipv4_address', 'tags': ['United States', 'GOOG'], 'count': 3, 'first_seen': 12},
+    {'value': 'a@example.com', 'data_type': 'email', 'tags': [], 'count': 12, 'first_seen': 0},
+    {'value': '10.1.1.1', 'data_type': 'ipv4_address', 'tags': ['Private', None]},
+]
+
+
+class ExportTestCase(unittest.TestCase):
+
+    def test_json_document(self):
+        self.assertEqual(json.loads(''.join(results.iter_json_document(ARTIFACTS))), {'data': ARTIFACTS})
+        self.assertEqual(json.loads(''.join(results.iter_json_document([]))), {'data': []})
+
+    def test_ndjson(self):
+        lines = list(results.iter_ndjson(ARTIFACTS))
+        self.assertEqual([json.loads(line) for line in lines], ARTIFACTS)
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(''.join(results.iter_csv(ARTIFACTS)))))
+        self.assertEqual(tuple(rows[0]), results.COLUMNS)
+        self.assertEqual(rows[2], ['8.8.8.8', 'ipv4_address', 'United States, GOOG', '3', '12'])
+        self.assertEqual(rows[4], ['10.1.1.1', 'ipv4_address', 'Private', '', ''])
+
+    def test_stix(self):
+        """ Indicators have deterministic ids and escaped patterns.
+        """
+        artifact = {'value': "http://evil.ru/it's", 'data_type': 'url', 'tags': ['x']}
+        first = results.stix_indicator(artifact, '2016-09-08T00:00:00.000000Z')
+        second = results.stix_indicator(dict(artifact), '2017-01-01T00:00:00.000000Z')
+        self.assertEqual(first['id'], second['id'])
+        self.assertEqual(first['pattern'], "[url:value = 'http://evil.ru/it\\'s']")
+        self.assertEqual(first['labels'], ['x'])
+        self.assertEqual(len(list(results.iter_stix(ARTIFACTS))), 4)
+
+
+class ResultSetTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.result_set = results.ResultSet(ARTIFACTS)
+
+    def values(self, page):
+        return [artifact['value'] for artifact in page]
+
+    def test_page(self):
+        self.assertEqual(self.result_set.page(1, 2), (4, ARTIFACTS[1:3]))
+        self.assertEqual(self.result_set.page(0, -1), (4, ARTIFACTS))
+        self.assertEqual(self.result_set.page(10, 5), (4, []))
+
+    def test_sort_and_search(self):
+        total, page = self.result_set.page(0, 10, column='value', descending=True)
+        self.assertEqual(self.values(page), ['b.example.ru', 'a@example.com', '8.8.8.8', '10.1.1.1'])
+        total, page = self.result_set.page(0, 10, search=' goog', column='value')
+        self.assertEqual((total, self.values(page)), (1, ['8.8.8.8']))
+        total, page = self.result_set.page(0, 1, search='ipv4', column='tags')
+        self.assertEqual((total, self.values(page)), (2, ['10.1.1.1']))
+        total, page = self.result_set.page(0, 10, column='unknown')
+        self.assertEqual(page, ARTIFACTS)
+
+    def test_sort_by_count(self):
+        """ Counts sort numerically, after the artifacts without one.
+        """
+        total, page = self.result_set.page(0, 10, column='count', descending=True)
+        self.assertEqual(self.values(page)[:2], ['a@example.com', '8.8.8.8'])
+        total, page = self.result_set.page(0, 10, column='first_seen')
+        self.assertEqual(self.values(page)[2:], ['a@example.com', '8.8.8.8'])
+
+    def test_views_cached(self):
+        """ Paging through one view sorts and filters the artifacts once.
+        """
+        for start in range(4):
+            self.result_set.page(start, 1, search='example', column='data_type')
+        self.assertEqual((self.result_set.views.hits, self.result_set.views.misses), (3, 1))
+
+    def test_remove(self):
+        self.result_set.page(0, 10, column='value')
+        self.assertEqual(self.result_set.remove([('email', 'a@example.com'), ('email', 'missing')]), 1)
+        self.assertEqual(len(self.result_set), 3)
+        total, page = self.result_set.page(0, 10, column='value')
+        self.assertEqual(self.values(page), ['10.1.1.1', '8.8.8.8', 'b.example.ru'])
+
+    def test_pickle(self):
+        """ Only the artifacts are pickled; the copy starts with an empty view cache.
+        """
+        self.result_set.page(0, 10, column='value')
+        copy = pickle.loads(pickle.dumps(self.result_set))
+        self.assertEqual(copy.artifacts, ARTIFACTS)
+        self.assertEqual((len(copy.views), copy.views.max_size), (0, 8))
+        self.assertEqual(copy.page(0, 1, column='value'), self.result_set.page(0, 1, column='value'))
+
+
+if __name__ == '__main__':
+    unittest.main()
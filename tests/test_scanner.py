@@ -0,0 +1,176 @@
+import unittest
+import collections
+import concurrent.futures
+import os
+import random
+from Monteliblobber import scanner
+
+TEST_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+with open(os.path.join(TEST_ROOT, 'email_message_source.txt'), 'r') as f:
+    TEST_BLOB = f.read()
+
+
+def full_scan(text_blob):
+    """ The reference behaviour: one `findall` per pattern over the whole blob. """
+    return {data_type: pattern.findall(text_blob) for data_type, pattern in scanner.PATTERNS.items()}
+
+
+def synthetic_blob(lines, seed=1):
+    rnd = random.Random(seed)
+    words = [
+        'x', 'GET', 'HTTP/1.1', 'a.b', 'admin@corp.example.com', '<jantje@jantje.com>;', 'user.name@mail-srv.co.uk',
+        'http://evil.example.ru/a/b.php?x=1', '(ftp://files.example.org/pub)', 'xhttp://nope.example.com',
+        'mx:host-01.mail.example.net', '[10.0.0.1]:22', '999.1.1.1', '1.2.3.4.5', 'café.example.com',
+        'file:///etc/passwd', 'www.example.com/path/to/?a=b&c', ' 192.168.1.1 ', 'host_name.test.io',
+    ]
+    return '\n'.join(' '.join(rnd.choice(words) for _ in range(12)) for _ in range(lines))
+
+
+class ScannerTestCase(unittest.TestCase):
+
+    def assertSameMatches(self, text_blob, **kwargs):
+        expected = full_scan(text_blob)
+        result = {data_type: [] for data_type in scanner.DATA_TYPES}
+        for segment in scanner.iter_segments(text_blob, **kwargs):
+            for data_type, found in scanner.scan_segment(segment).items():
+                result[data_type].extend(found)
+        for data_type in scanner.DATA_TYPES:
+            with self.subTest(data_type):
+                self.assertEqual(sorted(result[data_type]), sorted(expected[data_type]))
+
+    def test_email_fixture(self):
+        """ The single pass scanner finds exactly what the individual patterns find.
+        """
+        self.assertSameMatches(TEST_BLOB)
+
+    def test_synthetic_blob(self):
+        self.assertSameMatches(synthetic_blob(500))
+
+    def test_small_segments(self):
+        """ Segment boundaries never split a token.
+        """
+        self.assertSameMatches(synthetic_blob(200, seed=2), segment_size=7)
+
+    def test_segments_cover_text(self):
+        text_blob = synthetic_blob(50, seed=3)
+        self.assertEqual(''.join(scanner.iter_segments(text_blob, segment_size=13)), text_blob)
+
+    def test_ipv6_candidates(self):
+        """ IPv6 addresses are found in brackets, before ports and punctuation, and in IPv4-mapped form.
+        """
+        result = scanner.scan('[2001:db8::1]:443 fe80::1%eth0 ::ffff:198.51.100.7, 2001:db8:0:0:0:0:0:2.', [
+            scanner.IPV6_ADDRESS
+        ])
+        self.assertEqual(
+            result[scanner.IPV6_ADDRESS], ['2001:db8::1', 'fe80::1', '::ffff:198.51.100.7', '2001:db8:0:0:0:0:0:2']
+        )
+
+    def test_ipv4_mapped_reported_once(self):
+        """ The dotted quad of an IPv4-mapped IPv6 address isn't reported again as an IPv4 address.
+        """
+        result = scanner.scan('::ffff:198.51.100.7 ::FFFF:198.51.100.8 0:0:0:0:0:ffff:198.51.100.9 host:198.51.100.10')
+        self.assertEqual(result[scanner.IPV4_ADDRESS], ['198.51.100.10'])
+        self.assertEqual(
+            result[scanner.IPV6_ADDRESS], ['::ffff:198.51.100.7', '::FFFF:198.51.100.8', '0:0:0:0:0:ffff:198.51.100.9']
+        )
+
+    def test_requested_types_only(self):
+        result = scanner.scan('8.8.8.8 jantje@jantje.com', [scanner.IPV4_ADDRESS])
+        self.assertEqual(result, {scanner.IPV4_ADDRESS: ['8.8.8.8']})
+
+
+class IncrementalScannerTestCase(unittest.TestCase):
+
+    def test_pieces_match_whole_blob(self):
+        """ Feeding text in arbitrary pieces gives the de-duplicated matches of the whole blob.
+        """
+        text_blob = synthetic_blob(300, seed=4)
+        expected = full_scan(text_blob)
+        incremental = scanner.Scanner(segment_size=50)
+        pos = 0
+        rnd = random.Random(5)
+        while pos < len(text_blob):
+            size = rnd.randrange(1, 40)
+            incremental.feed(text_blob[pos:pos + size])
+            pos += size
+        result = incremental.close()
+        for data_type in scanner.DATA_TYPES:
+            with self.subTest(data_type):
+                self.assertEqual(result[data_type], list(dict.fromkeys(expected[data_type])))
+                self.assertEqual(incremental.occurrences[data_type], collections.Counter(expected[data_type]))
+        self.assertEqual(incremental.characters, len(text_blob))
+
+    def test_first_seen(self):
+        """ The offset of the first match of every indicator is kept, across pieces and segments.
+        """
+        text_blob = synthetic_blob(300, seed=7)
+        incremental = scanner.Scanner(segment_size=64)
+        for pos in range(0, len(text_blob), 25):
+            incremental.feed(text_blob[pos:pos + 25])
+        incremental.close()
+        for data_type, pattern in scanner.PATTERNS.items():
+            with self.subTest(data_type):
+                first = {}
+                for match in pattern.finditer(text_blob):
+                    first.setdefault(match.group(), match.start())
+                self.assertEqual(incremental.first_seen[data_type], first)
+
+    def test_counts(self):
+        incremental = scanner.Scanner()
+        incremental.feed('8.8.8.8 x 1.1.1.1 8.8.8.8\n8.8.8.8')
+        self.assertEqual(incremental.close()[scanner.IPV4_ADDRESS], ['8.8.8.8', '1.1.1.1'])
+        self.assertEqual(incremental.first_seen[scanner.IPV4_ADDRESS], {'8.8.8.8': 0, '1.1.1.1': 10})
+        self.assertEqual(incremental.count(scanner.IPV4_ADDRESS), 4)
+        self.assertEqual(incremental.occurrences[scanner.IPV4_ADDRESS]['8.8.8.8'], 3)
+
+    def test_first_seen_inside_longer_match(self):
+        """ A value that also appears inside an earlier, longer match is placed at its own match.
+        """
+        for text_blob, data_type, value, offset in (
+                ('11.2.3.45 1.2.3.4', scanner.IPV4_ADDRESS, '1.2.3.4', 10),
+                ('xabc.com abc.com', scanner.DNS_NAME, 'abc.com', 9),
+        ):
+            with self.subTest(text_blob):
+                incremental = scanner.Scanner()
+                incremental.feed(text_blob)
+                incremental.close()
+                self.assertEqual(incremental.first_seen[data_type][value], offset)
+                self.assertEqual(scanner.scan_unique(text_blob)[0][data_type][value], offset)
+
+    def test_bounded_buffer(self):
+        """ Tokens longer than `max_token` don't accumulate in the buffer.
+        """
+        incremental = scanner.Scanner(segment_size=10, max_token=20)
+        for _ in range(100):
+            incremental.feed('a' * 10)
+        self.assertLessEqual(incremental._pending_size, 20)
+
+
+class ParallelScannerTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.executor = concurrent.futures.ProcessPoolExecutor(max_workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+
+    def test_matches_serial_scanner(self):
+        """ Splitting the work across processes gives the same merged matches as a serial scan.
+        """
+        text_blob = synthetic_blob(2000, seed=6)
+        serial = scanner.Scanner()
+        serial.feed(text_blob)
+        parallel = scanner.ParallelScanner(self.executor, 2, segment_size=4096)
+        for pos in range(0, len(text_blob), 10000):
+            parallel.feed(text_blob[pos:pos + 10000])
+        self.assertEqual(parallel.close(), serial.close())
+        self.assertEqual(parallel.first_seen, serial.first_seen)
+        self.assertEqual(parallel.occurrences, serial.occurrences)
+        self.assertEqual(len(parallel._in_flight), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
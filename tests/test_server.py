@@ -0,0 +1,247 @@
+import unittest
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from Monteliblobber import monteliblobber, server
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_config(root):
+    """ Writes a config file keeping the lookup files and the enrichment cache in a temporary directory.
+
+    :param root: Path to the directory.
+    :return: Path to the config file.
+    """
+
+    config = os.path.join(root, 'test.cfg')
+    with open(config, 'w') as f:
+        for name, filename in (
+                ('ROOT_DOMAINS_PATH', 'root_domains.txt'), ('BLACKLIST_DB', 'blacklist_db.bin'),
+                ('BLACKLIST_JSON_DB', 'blacklist_db.json'), ('ENRICHMENT_CACHE_PATH', 'enrichment_cache.sqlite')
+        ):
+            f.write('{} = {!r}\n'.format(name, os.path.join(root, filename)))
+        f.write('AUTO_OPEN_BROWSER = False\n')
+    with open(os.path.join(root, 'root_domains.txt'), 'w') as f:
+        f.write('# Root domains\nCOM\nRU\n')
+    return config
+
+
+def request(port, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        connection.request(method, path, body, headers or {})
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+class QuitTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app = monteliblobber.create_app(write_config(self.temp_dir.name))
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_quit(self):
+        calls = []
+        self.app.config['SHUTDOWN'] = lambda: calls.append(True)
+        response = self.client.post('/quit')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(calls, [True])
+
+    def test_other_server(self):
+        """ An application run by another server can't be stopped.
+        """
+        self.assertEqual(self.client.post('/quit').status_code, 501)
+
+
+class WSGIServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app = monteliblobber.create_app(write_config(self.temp_dir.name))
+        self.app.add_url_rule('/slow', 'slow', lambda: time.sleep(0.5) or 'done')
+        self.server = server.make_server(self.app, '127.0.0.1', 0)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        if self.thread.is_alive():
+            self.server.stop()
+        self.server.close()
+        self.temp_dir.cleanup()
+
+    def test_idle_connection(self):
+        """ A kept alive connection doesn't hold up a stopping server.
+        """
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.port, timeout=10)
+        connection.request('GET', '/stats')
+        self.assertEqual(connection.getresponse().read()[:1], b'{')
+        start = time.monotonic()
+        self.server.stop()
+        self.server.close()
+        self.assertLess(time.monotonic() - start, 3)
+        connection.close()
+
+    def test_request_in_flight(self):
+        """ A request in flight is finished before the server is closed.
+        """
+        responses = []
+        client = threading.Thread(target=lambda: responses.append(request(self.server.port, 'GET', '/slow')))
+        client.start()
+        time.sleep(0.2)
+        self.server.stop()
+        self.server.close()
+        client.join()
+        self.assertEqual(responses, [(200, b'done')])
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'The pre-forked server needs os.fork.')
+class ArbiterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'Monteliblobber', 'serve', '--workers', '2', '--port', '0',
+             '--config', write_config(self.temp_dir.name)],
+            stderr=subprocess.PIPE, cwd=PACKAGE_ROOT, universal_newlines=True
+        )
+        self.log = []
+        self.port = None
+        listening = threading.Event()
+
+        def read_log():
+            for line in self.process.stderr:
+                self.log.append(line)
+                if 'Listening on' in line:
+                    self.port = int(line.rsplit(':', 1)[1].split()[0])
+                    listening.set()
+
+        threading.Thread(target=read_log, daemon=True).start()
+        if not listening.wait(30):
+            self.fail('The server did not start:\n' + ''.join(self.log))
+
+    def tearDown(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process.stderr.close()
+        self.temp_dir.cleanup()
+
+    def worker_pids(self, count=2, attempts=100):
+        """ Returns the pids of the workers answering `/stats`, once `count` different ones answered.
+        """
+
+        pids = set()
+        for _ in range(attempts):
+            status, body = request(self.port, 'GET', '/stats')
+            self.assertEqual(status, 200)
+            pids.add(json.loads(body)['pid'])
+            if len(pids) == count:
+                break
+        return pids
+
+    def test_workers_share_jobs(self):
+        pids = self.worker_pids()
+        self.assertEqual(len(pids), 2)
+        self.assertNotIn(self.process.pid, pids)
+
+        status, body = request(
+            self.port, 'POST', '/', 'blob=evil%40evil-example.ru+http%3A%2F%2Fbob-example.com%2Fa&store=1',
+            {'Content-Type': 'application/x-www-form-urlencoded'}
+        )
+        self.assertEqual(status, 200)
+        job_id = json.loads(body)['id']
+        for _ in range(10):
+            status, body = request(self.port, 'GET', '/jobs/{}/results'.format(job_id))
+            self.assertEqual(status, 200)
+            self.assertEqual(len(json.loads(body)['data']), 4)
+
+    def test_metrics_totals(self):
+        """ `/metrics` reports the totals of every worker, whichever one answers.
+        """
+        pids = self.worker_pids()
+        self.assertEqual(len(pids), 2)
+        for _ in range(10):
+            status, _ = request(self.port, 'GET', '/stats')
+            self.assertEqual(status, 200)
+
+        # The other worker's snapshot can lag by up to `METRICS_INTERVAL`.
+        deadline = time.monotonic() + 10
+        while True:
+            status, body = request(self.port, 'GET', '/metrics')
+            self.assertEqual(status, 200)
+            lines = body.decode('utf-8').splitlines()
+            total = sum(
+                int(line.rsplit(' ', 1)[1]) for line in lines
+                if line.startswith('monteliblobber_http_responses_total{endpoint="monteliblobber.get_stats"')
+            )
+            gauge_pids = {
+                int(line.split('pid="', 1)[1].split('"', 1)[0]) for line in lines
+                if line.startswith('monteliblobber_cache_entries')
+            }
+            if total >= 10 + len(pids) and gauge_pids == pids or time.monotonic() > deadline:
+                break
+            time.sleep(0.2)
+        self.assertGreaterEqual(total, 10 + len(pids))
+        self.assertEqual(gauge_pids, pids)
+
+    def test_reload(self):
+        """ `SIGHUP` replaces the workers without failing a request.
+        """
+        old = self.worker_pids()
+        failures = []
+        done = threading.Event()
+
+        def load():
+            while not done.is_set():
+                try:
+                    status, _ = request(self.port, 'GET', '/stats')
+                    if status != 200:
+                        failures.append(status)
+                except OSError as e:
+                    failures.append(e)
+
+        client = threading.Thread(target=load)
+        client.start()
+        try:
+            self.process.send_signal(signal.SIGHUP)
+            deadline = time.monotonic() + 20
+            new = set()
+            while time.monotonic() < deadline and len(new) < 2:
+                new = self.worker_pids() - old
+        finally:
+            done.set()
+            client.join()
+        self.assertEqual(len(new), 2)
+        self.assertEqual(failures, [])
+
+    def test_stop(self):
+        self.process.send_signal(signal.SIGTERM)
+        self.assertEqual(self.process.wait(30), 0)
+        self.assertTrue(any('Stopping' in line for line in self.log))
+
+
+    def test_stop_while_forking(self):
+        """ Workers forked just before `SIGTERM` still stop gracefully instead of being killed after the timeout.
+        """
+        for _ in range(3):
+            self.process.send_signal(signal.SIGHUP)
+        self.process.send_signal(signal.SIGTERM)
+        self.assertEqual(self.process.wait(30), 0)
+        self.assertFalse(any('Killing' in line for line in self.log))
+
+
+if __name__ == '__main__':
+    unittest.main()
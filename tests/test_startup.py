@@ -0,0 +1,123 @@
+import unittest
+import io
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from Monteliblobber import monteliblobber
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that are only needed by the updaters or the first GeoIP lookup.
+DEFERRED_MODULES = ('requests', 'geoip2', 'maxminddb')
+
+# Generous budget for the cumulative import time of a module, in microseconds, to catch regressions like a heavy
+# import creeping back in rather than to benchmark.
+IMPORT_BUDGET = 1000000
+
+
+def import_times(module):
+    """ Imports a module in a fresh interpreter with `-X importtime`.
+
+    :param module: Module name String.
+    :return: Dictionary of imported module name to cumulative import time in microseconds.
+    """
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        stderr=subprocess.PIPE, check=True, cwd=PACKAGE_ROOT
+    )
+    times = {}
+    for line in result.stderr.decode().splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \|\s+(\S+)', line)
+        if match:
+            times[match.group(2)] = int(match.group(1))
+    return times
+
+
+class ImportTimeTestCase(unittest.TestCase):
+
+    def test_web_application(self):
+        """ Importing the web application neither builds it nor imports the updater or GeoIP modules.
+        """
+        times = import_times('Monteliblobber.monteliblobber')
+        for name in DEFERRED_MODULES:
+            self.assertNotIn(name, times)
+        self.assertLess(times['Monteliblobber.monteliblobber'], IMPORT_BUDGET)
+
+    def test_command_line(self):
+        times = import_times('Monteliblobber.cli')
+        for name in DEFERRED_MODULES + ('flask', 'werkzeug'):
+            self.assertNotIn(name, times)
+        self.assertLess(times['Monteliblobber.cli'], IMPORT_BUDGET)
+
+
+class CreateAppTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        root = self.temp_dir.name
+        self.config = os.path.join(root, 'test.cfg')
+        with open(self.config, 'w') as f:
+            f.write('ROOT_DOMAINS_PATH = {!r}\n'.format(os.path.join(root, 'root_domains.txt')))
+            f.write('BLACKLIST_DB = {!r}\n'.format(os.path.join(root, 'blacklist_db.bin')))
+            f.write('BLACKLIST_JSON_DB = {!r}\n'.format(os.path.join(root, 'blacklist_db.json')))
+        with open(os.path.join(root, 'root_domains.txt'), 'w') as f:
+            f.write('# Root domains\nCOM\nRU\n')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_lookups_load_on_first_use(self):
+        application = monteliblobber.create_app(self.config)
+        root_domains = application.config['ROOT_DOMAINS_MEM_DB']
+        self.assertEqual(root_domains.path, os.path.join(self.temp_dir.name, 'root_domains.txt'))
+        self.assertIsNone(root_domains._state[0])
+
+        artifacts = application.config['EXTRACTOR'].extract('see evil-example.ru and bob-example.com')
+        self.assertEqual(sorted(a['value'] for a in artifacts), ['bob-example.com', 'evil-example.ru'])
+        self.assertIsNotNone(root_domains._state[0])
+
+    def test_independent_applications(self):
+        first = monteliblobber.create_app(self.config)
+        second = monteliblobber.create_app(self.config)
+        self.assertIsNot(first.config['JOB_QUEUE'], second.config['JOB_QUEUE'])
+        self.assertIn('monteliblobber.api_extract', second.view_functions)
+
+    def test_file_job_uses_application(self):
+        """ File jobs run outside of the request but with the settings of the application that received the upload.
+        """
+        application = monteliblobber.create_app(self.config)
+        application.config['LOCAL_CONF_DIR'] = self.temp_dir.name
+        client = application.test_client()
+        response = client.post(
+            '/file', data={'file': (io.BytesIO(b'\x00\x01see evil-example.ru\x00'), 'sample.bin')},
+            headers={'Accept': 'application/json'}
+        )
+        job = application.config['JOB_QUEUE'].get(response.get_json()['id'])
+        deadline = time.time() + 5
+        while job.finished is None and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual((job.status, job.error), ('finished', None))
+        self.assertEqual([a['value'] for a in job.results], ['evil-example.ru'])
+
+    def test_file_utf16_option(self):
+        """ An unchecked UTF-16 checkbox turns the option off; `STRINGS_UTF16` only applies without the field.
+        """
+        application = monteliblobber.create_app(self.config)
+        application.config.update(LOCAL_CONF_DIR=self.temp_dir.name, STRINGS_UTF16=True)
+        client = application.test_client()
+        data = b'\x00\x01see evil-example.ru\x00'
+        for utf16, expected in (([], True), (['0'], False), (['0', 'on'], True)):
+            with self.subTest(utf16=utf16):
+                response = client.post(
+                    '/file', data={'file': (io.BytesIO(data), 'sample.bin'), 'utf16': utf16},
+                    headers={'Accept': 'application/json'}
+                )
+                self.assertEqual(response.get_json()['bytes_total'], len(data) * (2 if expected else 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import io
+import os
+import random
+import string
+import tempfile
+from Monteliblobber import strings
+
+
+def reference_strings(text, min_length=4):
+    """ Character by character extraction, as `extract_strings` originally worked. """
+    results = []
+    result = ''
+    for c in text:
+        if c in string.printable:
+            result += c
+            continue
+        if len(result) >= min_length:
+            results.append(result + ' ')
+        result = ''
+    if len(result) >= min_length:
+        results.append(result + ' ')
+    return ''.join(results)
+
+
+class IterStringsTestCase(unittest.TestCase):
+
+    def test_printable_runs(self):
+        text = 'MZ\x00\x00This program\x01ab\x02http://example.com/x\x00'
+        self.assertEqual(''.join(strings.iter_strings(io.StringIO(text))), 'This program http://example.com/x ')
+
+    def test_runs_across_chunks(self):
+        """ Output doesn't depend on where the chunk boundaries fall.
+        """
+        rnd = random.Random(0)
+        for _ in range(300):
+            text = ''.join(rnd.choice('ab c\x00\x01\xe9') for _ in range(rnd.randrange(60)))
+            for chunk_size in (1, 2, 3, 7, 1024):
+                with self.subTest(text=text, chunk_size=chunk_size):
+                    result = ''.join(strings.iter_strings(io.StringIO(text), chunk_size=chunk_size))
+                    self.assertEqual(result, reference_strings(text))
+
+    def test_long_run_streamed(self):
+        """ A run longer than a chunk is yielded as it is read rather than held in memory.
+        """
+        pieces = list(strings.iter_strings(io.StringIO('x' * 100), chunk_size=10))
+        self.assertEqual(''.join(pieces), 'x' * 100 + ' ')
+        self.assertTrue(all(len(piece) <= 10 for piece in pieces))
+
+
+class IterFileStringsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, 'sample.bin')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def extract(self, data, **kwargs):
+        with open(self.filename, 'wb') as f:
+            f.write(data)
+        return ''.join(strings.iter_file_strings(self.filename, **kwargs))
+
+    def test_ascii_strings(self):
+        data = b'MZ\x90\x00This program\x01ab\x02http://example.com/x\xff'
+        self.assertEqual(self.extract(data), 'This program http://example.com/x ')
+
+    def test_matches_text_extraction_for_ascii(self):
+        """ For ASCII input the bytes extractor agrees with the character by character extractor.
+        """
+        rnd = random.Random(1)
+        text = ''.join(rnd.choice('ab c.\x00\x01\n') for _ in range(5000))
+        self.assertEqual(self.extract(text.encode('ascii'), chunk_size=16), reference_strings(text))
+
+    def test_min_length(self):
+        data = b'abc\x00abcdef\x00ab'
+        self.assertEqual(self.extract(data, min_length=2), 'abc abcdef ab ')
+        self.assertEqual(self.extract(data, min_length=6), 'abcdef ')
+
+    def test_utf16(self):
+        """ UTF-16LE strings are only extracted when requested.
+        """
+        data = b'\x00\x00' + 'evil.example.net'.encode('utf-16-le') + b'\x00\x00'
+        self.assertEqual(self.extract(data), '')
+        self.assertEqual(self.extract(data, utf16=True), 'evil.example.net ')
+
+    def test_empty_file(self):
+        self.assertEqual(self.extract(b''), '')
+
+
+if __name__ == '__main__':
+    unittest.main()